@@ -0,0 +1,242 @@
+import asyncio
+import itertools
+import logging
+import os
+import threading
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Number of agent teams (and therefore concurrent analyses) a single process may run
+DEFAULT_POOL_SIZE = int(os.getenv("OPTIMONKEY_AGENT_POOL_SIZE", "4"))
+
+# Marker pushed onto a chat's message queue once the worker thread has finished
+_CHAT_DONE = object()
+
+
+class ChatStopped(Exception):
+    """Raised inside the chat worker thread to abort a group chat that nobody is listening to anymore."""
+
+
+@dataclass(eq=False)
+class AgentTeam:
+    """
+    One isolated set of agents, group chats and managers.
+
+    A team is owned by exactly one analysis at a time, so its group chat
+    transcripts never interleave with another session's messages.
+    """
+    user_proxy: Any
+    planner: Any
+    coder: Any
+    critic: Any
+    code_executor: Any
+    final_recommender: Any
+    groupchat: Any
+    manager: Any
+    final_groupchat: Any
+    final_manager: Any
+    team_id: int = 0
+    runs: int = field(default=0, compare=False)
+    _listener: Optional[Callable[[Any, Any, Any], None]] = field(default=None, repr=False, compare=False)
+    _stop_requested: threading.Event = field(default_factory=threading.Event, repr=False, compare=False)
+    _chat_future: Optional[asyncio.Future] = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        # Every message an agent sends passes through this hook, in the chat worker thread
+        for agent in self.members:
+            agent.register_hook("process_message_before_send", self._on_message_sent)
+
+    def __repr__(self):
+        return f"AgentTeam(team_id={self.team_id}, runs={self.runs})"
+
+    @property
+    def members(self) -> List[Any]:
+        return [
+            self.user_proxy, self.planner, self.coder, self.critic,
+            self.code_executor, self.final_recommender,
+        ]
+
+    @property
+    def agents(self) -> List[Any]:
+        return self.members + [self.manager, self.final_manager]
+
+    @property
+    def busy(self) -> bool:
+        """True while a chat started by `run_chat` is still running in its worker thread."""
+        return self._chat_future is not None and not self._chat_future.done()
+
+    def reset(self):
+        """Clear transcripts and per-conversation agent state so the team can be reused."""
+        self.groupchat.reset()
+        self.final_groupchat.reset()
+        for agent in self.agents:
+            agent.reset()
+        self._listener = None
+        self._stop_requested.clear()
+        self._chat_future = None
+
+    def request_stop(self):
+        """Ask the running chat to abort at the next message an agent sends."""
+        self._stop_requested.set()
+
+    async def finish_chat(self):
+        """Stop the running chat, if any, and wait for its worker thread to exit."""
+        if self.busy:
+            self.request_stop()
+            await asyncio.wait([self._chat_future])
+        self._listener = None
+        self._stop_requested.clear()
+
+    def _on_message_sent(self, sender, message, recipient, silent):
+        if self._stop_requested.is_set():
+            raise ChatStopped(f"Chat on agent team {self.team_id} was stopped")
+        listener = self._listener
+        if listener is not None:
+            listener(sender, message, recipient)
+        return message
+
+    async def run_chat(self, initiate: Callable[[], Any], chat_manager: Any, idle_timeout: float) -> AsyncIterator[Dict]:
+        """
+        Run a blocking `initiate_chat` call in a worker thread and yield messages as agents send them.
+
+        Args:
+            initiate (Callable): Zero-argument callable that starts the AutoGen chat.
+            chat_manager: Only messages addressed to this manager are yielded.
+            idle_timeout (float): Seconds to wait for the next message before raising asyncio.TimeoutError.
+
+        Yields:
+            Dict: The sent message (content, role, tool calls...) with the sender's `name`.
+        """
+        # A previous chat on this team (e.g. one abandoned after TERMINATE) must not overlap this one
+        await self.finish_chat()
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def on_message(sender, message, recipient):
+            if recipient is not chat_manager:
+                return
+            payload = {"content": message} if isinstance(message, str) else dict(message)
+            payload["name"] = sender.name
+            loop.call_soon_threadsafe(queue.put_nowait, payload)
+
+        def on_chat_done(future):
+            # Retrieving the exception here keeps stopped chats from logging "never retrieved" noise
+            if not future.cancelled() and isinstance(future.exception(), ChatStopped):
+                logger.info(f"Chat on agent team {self.team_id} stopped before completion")
+            queue.put_nowait(_CHAT_DONE)
+
+        self._listener = on_message
+        self._chat_future = loop.run_in_executor(None, initiate)
+        self._chat_future.add_done_callback(on_chat_done)
+        chat_future = self._chat_future
+
+        while True:
+            item = await asyncio.wait_for(queue.get(), timeout=idle_timeout)
+            if item is _CHAT_DONE:
+                error = chat_future.exception()
+                if error is not None and not isinstance(error, ChatStopped):
+                    raise error
+                return
+            yield item
+
+
+class AgentTeamPool:
+    """
+    Bounded pool of warmed agent teams.
+
+    Teams are built on demand by `factory` (up to `size` of them), handed out to one
+    session at a time and reset and kept for the next session when released.
+    Sessions beyond `size` wait until a team is returned.
+    """
+
+    def __init__(self, factory: Callable[[int], AgentTeam], size: int = DEFAULT_POOL_SIZE):
+        if size < 1:
+            raise ValueError(f"Agent pool size must be at least 1, got {size}")
+        self._factory = factory
+        self.size = size
+        self._idle: List[AgentTeam] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # Live teams; ids come from a separate counter so a rebuilt team never reuses the id
+        # (and executor work_dir) of a team that is still in use
+        self._created = 0
+        self._team_ids = itertools.count()
+        self._counters = {"acquired": 0, "reused": 0, "created": 0, "waited": 0}
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.size)
+        return self._semaphore
+
+    def _build_team(self) -> AgentTeam:
+        team_id = next(self._team_ids)
+        self._created += 1
+        team = self._factory(team_id)
+        team.team_id = team_id
+        self._counters["created"] += 1
+        logger.info(f"Built agent team {team_id} ({self._created}/{self.size})")
+        return team
+
+    async def acquire(self) -> AgentTeam:
+        """Wait for a free slot and return an idle team, building a new one if none is warm."""
+        semaphore = self._get_semaphore()
+        if semaphore.locked():
+            self._counters["waited"] += 1
+        await semaphore.acquire()
+        try:
+            if self._idle:
+                team = self._idle.pop()
+                self._counters["reused"] += 1
+            else:
+                team = await asyncio.to_thread(self._build_team)
+        except BaseException:
+            semaphore.release()
+            raise
+        self._counters["acquired"] += 1
+        team.runs += 1
+        return team
+
+    def release(self, team: AgentTeam):
+        """Reset a team and return it to the pool."""
+        if team.busy:
+            # The session ended before its chat did; stop the worker and recycle the team afterwards
+            team.request_stop()
+            team._chat_future.add_done_callback(lambda _: self.release(team))
+            return
+        try:
+            team.reset()
+            self._idle.append(team)
+        except Exception as e:
+            # A team that cannot be reset is dropped; a fresh one is built on next acquire
+            logger.error(f"Discarding agent team {team.team_id} after failed reset: {e}")
+            self._created -= 1
+        finally:
+            self._get_semaphore().release()
+
+    @asynccontextmanager
+    async def session(self):
+        """Hold a team for the duration of one analysis."""
+        team = await self.acquire()
+        try:
+            yield team
+        finally:
+            self.release(team)
+
+    async def warm(self, count: Optional[int] = None):
+        """Pre-build up to `count` teams (default: the full pool) so first sessions skip construction."""
+        count = min(count or self.size, self.size)
+        while self._created < count:
+            self._idle.append(await asyncio.to_thread(self._build_team))
+
+    def stats(self) -> Dict[str, int]:
+        in_use = self._created - len(self._idle)
+        return {
+            "size": self.size,
+            "built": self._created,
+            "idle": len(self._idle),
+            "in_use": in_use,
+            **self._counters,
+        }
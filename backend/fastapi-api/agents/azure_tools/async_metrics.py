@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterable, List, Optional
+
+from .clients import get_client_registry
+from .metrics import metrics_cache, metrics_cache_key, resolve_metric_defaults, stored_usage, summarize_metrics
+from .metrics_store import daily_window, metrics_store
+from .resource_graph import parse_resource_id
+
+# The async Azure SDK is imported on first use, like the sync clients
+if TYPE_CHECKING:
+    from azure.core.exceptions import HttpResponseError
+    from azure.mgmt.monitor.aio import MonitorManagementClient
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of Monitor requests in flight at once
+DEFAULT_CONCURRENCY = int(os.getenv("OPTIMONKEY_METRICS_CONCURRENCY", "16"))
+# How often a throttled request is retried before the resource is reported as failed
+MAX_THROTTLE_RETRIES = 5
+
+
+class _ThrottleGate:
+    """Shared pause: once Monitor answers 429, no worker sends another request until Retry-After has passed."""
+
+    def __init__(self):
+        self._resume_at = 0.0
+
+    async def wait(self):
+        delay = self._resume_at - asyncio.get_running_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float):
+        self._resume_at = max(self._resume_at, asyncio.get_running_loop().time() + seconds)
+
+
+def _retry_after(error: "HttpResponseError", attempt: int) -> float:
+    headers = error.response.headers if error.response is not None else {}
+    try:
+        return float(headers.get("Retry-After") or headers.get("x-ms-retry-after") or 0) or 2 ** attempt
+    except ValueError:
+        return 2 ** attempt
+
+
+def _stored_usage(resource_id: str, names: List[str], aggregation: str, days: int, cache_key: str) -> Dict:
+    resource_usage = {"resource_id": resource_id, **stored_usage(resource_id, names, aggregation, days)}
+    metrics_cache.set(cache_key, resource_usage)
+    return resource_usage
+
+
+async def _query_resource(
+    client: "MonitorManagementClient",
+    resource_id: str,
+    resource_type: str,
+    metric_names: Optional[List[str]],
+    aggregation: str,
+    timespan: str,
+    interval: Optional[str],
+    semaphore: asyncio.Semaphore,
+    gate: _ThrottleGate,
+) -> Dict:
+    from azure.core.exceptions import HttpResponseError
+
+    # The metrics cache and store are SQLite-backed; their calls stay off the event loop
+    names, grain, namespace = resolve_metric_defaults(resource_type, metric_names, interval)
+    cache_key = metrics_cache_key(resource_id, names, aggregation, timespan, grain)
+    cached = await asyncio.to_thread(metrics_cache.get, cache_key)
+    if cached is not None:
+        return dict(cached)
+
+    query_timespan = timespan
+    days = daily_window(timespan, grain)
+    if days is not None:
+        pending = await asyncio.to_thread(metrics_store.pending_range, resource_id, names, aggregation, days)
+        if pending is None:
+            return await asyncio.to_thread(_stored_usage, resource_id, names, aggregation, days, cache_key)
+        query_timespan = f"{pending[0]:%Y-%m-%dT%H:%M:%SZ}/{pending[1]:%Y-%m-%dT%H:%M:%SZ}"
+
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        async with semaphore:
+            await gate.wait()
+            try:
+                metrics_data = await client.metrics.list(
+                    resource_uri=resource_id,
+                    timespan=query_timespan,
+                    interval=grain,
+                    metricnames=','.join(names),
+                    aggregation=aggregation,
+                    metricnamespace=namespace,
+                )
+                break
+            except HttpResponseError as e:
+                if e.status_code != 429 or attempt == MAX_THROTTLE_RETRIES:
+                    raise
+                delay = _retry_after(e, attempt)
+                logger.warning(f"Monitor throttled metrics for {resource_id}; pausing {delay:.1f}s")
+                gate.pause(delay)
+
+    if days is not None:
+        await asyncio.to_thread(metrics_store.record, resource_id, metrics_data.value, names, aggregation, pending[1], pending[0])
+        return await asyncio.to_thread(_stored_usage, resource_id, names, aggregation, days, cache_key)
+
+    resource_usage = {"resource_id": resource_id, **summarize_metrics(metrics_data.value, aggregation)}
+    await asyncio.to_thread(metrics_cache.set, cache_key, resource_usage)
+    return resource_usage
+
+
+async def _collect_resource(client: "MonitorManagementClient", resource_id: str, *args) -> Dict:
+    """Run `_query_resource`, turning failures into an error row so one bad resource never stops the fan-out."""
+    try:
+        return await _query_resource(client, resource_id, *args)
+    except Exception as e:
+        logger.error(f"Metric query failed for {resource_id}: {e}")
+        return {"resource_id": resource_id, "error": str(e)}
+
+
+async def collect_usage_metrics(
+    resources: Iterable[Dict],
+    metric_names: Optional[List[str]] = None,
+    aggregation: str = 'Average',
+    timespan: str = 'P30D',
+    interval: Optional[str] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> AsyncIterator[Dict]:
+    """
+    Query usage metrics for many resources concurrently and yield each result as soon as it arrives.
+
+    Uses the async Monitor client with at most `concurrency` requests in flight. A 429
+    response pauses all workers for the advertised Retry-After before retrying. Tokens
+    come from the client registry's shared credential.
+
+    Args:
+        resources (Iterable[Dict]): Resources with an `id` (or `resource_id`) and optionally a `type`;
+            the type is derived from the ID when absent.
+        metric_names (List[str], optional): Metric names to query. Defaults are used per resource type.
+        aggregation (str): The type of aggregation to use.
+        timespan (str): The timespan to query over (e.g., 'P30D').
+        interval (str, optional): The granularity of the data.
+        concurrency (int): Maximum concurrent Monitor requests.
+
+    Yields:
+        Dict: The same shape as `query_usage_metrics`, or `resource_id` plus `error` on failure.
+    """
+    from azure.mgmt.monitor.aio import MonitorManagementClient
+
+    semaphore = asyncio.Semaphore(concurrency)
+    gate = _ThrottleGate()
+    credential = get_client_registry().get_async_credential()
+    # Async clients hold a loop-bound HTTP session, so they live for one collection only
+    clients: Dict[str, MonitorManagementClient] = {}
+    tasks: List[asyncio.Task] = []
+
+    try:
+        for resource in resources:
+            resource_id = resource.get("id") or resource.get("resource_id")
+            parts = parse_resource_id(resource_id or "")
+            if parts is None:
+                yield {"resource_id": resource_id, "error": "Invalid resource ID"}
+                continue
+            subscription = parts["subscription_id"].lower()
+            if subscription not in clients:
+                clients[subscription] = MonitorManagementClient(credential, parts["subscription_id"])
+            tasks.append(asyncio.create_task(_collect_resource(
+                clients[subscription], resource_id, resource.get("type") or parts["resource_type"],
+                metric_names, aggregation, timespan, interval, semaphore, gate,
+            )))
+
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+        for client in clients.values():
+            await client.close()
+
+
+def fetch_usage_metrics(resource_ids: List[str], **options) -> List[Dict]:
+    """
+    Blocking wrapper of `collect_usage_metrics` for code running in a worker thread (agent tools).
+
+    Takes the same keyword options and returns one row per resource, in completion order.
+    """
+    async def collect() -> List[Dict]:
+        return [row async for row in collect_usage_metrics([{"id": resource_id} for resource_id in resource_ids], **options)]
+
+    return asyncio.run(collect())
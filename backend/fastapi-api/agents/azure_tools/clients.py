@@ -0,0 +1,259 @@
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple
+
+# The Azure SDKs take a noticeable share of startup time; they are imported on first use
+if TYPE_CHECKING:
+    import requests
+    from azure.core.credentials import AccessToken
+    from azure.core.pipeline.transport import RequestsTransport
+    from azure.mgmt.monitor import MonitorManagementClient
+    from azure.mgmt.resourcegraph import ResourceGraphClient
+    from azure.monitor.query import MetricsClient
+
+logger = logging.getLogger(__name__)
+
+# Maximum pooled keep-alive connections per Azure host
+HTTP_POOL_SIZE = int(os.getenv("OPTIMONKEY_AZURE_HTTP_POOL_SIZE", "32"))
+# Refresh tokens this many seconds before they expire
+TOKEN_REFRESH_MARGIN = 300
+
+
+class CachingCredential:
+    """
+    Token credential that reuses access tokens until shortly before they expire.
+
+    DefaultAzureCredential may end up in a credential (Azure CLI, managed identity...)
+    that performs a full token acquisition on every `get_token` call; this wrapper makes
+    that happen once per scope per token lifetime, and is safe to share across threads.
+    Cache reads take a short lock; a fetch only blocks other callers of the same scope.
+    """
+
+    def __init__(self, credential: Any, refresh_margin: int = TOKEN_REFRESH_MARGIN):
+        self._credential = credential
+        self._refresh_margin = refresh_margin
+        self._tokens: Dict[Tuple, "AccessToken"] = {}
+        self._lock = threading.Lock()
+        self._scope_locks: Dict[Tuple, threading.Lock] = {}
+        self.token_fetches = 0
+        self.token_cache_hits = 0
+
+    def get_token(self, *scopes: str, claims: Optional[str] = None, tenant_id: Optional[str] = None, **kwargs) -> "AccessToken":
+        if claims:
+            # Claims challenges must always reach the identity provider
+            with self._lock:
+                self.token_fetches += 1
+            return self._credential.get_token(*scopes, claims=claims, tenant_id=tenant_id, **kwargs)
+
+        key = (scopes, tenant_id)
+        token = self._cached(key)
+        if token is not None:
+            return token
+        # Fetch outside the shared lock: only callers of the same scope wait for the round trip
+        with self._scope_lock(key):
+            token = self._cached(key)
+            if token is not None:
+                return token
+            token = self._credential.get_token(*scopes, tenant_id=tenant_id, **kwargs)
+            with self._lock:
+                self._tokens[key] = token
+                self.token_fetches += 1
+            return token
+
+    def _cached(self, key: Tuple) -> Optional["AccessToken"]:
+        with self._lock:
+            token = self._tokens.get(key)
+            if token is not None and token.expires_on - self._refresh_margin > time.time():
+                self.token_cache_hits += 1
+                return token
+            return None
+
+    def _scope_lock(self, key: Tuple) -> threading.Lock:
+        with self._lock:
+            lock = self._scope_locks.get(key)
+            if lock is None:
+                lock = self._scope_locks[key] = threading.Lock()
+            return lock
+
+    def close(self):
+        close = getattr(self._credential, "close", None)
+        if close is not None:
+            close()
+
+
+class AsyncCredentialAdapter:
+    """
+    Async view of a `CachingCredential` for the `.aio` Azure clients.
+
+    Tokens come from the registry's credential (and its cache and counters); the blocking
+    acquisition runs in a worker thread. The adapter holds no loop-bound state, so one
+    instance serves every event loop of the process.
+    """
+
+    def __init__(self, credential: CachingCredential):
+        self._credential = credential
+
+    async def get_token(self, *scopes: str, **kwargs) -> "AccessToken":
+        import asyncio
+
+        return await asyncio.to_thread(self._credential.get_token, *scopes, **kwargs)
+
+    async def close(self):
+        # The wrapped credential belongs to the registry and outlives its async users
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class AzureClientRegistry:
+    """
+    Process-wide registry of Azure credentials and management clients.
+
+    One credential (with token caching) and one pooled HTTP session are shared by every
+    client; clients are created once per (kind, subscription) and reused by all sessions
+    and threads afterwards.
+    """
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE):
+        self._pool_size = pool_size
+        self._lock = threading.RLock()
+        self._credential: Optional[CachingCredential] = None
+        self._async_credential: Optional[AsyncCredentialAdapter] = None
+        self._session: Optional["requests.Session"] = None
+        self._clients: Dict[Tuple[str, str], Any] = {}
+        self._counters = {"clients_created": 0, "clients_reused": 0}
+
+    def get_credential(self) -> CachingCredential:
+        with self._lock:
+            if self._credential is None:
+                from azure.identity import DefaultAzureCredential
+
+                self._credential = CachingCredential(DefaultAzureCredential())
+            return self._credential
+
+    def get_async_credential(self) -> AsyncCredentialAdapter:
+        """The shared credential for async clients (same token cache as `get_credential`)."""
+        with self._lock:
+            if self._async_credential is None:
+                self._async_credential = AsyncCredentialAdapter(self.get_credential())
+            return self._async_credential
+
+    def _get_session(self) -> "requests.Session":
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self._pool_size, pool_maxsize=self._pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._session = session
+        return self._session
+
+    def transport(self) -> "RequestsTransport":
+        """A transport bound to the shared session; closing it leaves the session open."""
+        from azure.core.pipeline.transport import RequestsTransport
+
+        with self._lock:
+            return RequestsTransport(session=self._get_session(), session_owner=False)
+
+    def get_client(self, kind: str, key: str, factory: Callable[[], Any]) -> Any:
+        """Return the cached client for (kind, key), building it with `factory` on first use."""
+        with self._lock:
+            client = self._clients.get((kind, key))
+            if client is not None:
+                self._counters["clients_reused"] += 1
+                return client
+            client = factory()
+            self._clients[(kind, key)] = client
+            self._counters["clients_created"] += 1
+            logger.info(f"Created {kind} client for {key or 'tenant'}")
+            return client
+
+    def get_resource_graph_client(self) -> "ResourceGraphClient":
+        from azure.mgmt.resourcegraph import ResourceGraphClient
+
+        return self.get_client(
+            "resourcegraph", "",
+            lambda: ResourceGraphClient(self.get_credential(), transport=self.transport()),
+        )
+
+    def get_monitor_client(self, subscription_id: str) -> "MonitorManagementClient":
+        from azure.mgmt.monitor import MonitorManagementClient
+
+        return self.get_client(
+            "monitor", subscription_id.lower(),
+            lambda: MonitorManagementClient(
+                credential=self.get_credential(),
+                subscription_id=subscription_id,
+                transport=self.transport(),
+            ),
+        )
+
+    def get_metrics_client(self, region: str) -> "MetricsClient":
+        """Client for the regional metrics batch endpoint (https://<region>.metrics.monitor.azure.com)."""
+        from azure.monitor.query import MetricsClient
+
+        region = region.lower().replace(" ", "")
+        return self.get_client(
+            "metrics", region,
+            lambda: MetricsClient(
+                f"https://{region}.metrics.monitor.azure.com",
+                self.get_credential(),
+                transport=self.transport(),
+            ),
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Token, client and HTTP connection reuse counters."""
+        with self._lock:
+            credential = self._credential
+            stats = {
+                **self._counters,
+                "token_fetches": credential.token_fetches if credential else 0,
+                "token_cache_hits": credential.token_cache_hits if credential else 0,
+                "http_requests": 0,
+                "http_connections_opened": 0,
+            }
+            if self._session is not None:
+                for adapter in set(self._session.adapters.values()):
+                    pools = adapter.poolmanager.pools
+                    for pool_key in list(pools.keys()):
+                        pool = pools.get(pool_key)
+                        if pool is not None:
+                            stats["http_requests"] += pool.num_requests
+                            stats["http_connections_opened"] += pool.num_connections
+            stats["http_connections_reused"] = max(stats["http_requests"] - stats["http_connections_opened"], 0)
+            return stats
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+            if self._credential is not None:
+                self._credential.close()
+                self._credential = None
+                self._async_credential = None
+
+
+_registry: Optional[AzureClientRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_client_registry() -> AzureClientRegistry:
+    """Return the process-wide client registry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = AzureClientRegistry()
+        return _registry
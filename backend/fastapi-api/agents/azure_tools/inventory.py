@@ -0,0 +1,295 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from .resource_graph import iter_resource_graph_query, kql_string
+
+logger = logging.getLogger(__name__)
+
+# SQLite file holding the resource inventory snapshot of every scanned subscription
+INVENTORY_PATH = os.getenv("OPTIMONKEY_INVENTORY_PATH", os.path.join("data", "inventory.sqlite"))
+# A snapshot younger than this (seconds) is used as is; older ones are refreshed before reading
+INVENTORY_MAX_AGE = float(os.getenv("OPTIMONKEY_INVENTORY_MAX_AGE", "900"))
+# Resource Graph keeps 14 days of change history; older snapshots need a full refresh
+CHANGE_HISTORY_DAYS = 13
+# Resource Graph indexes changes with a delay; each incremental refresh re-reads this many seconds
+# before the previous one started, so changes indexed late are still picked up
+CHANGE_INGESTION_MARGIN = 15 * 60
+# Resource ids per Resource Graph lookup when re-reading changed resources
+CHANGED_LOOKUP_CHUNK = 500
+
+_RESOURCE_COLUMNS = "id, name, type, location, resourceGroup, subscriptionId, kind, managedBy, sku, tags, properties"
+
+_FULL_QUERY = f"Resources | project {_RESOURCE_COLUMNS}"
+
+# Resource Graph only pages results that project an `id` column; the changed resource's id serves
+_CHANGES_QUERY = """resourcechanges
+| extend changeTime = todatetime(properties.changeAttributes.timestamp),
+         targetResourceId = tolower(tostring(properties.targetResourceId)),
+         changeType = tostring(properties.changeType)
+| where changeTime > datetime({since})
+| summarize arg_max(changeTime, changeType) by targetResourceId
+| extend id = targetResourceId
+| project id, targetResourceId, changeType"""
+
+
+def _json_column(value: Any) -> Optional[str]:
+    return json.dumps(value) if value is not None else None
+
+
+class InventoryStore:
+    """
+    Local snapshot of the resources of each subscription (id, type, location, SKU, tags, properties).
+
+    The first refresh of a subscription loads every resource; later refreshes read the
+    Resource Graph change history and only re-read resources created, updated or deleted
+    since the previous refresh. Reads are local SQLite queries.
+    """
+
+    def __init__(self, path: str = INVENTORY_PATH, max_age: float = INVENTORY_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._counters = {
+            "full_refreshes": 0, "incremental_refreshes": 0, "resources_loaded": 0,
+            "resources_changed": 0, "resources_deleted": 0, "local_queries": 0,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS resources ("
+                " resource_id TEXT PRIMARY KEY, id TEXT NOT NULL, subscription_id TEXT NOT NULL, resource_group TEXT,"
+                " type TEXT NOT NULL, location TEXT, name TEXT, kind TEXT, managed_by TEXT,"
+                " sku TEXT, tags TEXT, properties TEXT)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS resources_by_type ON resources (subscription_id, type)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                " subscription_id TEXT PRIMARY KEY, refreshed_at REAL NOT NULL, full_refreshed_at REAL NOT NULL)"
+            )
+            self._connection = connection
+        return self._connection
+
+    def _snapshots(self, subscriptions: Iterable[str]) -> Dict[str, tuple]:
+        keys = [subscription.lower() for subscription in subscriptions]
+        placeholders = ",".join("?" for _ in keys)
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT subscription_id, refreshed_at, full_refreshed_at FROM snapshots"
+                f" WHERE subscription_id IN ({placeholders})",
+                keys,
+            ).fetchall()
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    @staticmethod
+    def _row(resource: Dict) -> tuple:
+        return (
+            resource["id"].lower(), resource["id"], resource["subscriptionId"].lower(), resource.get("resourceGroup") or "",
+            resource["type"].lower(), (resource.get("location") or "").lower(), resource.get("name"),
+            resource.get("kind"), resource.get("managedBy"), _json_column(resource.get("sku")),
+            _json_column(resource.get("tags")), _json_column(resource.get("properties")),
+        )
+
+    def _write(self, subscriptions: List[str], upserts: List[Dict], deletes: List[str], refreshed_at: float, full: bool):
+        """Apply one refresh in a single transaction; a full refresh replaces the subscriptions' rows."""
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN")
+            try:
+                if full:
+                    connection.executemany(
+                        "DELETE FROM resources WHERE subscription_id = ?", [(subscription,) for subscription in subscriptions]
+                    )
+                connection.executemany("DELETE FROM resources WHERE resource_id = ?", [(rid,) for rid in deletes])
+                connection.executemany(
+                    "INSERT OR REPLACE INTO resources (resource_id, id, subscription_id, resource_group, type, location,"
+                    " name, kind, managed_by, sku, tags, properties) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [self._row(resource) for resource in upserts],
+                )
+                if full:
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO snapshots (subscription_id, refreshed_at, full_refreshed_at) VALUES (?, ?, ?)",
+                        [(subscription, refreshed_at, refreshed_at) for subscription in subscriptions],
+                    )
+                else:
+                    connection.executemany(
+                        "UPDATE snapshots SET refreshed_at = ? WHERE subscription_id = ?",
+                        [(refreshed_at, subscription) for subscription in subscriptions],
+                    )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def refresh(
+        self, subscriptions: List[str], full: bool = False, cancelled: Optional[threading.Event] = None
+    ) -> Dict[str, int]:
+        """
+        Bring the snapshot of `subscriptions` up to date.
+
+        Subscriptions never loaded, or last refreshed longer ago than Resource Graph keeps
+        change history, are loaded in full; the others only re-read changed resources.
+        Setting `cancelled` stops the refresh at the next Resource Graph page (QueryCancelled
+        is raised) and leaves the snapshot as it was.
+
+        Returns:
+            Dict[str, int]: Number of resources loaded, changed and deleted by this refresh.
+        """
+        subscriptions = sorted({subscription.lower() for subscription in subscriptions})
+        with self._refresh_lock:
+            snapshots = self._snapshots(subscriptions)
+            history_cutoff = time.time() - CHANGE_HISTORY_DAYS * 86400
+            full_refresh = [
+                subscription for subscription in subscriptions
+                if full or subscription not in snapshots or snapshots[subscription][0] < history_cutoff
+            ]
+            incremental = [subscription for subscription in subscriptions if subscription not in full_refresh]
+            result = {"loaded": 0, "changed": 0, "deleted": 0}
+
+            if full_refresh:
+                started = time.time()
+                resources = list(iter_resource_graph_query(_FULL_QUERY, full_refresh, cancelled=cancelled))
+                self._write(full_refresh, resources, [], started, full=True)
+                result["loaded"] = len(resources)
+                self._counters["full_refreshes"] += 1
+                self._counters["resources_loaded"] += len(resources)
+                logger.info(f"Loaded {len(resources)} resources for {len(full_refresh)} subscription(s) into the inventory")
+
+            if incremental:
+                started = time.time()
+                since = min(snapshots[subscription][0] for subscription in incremental) - CHANGE_INGESTION_MARGIN
+                changed, deleted = self._changes_since(incremental, since, cancelled)
+                self._write(incremental, changed, deleted, started, full=False)
+                result["changed"], result["deleted"] = len(changed), len(deleted)
+                self._counters["incremental_refreshes"] += 1
+                self._counters["resources_changed"] += len(changed)
+                self._counters["resources_deleted"] += len(deleted)
+                logger.info(
+                    f"Inventory refresh for {len(incremental)} subscription(s): "
+                    f"{len(changed)} changed, {len(deleted)} deleted"
+                )
+            return result
+
+    def _changes_since(self, subscriptions: List[str], since: float, cancelled: Optional[threading.Event] = None):
+        stamp = datetime.fromtimestamp(since, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        changes = list(iter_resource_graph_query(_CHANGES_QUERY.format(since=stamp), subscriptions, cancelled=cancelled))
+        deleted = {row["targetResourceId"] for row in changes if row.get("changeType") == "Delete"}
+        touched = [row["targetResourceId"] for row in changes if row["targetResourceId"] not in deleted]
+
+        changed: List[Dict] = []
+        for start in range(0, len(touched), CHANGED_LOOKUP_CHUNK):
+            chunk = touched[start:start + CHANGED_LOOKUP_CHUNK]
+            id_list = ", ".join(kql_string(resource_id) for resource_id in chunk)
+            query = f"Resources | where id in~ ({id_list}) | project {_RESOURCE_COLUMNS}"
+            found = list(iter_resource_graph_query(query, subscriptions, cancelled=cancelled))
+            changed.extend(found)
+            # Changes can target child resources or resources deleted since; drop what no longer exists
+            found_ids = {resource["id"].lower() for resource in found}
+            deleted.update(resource_id for resource_id in chunk if resource_id not in found_ids)
+        return changed, sorted(deleted)
+
+    def ensure_fresh(
+        self, subscriptions: List[str], max_age: Optional[float] = None, cancelled: Optional[threading.Event] = None
+    ):
+        """Refresh the subscriptions whose snapshot is missing or older than `max_age` seconds."""
+        max_age = self.max_age if max_age is None else max_age
+        snapshots = self._snapshots(subscriptions)
+        now = time.time()
+        stale = [
+            subscription for subscription in subscriptions
+            if subscription.lower() not in snapshots or now - snapshots[subscription.lower()][0] > max_age
+        ]
+        if stale:
+            self.refresh(stale, cancelled=cancelled)
+
+    def query(
+        self,
+        subscriptions: List[str],
+        resource_type: Optional[str] = None,
+        location: Optional[str] = None,
+        resource_group: Optional[str] = None,
+        tags: Optional[Dict[str, str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        Read resources from the local snapshot, in the same shape as a Resource Graph `Resources` row.
+
+        Args:
+            subscriptions (List[str]): Subscriptions to read.
+            resource_type (str, optional): Resource type filter, e.g. 'Microsoft.Compute/disks'.
+            location (str, optional): Region filter.
+            resource_group (str, optional): Resource group filter.
+            tags (Dict[str, str], optional): Tags that must be present; a None or empty value matches any value.
+            limit (int, optional): Maximum number of rows.
+
+        Returns:
+            List[Dict]: Matching resources.
+        """
+        clauses = [f"subscription_id IN ({','.join('?' for _ in subscriptions)})"]
+        params: List[Any] = [subscription.lower() for subscription in subscriptions]
+        for column, value in (("type", resource_type), ("location", location), ("lower(resource_group)", resource_group)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value.lower().replace(" ", "") if column == "location" else value.lower())
+
+        with self._lock:
+            cursor = self._connect().execute(
+                "SELECT id, name, type, location, resource_group, subscription_id, kind, managed_by,"
+                f" sku, tags, properties FROM resources WHERE {' AND '.join(clauses)} ORDER BY resource_id",
+                params,
+            )
+            rows = cursor.fetchall()
+            self._counters["local_queries"] += 1
+
+        wanted_tags = {name.lower(): (value or "").lower() for name, value in (tags or {}).items()}
+        resources = []
+        for row in rows:
+            resource_tags = json.loads(row[9]) if row[9] else {}
+            if wanted_tags:
+                lowered = {name.lower(): str(value).lower() for name, value in resource_tags.items()}
+                if any(name not in lowered or (value and lowered[name] != value) for name, value in wanted_tags.items()):
+                    continue
+            resources.append({
+                "id": row[0], "name": row[1], "type": row[2], "location": row[3], "resourceGroup": row[4],
+                "subscriptionId": row[5], "kind": row[6], "managedBy": row[7],
+                "sku": json.loads(row[8]) if row[8] else None, "tags": resource_tags,
+                "properties": json.loads(row[10]) if row[10] else {},
+            })
+            if limit and len(resources) >= limit:
+                break
+        return resources
+
+    def locations(self, resource_ids: Iterable[str]) -> Dict[str, str]:
+        """Region per (lowercased) resource id for the ids present in the snapshot."""
+        keys = [resource_id.lower() for resource_id in resource_ids]
+        found: Dict[str, str] = {}
+        with self._lock:
+            connection = self._connect()
+            for start in range(0, len(keys), CHANGED_LOOKUP_CHUNK):
+                chunk = keys[start:start + CHANGED_LOOKUP_CHUNK]
+                rows = connection.execute(
+                    f"SELECT resource_id, location FROM resources"
+                    f" WHERE resource_id IN ({','.join('?' for _ in chunk)}) AND location != ''",
+                    chunk,
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._counters)
+
+
+inventory_store = InventoryStore()
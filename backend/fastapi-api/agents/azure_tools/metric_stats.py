@@ -0,0 +1,163 @@
+import itertools
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Absolute idle thresholds for metrics with a natural unit; an interval at or below the
+# threshold counts as idle
+IDLE_THRESHOLDS = {
+    "Percentage CPU": 5.0,
+}
+# Metrics without an absolute threshold are idle below this fraction of their own peak
+IDLE_RELATIVE_THRESHOLD = 0.05
+
+# Suffixes of the columns added next to each metric's mean
+STAT_SUFFIXES = ("max", "p95", "p99", "idle_fraction", "trend")
+
+
+def _timestamp(point: Any) -> Any:
+    # The mgmt SDK names it `time_stamp`, the query SDK `timestamp`
+    stamp = getattr(point, "time_stamp", None)
+    return stamp if stamp is not None else getattr(point, "timestamp", None)
+
+
+def metric_values(metric: Any, aggregation: str = 'Average') -> np.ndarray:
+    """
+    Load one Monitor metric (mgmt or query SDK) into a float array, one value per interval.
+
+    A metric split into several timeseries is aligned on the points' timestamps and averaged
+    per interval; missing points are NaN.
+    """
+    attribute = aggregation.lower()
+    timeseries = [series.data or [] for series in metric.timeseries]
+    if not timeseries:
+        return np.empty(0)
+    if len(timeseries) == 1:
+        return np.fromiter(
+            (np.nan if getattr(point, attribute, None) is None else getattr(point, attribute) for point in timeseries[0]),
+            dtype=float,
+        )
+    stamps = sorted({_timestamp(point) for points in timeseries for point in points}, key=lambda stamp: (stamp is None, stamp))
+    if stamps and stamps[-1] is None:
+        # Points without a timestamp can only be matched up by position
+        position = None
+        stacked = np.full((len(timeseries), max(len(points) for points in timeseries)), np.nan)
+    else:
+        position = {stamp: index for index, stamp in enumerate(stamps)}
+        stacked = np.full((len(timeseries), len(stamps)), np.nan)
+    for row, points in enumerate(timeseries):
+        for index, point in enumerate(points):
+            value = getattr(point, attribute, None)
+            if value is not None:
+                stacked[row, index if position is None else position[_timestamp(point)]] = value
+    with np.errstate(invalid="ignore"):
+        counts = np.sum(~np.isnan(stacked), axis=0)
+        totals = np.nansum(stacked, axis=0)
+        return np.where(counts > 0, totals / np.maximum(counts, 1), np.nan)
+
+
+def _pad(series: Sequence[Sequence[float]]) -> np.ndarray:
+    """Stack series of different lengths into a NaN-padded 2-D array."""
+    lengths = {len(values) for values in series}
+    if len(lengths) == 1:
+        # Equal lengths (the common case) convert in one call rather than row by row; plain
+        # lists (the stored daily values) are read as one flat stream of floats
+        if all(isinstance(values, np.ndarray) for values in series):
+            return np.array(series, dtype=float)
+        width = lengths.pop()
+        flat = np.fromiter(itertools.chain.from_iterable(series), dtype=float, count=len(series) * width)
+        return flat.reshape(len(series), width)
+    width = max(lengths, default=0)
+    matrix = np.full((len(series), width), np.nan)
+    for row, values in enumerate(series):
+        matrix[row, :len(values)] = values
+    return matrix
+
+
+def _percentile(ordered: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    """Linear-interpolated percentile per row of a NaN-last sorted matrix."""
+    position = (q / 100.0) * np.maximum(counts - 1, 0)
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, np.maximum(counts - 1, 0))
+    low_values = np.take_along_axis(ordered, lower[:, None], axis=1)[:, 0]
+    high_values = np.take_along_axis(ordered, upper[:, None], axis=1)[:, 0]
+    return low_values + (high_values - low_values) * (position - lower)
+
+
+def series_stats(matrix: np.ndarray, idle_thresholds: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Vectorized statistics for every row of a NaN-padded (series x intervals) matrix.
+
+    Args:
+        matrix (np.ndarray): One series per row; NaN marks missing intervals.
+        idle_thresholds (np.ndarray): Absolute idle threshold per row, NaN to use the relative one.
+
+    Returns:
+        Dict[str, np.ndarray]: `mean`, `max`, `p95`, `p99`, `idle_fraction` and `trend`
+            (slope per interval of a least-squares line), one value per row. Rows without
+            any data get 0 everywhere.
+    """
+    rows, width = matrix.shape
+    if rows == 0 or width == 0:
+        return {name: np.zeros(rows) for name in ("mean",) + STAT_SUFFIXES}
+
+    present = ~np.isnan(matrix)
+    counts = present.sum(axis=1)
+    has_data = counts > 0
+    safe_counts = np.maximum(counts, 1)
+    values = np.where(present, matrix, 0.0)
+    totals = values.sum(axis=1)
+    mean = totals / safe_counts
+
+    # np.sort places NaN last, so the first `count` entries of each row are its data
+    ordered = np.sort(matrix, axis=1)
+    peak = np.take_along_axis(ordered, np.maximum(counts - 1, 0)[:, None], axis=1)[:, 0]
+    peak = np.where(has_data, peak, 0.0)
+    p95 = _percentile(ordered, counts, 95)
+    p99 = _percentile(ordered, counts, 99)
+
+    thresholds = np.where(np.isnan(idle_thresholds), peak * IDLE_RELATIVE_THRESHOLD, idle_thresholds)
+    # NaN compares false, so missing intervals are never idle
+    idle_fraction = (matrix <= thresholds[:, None]).sum(axis=1) / safe_counts
+
+    # Least-squares slope from per-row sums; the matrix-vector products avoid more
+    # (series x intervals) temporaries. x is centered to keep the sums small.
+    x = np.arange(width, dtype=float) - (width - 1) / 2.0
+    weights = present.astype(float)
+    sum_x = weights @ x
+    denominator = weights @ (x * x) - sum_x * sum_x / safe_counts
+    numerator = values @ x - sum_x * totals / safe_counts
+    trend = np.divide(numerator, denominator, out=np.zeros(rows), where=denominator > 0)
+
+    stats = {"mean": mean, "max": peak, "p95": p95, "p99": p99, "idle_fraction": idle_fraction, "trend": trend}
+    return {name: np.where(has_data, column, 0.0) for name, column in stats.items()}
+
+
+def summarize_series(series: Mapping[Tuple[Hashable, str], Iterable[float]]) -> Dict[Hashable, Dict[str, float]]:
+    """
+    Summarize many (resource, metric) series in one vectorized pass.
+
+    Args:
+        series (Mapping[Tuple[Hashable, str], Iterable[float]]): Values per (resource key, metric name).
+
+    Returns:
+        Dict[Hashable, Dict[str, float]]: Columns per resource key: `<metric>` holds the mean
+            over all intervals, and `<metric>_max`, `<metric>_p95`, `<metric>_p99`,
+            `<metric>_idle_fraction` and `<metric>_trend` the other statistics.
+    """
+    keys: List[Tuple[Hashable, str]] = list(series.keys())
+    matrix = _pad(list(series.values()))
+    thresholds = np.array([IDLE_THRESHOLDS.get(metric, np.nan) for _, metric in keys], dtype=float)
+    stats = series_stats(matrix, thresholds)
+    # One (series x statistic) table converted in a single call, then zipped with the column names
+    table = np.round(np.column_stack([stats[name] for name in ("mean",) + STAT_SUFFIXES]), 4).tolist()
+
+    names = {metric: (metric,) + tuple(f"{metric}_{suffix}" for suffix in STAT_SUFFIXES) for metric in {metric for _, metric in keys}}
+    columns: Dict[Hashable, Dict[str, float]] = defaultdict(dict)
+    for (resource, metric), values in zip(keys, table):
+        columns[resource].update(zip(names[metric], values))
+    return dict(columns)
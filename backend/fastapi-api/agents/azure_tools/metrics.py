@@ -0,0 +1,265 @@
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import isodate
+
+from ..caching.tiered_cache import TieredCache
+from .clients import get_client_registry
+from .inventory import inventory_store
+from .metric_stats import metric_values, summarize_series
+from .metrics_store import daily_window, metrics_store
+from .resource_graph import iter_resource_graph_query, kql_string, parse_resource_id
+
+logger = logging.getLogger(__name__)
+
+# The metrics batch API accepts at most 50 resources per request, all from the same
+# subscription, region and metric namespace
+METRICS_BATCH_SIZE = 50
+# Resource ids per Resource Graph lookup when resolving missing locations
+LOCATION_LOOKUP_CHUNK = 500
+
+# Metric results are reused across analyses, retries and re-plans for this long (seconds)
+METRICS_CACHE_TTL = float(os.getenv("OPTIMONKEY_METRICS_CACHE_TTL", str(6 * 3600)))
+# SQLite file for the on-disk tier; set to an empty string to keep the cache in memory only
+METRICS_CACHE_PATH = os.getenv("OPTIMONKEY_METRICS_CACHE_PATH", os.path.join("data", "metrics_cache.sqlite"))
+
+metrics_cache = TieredCache(
+    "metrics",
+    path=METRICS_CACHE_PATH,
+    ttl=METRICS_CACHE_TTL,
+    memory_max_entries=int(os.getenv("OPTIMONKEY_METRICS_CACHE_MEMORY_ENTRIES", "4096")),
+    disk_max_entries=int(os.getenv("OPTIMONKEY_METRICS_CACHE_DISK_ENTRIES", "200000")),
+)
+
+# Bumped whenever the columns of a metrics row change, so older cached rows are not served
+METRICS_ROW_VERSION = 2
+
+# Default metrics and time grain per resource type (keys are lowercase resource types)
+METRIC_DEFAULTS = {
+    "microsoft.compute/virtualmachines": {
+        "metric_names": ['Percentage CPU', 'Network In', 'Network Out', 'Disk Read Bytes', 'Disk Write Bytes'],
+        "interval": 'P1D',  # Use daily intervals for VMs
+    },
+    "microsoft.storage/storageaccounts": {
+        "metric_names": ['UsedCapacity', 'Transactions', 'Ingress', 'Egress', 'Availability'],
+        "interval": 'PT1H',  # Always use hourly intervals for storage accounts
+        "fixed_interval": True,
+    },
+    "microsoft.compute/disks": {
+        "metric_names": ['Composite Disk Read Bytes/sec', 'Composite Disk Write Bytes/sec',
+                         'Composite Disk Read Operations/sec', 'Composite Disk Write Operations/sec', 'DiskPaidBurstIOPS'],
+        "interval": 'P1D',  # Use daily intervals for disks
+    },
+    "microsoft.network/publicipaddresses": {
+        "metric_names": ['Inbound Traffic', 'Outbound Traffic', 'Inbound Packets', 'Outbound Packets'],
+        "interval": 'P1D',  # Use daily intervals for public IP addresses
+    },
+}
+
+
+def resolve_metric_defaults(
+    resource_type: str,
+    metric_names: Optional[List[str]] = None,
+    interval: Optional[str] = None,
+) -> Tuple[List[str], str, str]:
+    """
+    Fill in default metric names and time grain for a resource type.
+
+    Returns:
+        Tuple[List[str], str, str]: metric names, interval and metric namespace.
+    """
+    # Normalize the resource_type to lowercase for case-insensitive comparison
+    metricnamespace = resource_type.lower()
+    defaults = METRIC_DEFAULTS.get(metricnamespace)
+    if defaults is None:
+        raise ValueError(f"Unsupported resource type: {resource_type}")
+
+    metric_names = metric_names or list(defaults["metric_names"])
+    if defaults.get("fixed_interval") or not interval:
+        interval = defaults["interval"]
+    return metric_names, interval, metricnamespace
+
+
+def metrics_cache_key(resource_id: str, metric_names: List[str], aggregation: str, timespan: str, interval: str) -> str:
+    """Cache key for one resource's metric query; expects metric names and interval already resolved."""
+    return TieredCache.make_key(
+        METRICS_ROW_VERSION, resource_id.lower(), list(metric_names), aggregation.lower(), timespan, interval
+    )
+
+
+def _metric_name(metric: Any) -> str:
+    # azure-mgmt-monitor returns a LocalizableString, azure-monitor-query a plain str
+    return getattr(metric.name, "value", metric.name)
+
+
+def summarize_metrics(metrics: Iterable[Any], aggregation: str = 'Average') -> Dict[str, float]:
+    """Mean, peak, percentile, idle and trend columns for every metric of one resource."""
+    series = {(None, _metric_name(metric)): metric_values(metric, aggregation) for metric in metrics}
+    return summarize_series(series).get(None, {})
+
+
+def stored_usage(resource_id: str, metric_names: List[str], aggregation: str, days: int) -> Dict[str, float]:
+    """The same columns as `summarize_metrics`, computed from the daily values in the metrics store."""
+    series = metrics_store.daily_series(resource_id, metric_names, aggregation, days)
+    return summarize_series({(None, name): values for name, values in series.items()}).get(None, {})
+
+
+def _resolve_locations(resource_ids: List[str], subscriptions: List[str]) -> Dict[str, str]:
+    """Look up the region of each resource in the inventory snapshot, then in Resource Graph for the rest."""
+    locations = inventory_store.locations(resource_ids)
+    unknown = [resource_id for resource_id in resource_ids if resource_id.lower() not in locations]
+    for start in range(0, len(unknown), LOCATION_LOOKUP_CHUNK):
+        chunk = unknown[start:start + LOCATION_LOOKUP_CHUNK]
+        id_list = ", ".join(kql_string(resource_id) for resource_id in chunk)
+        query = f"Resources | where id in~ ({id_list}) | project id, location"
+        for row in iter_resource_graph_query(query, subscriptions):
+            locations[row["id"].lower()] = row["location"]
+    return locations
+
+
+def query_usage_metrics_batch(
+    resource_ids: List[str],
+    metric_names: Optional[List[str]] = None,
+    aggregation: str = 'Average',
+    timespan: str = 'P30D',
+    interval: Optional[str] = None,
+    locations: Optional[Dict[str, str]] = None,
+) -> List[Dict]:
+    """
+    Query usage metrics for many Azure resources with as few Monitor requests as possible.
+
+    Resources are grouped by subscription, region and resource type and each group is sent
+    to the regional metrics batch endpoint in chunks of 50. Resources with a cached result
+    for the same query are not requested again, and daily windows only request the days
+    missing from the local metrics store. Resources the batch endpoint cannot serve (region
+    unknown, or their batch request failed) are queried one by one through the concurrent
+    async collector instead.
+
+    Args:
+        resource_ids (List[str]): Azure resource IDs; different types and subscriptions may be mixed.
+        metric_names (List[str], optional): Metric names to query. Defaults are used per resource type.
+        aggregation (str): The type of aggregation to use (e.g., 'Average' for percentage metrics).
+        timespan (str): The timespan to query over (e.g., 'P30D' for 30 days).
+        interval (str, optional): The granularity of the data (e.g., 'P1D' for daily or 'PT1H' for hourly).
+        locations (Dict[str, str], optional): Region per resource ID; missing ones are looked up in Resource Graph.
+
+    Returns:
+        List[Dict]: One row per resource with `resource_id`, `resource_type` and the columns of
+            `summarize_metrics` for each metric.
+            Resources that could not be queried carry an `error` column instead.
+    """
+    locations = {resource_id.lower(): location for resource_id, location in (locations or {}).items()}
+    rows: Dict[str, Dict] = {}
+    parsed = {}
+
+    for resource_id in dict.fromkeys(resource_ids):
+        parts = parse_resource_id(resource_id)
+        if parts is None:
+            rows[resource_id] = {"resource_id": resource_id, "error": "Invalid resource ID"}
+            continue
+        if parts["resource_type"].lower() not in METRIC_DEFAULTS:
+            rows[resource_id] = {"resource_id": resource_id, "resource_type": parts["resource_type"],
+                                 "error": f"Unsupported resource type: {parts['resource_type']}"}
+            continue
+        names, grain, _ = resolve_metric_defaults(parts["resource_type"], metric_names, interval)
+        cached = metrics_cache.get(metrics_cache_key(resource_id, names, aggregation, timespan, grain))
+        if cached is not None:
+            rows[resource_id] = dict(cached)
+            continue
+        parsed[resource_id] = parts
+
+    missing = [resource_id for resource_id in parsed if resource_id.lower() not in locations]
+    if missing:
+        subscriptions = sorted({parsed[resource_id]["subscription_id"] for resource_id in missing})
+        locations.update(_resolve_locations(missing, subscriptions))
+
+    # Daily windows are grouped by the range still missing from the metrics store as well,
+    # so resources scanned yesterday share one request for the new day
+    groups: Dict[Tuple[str, str, str, Optional[Tuple[datetime, datetime]]], List[str]] = defaultdict(list)
+    # Raw values per (resource, metric), summarized for all resources at once at the end
+    series: Dict[Tuple[str, str], Any] = {}
+    cache_keys: Dict[str, str] = {}
+    # Resources left to the per-resource async collector
+    fallback: List[str] = []
+    for resource_id, parts in parsed.items():
+        location = locations.get(resource_id.lower())
+        if not location:
+            fallback.append(resource_id)
+            continue
+        pending = None
+        names, grain, _ = resolve_metric_defaults(parts["resource_type"], metric_names, interval)
+        days = daily_window(timespan, grain)
+        if days is not None:
+            pending = metrics_store.pending_range(resource_id, names, aggregation, days)
+            if pending is None:
+                rows[resource_id] = {"resource_id": resource_id, "resource_type": parts["resource_type"]}
+                for name, values in metrics_store.daily_series(resource_id, names, aggregation, days).items():
+                    series[(resource_id, name)] = values
+                cache_keys[resource_id] = metrics_cache_key(resource_id, names, aggregation, timespan, grain)
+                continue
+        groups[(parts["subscription_id"], location, parts["resource_type"].lower(), pending)].append(resource_id)
+
+    requests_made = 0
+    for (subscription, location, resource_type, pending), group_ids in groups.items():
+        names, grain, namespace = resolve_metric_defaults(resource_type, metric_names, interval)
+        metrics_client = get_client_registry().get_metrics_client(location)
+        days = daily_window(timespan, grain)
+        query_timespan = pending if pending is not None else isodate.parse_duration(timespan)
+
+        for start in range(0, len(group_ids), METRICS_BATCH_SIZE):
+            chunk = group_ids[start:start + METRICS_BATCH_SIZE]
+            requests_made += 1
+            try:
+                results = metrics_client.query_resources(
+                    resource_ids=chunk,
+                    metric_namespace=namespace,
+                    metric_names=names,
+                    timespan=query_timespan,
+                    granularity=isodate.parse_duration(grain),
+                    aggregations=[aggregation],
+                )
+            except Exception as e:
+                logger.warning(f"Batch metrics query failed for {len(chunk)} {resource_type} in {location}, querying them one by one: {e}")
+                fallback.extend(chunk)
+                continue
+
+            by_id = {result.resource_id.lower(): result for result in results if result.resource_id}
+            for resource_id in chunk:
+                row = {"resource_id": resource_id, "resource_type": parsed[resource_id]["resource_type"]}
+                result = by_id.get(resource_id.lower())
+                if result is None:
+                    row["error"] = "No metrics returned"
+                elif pending is not None:
+                    metrics_store.record(resource_id, result.metrics, names, aggregation, pending[1], pending[0])
+                    for name, values in metrics_store.daily_series(resource_id, names, aggregation, days).items():
+                        series[(resource_id, name)] = values
+                    cache_keys[resource_id] = metrics_cache_key(resource_id, names, aggregation, timespan, grain)
+                else:
+                    for metric in result.metrics:
+                        series[(resource_id, _metric_name(metric))] = metric_values(metric, aggregation)
+                    cache_keys[resource_id] = metrics_cache_key(resource_id, names, aggregation, timespan, grain)
+                rows[resource_id] = row
+
+    if fallback:
+        # async_metrics imports this module, so it is imported here
+        from .async_metrics import fetch_usage_metrics
+
+        for row in fetch_usage_metrics(
+            fallback, metric_names=metric_names, aggregation=aggregation, timespan=timespan, interval=interval
+        ):
+            rows[row["resource_id"]] = {"resource_type": parsed[row["resource_id"]]["resource_type"], **row}
+
+    for resource_id, columns in summarize_series(series).items():
+        rows[resource_id].update(columns)
+    for resource_id, cache_key in cache_keys.items():
+        metrics_cache.set(cache_key, rows[resource_id])
+
+    logger.info(
+        f"Fetched metrics for {len(resource_ids)} resources with {requests_made} batch requests "
+        f"and {len(fallback)} single-resource requests ({len(parsed)} not cached)"
+    )
+    # Keep the caller's ordering in the consolidated table
+    return [rows[resource_id] for resource_id in dict.fromkeys(resource_ids)]
@@ -0,0 +1,224 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# SQLite file holding one aggregate per resource, metric and day
+METRICS_STORE_PATH = os.getenv("OPTIMONKEY_METRICS_STORE_PATH", os.path.join("data", "metrics_store.sqlite"))
+# Daily points older than this are pruned when the store is opened
+METRICS_STORE_RETENTION_DAYS = int(os.getenv("OPTIMONKEY_METRICS_STORE_RETENTION_DAYS", "93"))
+
+_DAILY_TIMESPAN = re.compile(r"^P(\d+)D$", re.IGNORECASE)
+
+
+def daily_window(timespan: str, interval: str) -> Optional[int]:
+    """Number of days for a daily-grain query over `P<n>D`, or None if the query is not daily."""
+    match = _DAILY_TIMESPAN.match(timespan or "")
+    if match is None or (interval or "").upper() != "P1D":
+        return None
+    return int(match.group(1))
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def _metric_key(name: str) -> str:
+    """Stored form of a metric name: Monitor matches names case-insensitively, so the store does too."""
+    return name.casefold()
+
+
+def _point_day(point: Any) -> Optional[date]:
+    # azure-mgmt-monitor uses `time_stamp`, azure-monitor-query uses `timestamp`
+    stamp = getattr(point, "time_stamp", None) or getattr(point, "timestamp", None)
+    return stamp.date() if stamp is not None else None
+
+
+class MetricsStore:
+    """
+    Local time-series store of per-resource daily metric aggregates.
+
+    Only complete UTC days are stored. For each (resource, metric, aggregation) the store
+    remembers the contiguous range of days fetched, so a recurring scan only asks Monitor
+    for the days that passed since the previous one and reads the rest of the window
+    locally; a window reaching further back than that range is fetched in full.
+    """
+
+    def __init__(self, path: str = METRICS_STORE_PATH, retention_days: int = METRICS_STORE_RETENTION_DAYS):
+        self.path = path
+        self.retention_days = retention_days
+        self._lock = threading.RLock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._counters = {"days_fetched": 0, "days_read": 0, "up_to_date": 0, "tail_fetches": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS daily_metrics ("
+                " resource_id TEXT NOT NULL, metric TEXT NOT NULL, aggregation TEXT NOT NULL,"
+                " day TEXT NOT NULL, value REAL,"
+                " PRIMARY KEY (resource_id, metric, aggregation, day))"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS fetch_log ("
+                " resource_id TEXT NOT NULL, metric TEXT NOT NULL, aggregation TEXT NOT NULL,"
+                " fetched_through TEXT NOT NULL, fetched_from TEXT,"
+                " PRIMARY KEY (resource_id, metric, aggregation))"
+            )
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(fetch_log)")}
+            if "fetched_from" not in columns:
+                # Logs written before the start of the range was tracked; their windows are fetched in full once
+                connection.execute("ALTER TABLE fetch_log ADD COLUMN fetched_from TEXT")
+            # Rows written before metric names were normalized
+            connection.execute("UPDATE OR REPLACE daily_metrics SET metric = lower(metric) WHERE metric <> lower(metric)")
+            connection.execute("UPDATE OR REPLACE fetch_log SET metric = lower(metric) WHERE metric <> lower(metric)")
+            cutoff = (_today() - timedelta(days=self.retention_days)).isoformat()
+            connection.execute("DELETE FROM daily_metrics WHERE day < ?", (cutoff,))
+            self._connection = connection
+        return self._connection
+
+    def pending_range(
+        self, resource_id: str, metric_names: List[str], aggregation: str, days: int
+    ) -> Optional[Tuple[datetime, datetime]]:
+        """
+        The (start, end) interval that still has to be fetched for the last `days` complete days,
+        or None if the store already covers it.
+        """
+        today = _today()
+        window_start = today - timedelta(days=days)
+        keys = sorted({_metric_key(name) for name in metric_names})
+        with self._lock:
+            connection = self._connect()
+            placeholders = ",".join("?" for _ in keys)
+            rows = connection.execute(
+                f"SELECT metric, fetched_from, fetched_through FROM fetch_log"
+                f" WHERE resource_id = ? AND aggregation = ? AND metric IN ({placeholders})",
+                (resource_id.lower(), aggregation.lower(), *keys),
+            ).fetchall()
+
+        # The stored days cover the window only if every metric was fetched from its first day
+        # on, and that day has not been pruned since
+        retained_from = today - timedelta(days=self.retention_days)
+        covered = (
+            len(rows) == len(keys)
+            and window_start >= retained_from
+            and all(first is not None and date.fromisoformat(first) <= window_start for _, first, _ in rows)
+        )
+        if not covered:
+            start = window_start
+        else:
+            start = max(min(date.fromisoformat(through) for _, _, through in rows) + timedelta(days=1), window_start)
+
+        if start >= today:
+            self._counters["up_to_date"] += 1
+            return None
+        if start > window_start:
+            self._counters["tail_fetches"] += 1
+        return _midnight(start), _midnight(today)
+
+    def record(
+        self,
+        resource_id: str,
+        metrics: Iterable[Any],
+        metric_names: List[str],
+        aggregation: str,
+        fetched_until: datetime,
+        fetched_from: Optional[datetime] = None,
+    ):
+        """
+        Store daily points from Monitor metric objects (mgmt or query SDK).
+
+        Points of a metric's separate timeseries are averaged per day. The days from
+        `fetched_from` to `fetched_until` (exclusive) are marked as fetched for every requested
+        metric, including metrics for which Monitor returned no data; a fetch that continues
+        the previous range extends it. Metric names are stored case-folded, so the name
+        Monitor returns and the name that was requested share one key.
+        """
+        attribute = aggregation.lower()
+        today = _today()
+        daily: Dict[Tuple[str, date], List[float]] = defaultdict(list)
+
+        for metric in metrics:
+            name = _metric_key(getattr(metric.name, "value", metric.name))
+            for timeseries in metric.timeseries:
+                for point in timeseries.data:
+                    day = _point_day(point)
+                    value = getattr(point, attribute, None)
+                    # Today's partial day is re-fetched on the next scan instead of being frozen
+                    if day is None or value is None or day >= today:
+                        continue
+                    daily[(name, day)].append(value)
+
+        rows = [
+            (resource_id.lower(), name, attribute, day.isoformat(), sum(values) / len(values))
+            for (name, day), values in daily.items()
+        ]
+        fetched_through = (fetched_until.date() - timedelta(days=1)).isoformat()
+        first_day = fetched_from.date().isoformat() if fetched_from is not None else None
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN")
+            try:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO daily_metrics (resource_id, metric, aggregation, day, value) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                # A fetch starting at most one day after the stored range extends it; otherwise it starts a new one
+                connection.executemany(
+                    "INSERT INTO fetch_log (resource_id, metric, aggregation, fetched_through, fetched_from) VALUES (?, ?, ?, ?, ?)"
+                    " ON CONFLICT (resource_id, metric, aggregation) DO UPDATE SET"
+                    " fetched_from = CASE WHEN fetch_log.fetched_from < excluded.fetched_from"
+                    " AND date(fetch_log.fetched_through, '+1 day') >= excluded.fetched_from"
+                    " THEN fetch_log.fetched_from ELSE excluded.fetched_from END,"
+                    " fetched_through = excluded.fetched_through",
+                    [
+                        (resource_id.lower(), key, attribute, fetched_through, first_day)
+                        for key in {_metric_key(name) for name in metric_names}
+                    ],
+                )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            self._counters["days_fetched"] += len(rows)
+
+    def daily_series(self, resource_id: str, metric_names: List[str], aggregation: str, days: int) -> Dict[str, List[float]]:
+        """Stored daily values of the last `days` complete days, oldest first, per metric (keyed as requested)."""
+        today = _today()
+        window_start = (today - timedelta(days=days)).isoformat()
+        keys = {_metric_key(name): name for name in metric_names}
+        placeholders = ",".join("?" for _ in keys)
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT metric, value FROM daily_metrics"
+                f" WHERE resource_id = ? AND aggregation = ? AND metric IN ({placeholders})"
+                f" AND day >= ? AND day < ? ORDER BY day",
+                (resource_id.lower(), aggregation.lower(), *keys, window_start, today.isoformat()),
+            ).fetchall()
+
+        series: Dict[str, List[float]] = {name: [] for name in keys.values()}
+        for metric, value in rows:
+            series[keys[metric]].append(value)
+        self._counters["days_read"] += len(rows)
+        return series
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._counters)
+
+
+metrics_store = MetricsStore()
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .clients import get_client_registry
+from .resource_graph import QueryCancelled
+from .waste_rules import detect_waste
+
+logger = logging.getLogger(__name__)
+
+MANAGEMENT_SCOPE = "https://management.azure.com/.default"
+
+# How many speculative prefetches were started, handed to an analysis, or thrown away
+prefetch_counters = {"started": 0, "used": 0, "cancelled": 0, "failed": 0}
+
+
+class PrefetchCancelled(QueryCancelled):
+    """Raised inside the prefetch thread when the prompt was rejected while it was running."""
+
+
+class InventoryPrefetch:
+    """
+    Speculative Azure warm-up that runs while the prompt is still being validated.
+
+    Acquires a management token and refreshes the inventory snapshot and waste findings
+    of the given subscriptions in a worker thread. `result()` hands the findings to an
+    accepted analysis; `cancel()` stops a rejected one at the next step boundary: the
+    cancel event is passed down to the inventory refresh and checked between Resource
+    Graph pages, so a page already in flight completes but nothing else is fetched.
+    """
+
+    def __init__(self, subscriptions: List[str]):
+        self.subscriptions = subscriptions
+        self._cancelled = threading.Event()
+        self._task = asyncio.create_task(asyncio.to_thread(self._run))
+        self._task.add_done_callback(self._on_done)
+        prefetch_counters["started"] += 1
+
+    def _check(self):
+        if self._cancelled.is_set():
+            raise PrefetchCancelled()
+
+    def _run(self) -> Tuple[List[Dict], List[Dict]]:
+        get_client_registry().get_credential().get_token(MANAGEMENT_SCOPE)
+        self._check()
+        return detect_waste(self.subscriptions, cancelled=self._cancelled)
+
+    @staticmethod
+    def _on_done(task: asyncio.Task):
+        # Retrieve the outcome so failures of abandoned prefetches are logged, not reported as unretrieved
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None and not isinstance(error, QueryCancelled):
+            prefetch_counters["failed"] += 1
+            logger.warning(f"Speculative inventory prefetch failed: {error}")
+
+    def cancel(self):
+        self._cancelled.set()
+        self._task.cancel()
+        prefetch_counters["cancelled"] += 1
+
+    async def result(self) -> Tuple[List[Dict], List[Dict]]:
+        """Waste findings and ambiguous cases for the subscriptions; raises if the prefetch failed."""
+        findings = await self._task
+        prefetch_counters["used"] += 1
+        return findings
+
+
+def start_prefetch(subscriptions: List[str]) -> Optional[InventoryPrefetch]:
+    """Start a prefetch for the subscriptions named in a prompt, or return None if there are none."""
+    return InventoryPrefetch(sorted(set(subscriptions))) if subscriptions else None
+
+
+def prefetch_stats() -> Dict[str, int]:
+    return dict(prefetch_counters)
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterator, List, Optional
+
+from .clients import get_client_registry
+
+if TYPE_CHECKING:
+    from azure.mgmt.resourcegraph import ResourceGraphClient
+    from azure.mgmt.resourcegraph.models import QueryResponse
+
+logger = logging.getLogger(__name__)
+
+# Resource Graph returns at most 1000 rows per page
+MAX_PAGE_SIZE = 1000
+
+
+def kql_string(value: str) -> str:
+    """Quote `value` as a KQL string literal (backslashes and single quotes escaped)."""
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+class QueryCancelled(Exception):
+    """Raised by `iter_resource_graph_query` when its `cancelled` event is set between two pages."""
+
+
+def parse_resource_id(resource_id: str) -> Optional[Dict[str, str]]:
+    """
+    Split an ARM resource ID into its subscription, resource group and resource type.
+
+    Returns None if the string is not a resource ID below a resource provider.
+    """
+    parts = [part for part in resource_id.split("/") if part]
+    lowered = [part.lower() for part in parts]
+    if len(parts) < 2 or lowered[0] != "subscriptions" or "providers" not in lowered:
+        return None
+    provider_index = len(lowered) - 1 - lowered[::-1].index("providers")
+    # Type segments alternate with name segments: <namespace>/<type>/<name>[/<child type>/<name>...]
+    type_segments = parts[provider_index + 2::2]
+    if provider_index + 1 >= len(parts) or not type_segments:
+        return None
+    resource_group = parts[lowered.index("resourcegroups") + 1] if "resourcegroups" in lowered else None
+    return {
+        "subscription_id": parts[1],
+        "resource_group": resource_group,
+        "resource_type": "/".join([parts[provider_index + 1]] + type_segments),
+        "name": parts[-1],
+    }
+
+
+def _fetch_page(
+    client: "ResourceGraphClient",
+    query: str,
+    subscriptions: List[str],
+    page_size: int,
+    skip_token: Optional[str] = None,
+    management_groups: Optional[List[str]] = None,
+) -> "QueryResponse":
+    """Fetch a single page of a Resource Graph query."""
+    from azure.mgmt.resourcegraph.models import QueryRequest, QueryRequestOptions
+
+    options = QueryRequestOptions(top=page_size, skip_token=skip_token, result_format="objectArray")
+    response = client.resources(QueryRequest(
+        query=query, subscriptions=subscriptions or None, management_groups=management_groups, options=options
+    ))
+    if response.skip_token is None and str(response.result_truncated).lower() == "true":
+        # Paging needs the `id` column in the projection; without it Resource Graph truncates silently
+        logger.warning("Resource Graph result truncated without a skip token; include `id` in the projection to page through all rows")
+    return response
+
+
+def iter_resource_graph_query(
+    query: str,
+    subscriptions: List[str],
+    page_size: int = MAX_PAGE_SIZE,
+    max_rows: Optional[int] = None,
+    client: Optional["ResourceGraphClient"] = None,
+    management_groups: Optional[List[str]] = None,
+    cancelled: Optional[threading.Event] = None,
+) -> Iterator[Dict]:
+    """
+    Run a Resource Graph query and yield its rows page by page, following `$skipToken`.
+
+    The next page is requested in the background while the rows of the current one are
+    consumed, so at most two pages are held in memory regardless of the estate size.
+
+    Args:
+        query (str): The KQL query to execute.
+        subscriptions (List[str]): List of subscription IDs.
+        page_size (int): Rows per page (`$top`), capped at 1000.
+        max_rows (int, optional): Stop after this many rows.
+        client (ResourceGraphClient, optional): Client to use; defaults to the shared registry client.
+        management_groups (List[str], optional): Management groups to query instead of subscriptions.
+        cancelled (threading.Event, optional): Checked before each page; once set, no further page
+            is requested and QueryCancelled is raised.
+
+    Yields:
+        Dict: One result row.
+    """
+    client = client or get_client_registry().get_resource_graph_client()
+    page_size = min(page_size, MAX_PAGE_SIZE)
+    if max_rows is not None:
+        # A capped query never needs pages larger than the cap
+        page_size = max(min(page_size, max_rows), 1)
+    rows_yielded = 0
+
+    if cancelled is not None and cancelled.is_set():
+        raise QueryCancelled()
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="resource-graph-page") as prefetcher:
+        pending = prefetcher.submit(_fetch_page, client, query, subscriptions, page_size, None, management_groups)
+        while pending is not None:
+            response = pending.result()
+            pending = None
+            if cancelled is not None and cancelled.is_set():
+                raise QueryCancelled()
+            # Skip the prefetch when this page already reaches max_rows: a page in flight cannot be
+            # cancelled, and leaving the executor would wait for it
+            if response.skip_token and (max_rows is None or rows_yielded + len(response.data) < max_rows):
+                pending = prefetcher.submit(
+                    _fetch_page, client, query, subscriptions, page_size, response.skip_token, management_groups
+                )
+
+            for row in response.data:
+                yield row
+                rows_yielded += 1
+                if max_rows is not None and rows_yielded >= max_rows:
+                    if pending is not None:
+                        pending.cancel()
+                    return
+
+
+async def aiter_resource_graph_query(
+    query: str,
+    subscriptions: List[str],
+    page_size: int = MAX_PAGE_SIZE,
+    max_rows: Optional[int] = None,
+    client: Optional["ResourceGraphClient"] = None,
+) -> AsyncIterator[Dict]:
+    """
+    Async variant of `iter_resource_graph_query`.
+
+    Pages are fetched in a worker thread and the next page is already in flight while the
+    caller processes the rows of the current one.
+    """
+    client = client or get_client_registry().get_resource_graph_client()
+    page_size = min(page_size, MAX_PAGE_SIZE)
+    if max_rows is not None:
+        page_size = max(min(page_size, max_rows), 1)
+    rows_yielded = 0
+
+    pending = asyncio.ensure_future(asyncio.to_thread(_fetch_page, client, query, subscriptions, page_size))
+    try:
+        while pending is not None:
+            response = await pending
+            pending = None
+            if response.skip_token and (max_rows is None or rows_yielded + len(response.data) < max_rows):
+                pending = asyncio.ensure_future(
+                    asyncio.to_thread(_fetch_page, client, query, subscriptions, page_size, response.skip_token)
+                )
+
+            for row in response.data:
+                yield row
+                rows_yielded += 1
+                if max_rows is not None and rows_yielded >= max_rows:
+                    return
+    finally:
+        if pending is not None:
+            pending.cancel()
@@ -0,0 +1,189 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .inventory import inventory_store
+
+logger = logging.getLogger(__name__)
+
+# Resources created more recently than this (days) are left to the agents instead of being flagged
+WASTE_GRACE_DAYS = float(os.getenv("OPTIMONKEY_WASTE_GRACE_DAYS", "7"))
+
+# Resource types the rules read from the inventory snapshot
+WASTE_RESOURCE_TYPES = (
+    "microsoft.compute/disks",
+    "microsoft.network/publicipaddresses",
+    "microsoft.network/networkinterfaces",
+    "microsoft.compute/virtualmachines",
+)
+
+_DEALLOCATED = "powerstate/deallocated"
+
+# Properties that show a public IP address is in use: a NIC/load balancer IP configuration,
+# a NAT gateway, or a service (e.g. Bastion, VPN gateway) linked to it
+_PUBLIC_IP_USERS = ("ipConfiguration", "natGateway", "servicePublicIPAddress", "linkedPublicIPAddress")
+# Properties that show a network interface is in use besides a VM
+_NIC_USERS = ("virtualMachine", "privateEndpoint", "privateLinkService", "hostedWorkloads")
+
+
+def _get(data: Optional[Dict], *path: str) -> Any:
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def _in_use(properties: Dict, users: Tuple[str, ...]) -> bool:
+    # Empty values (e.g. `hostedWorkloads: []`) do not count as a user
+    return any(properties.get(user) for user in users)
+
+
+def _created_at(properties: Dict) -> float:
+    created = properties.get("timeCreated")
+    if not created:
+        return np.nan
+    try:
+        return datetime.fromisoformat(created.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return np.nan
+
+
+def _columns(resources: List[Dict]) -> Dict[str, np.ndarray]:
+    """Flatten the fields the rules need into aligned NumPy columns, one entry per resource."""
+    properties = [resource.get("properties") or {} for resource in resources]
+    return {
+        "type": np.array([(resource.get("type") or "").lower() for resource in resources], dtype=object),
+        "id": np.array([resource["id"].lower() for resource in resources], dtype=object),
+        "managed_by": np.array([(resource.get("managedBy") or "").lower() for resource in resources], dtype=object),
+        "sku": np.array([(_get(resource, "sku", "name") or "") for resource in resources], dtype=object),
+        "disk_state": np.array([(props.get("diskState") or "") for props in properties], dtype=object),
+        "ip_in_use": np.array([_in_use(props, _PUBLIC_IP_USERS) for props in properties], dtype=bool),
+        "nic_in_use": np.array([_in_use(props, _NIC_USERS) for props in properties], dtype=bool),
+        "power_state": np.array(
+            [(_get(props, "extended", "instanceView", "powerState", "code") or "").lower() for props in properties],
+            dtype=object,
+        ),
+        "created_at": np.array([_created_at(props) for props in properties], dtype=float),
+    }
+
+
+def evaluate_waste_rules(resources: List[Dict], now: Optional[float] = None) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Apply the waste rules to inventory rows in one vectorized pass.
+
+    Rules:
+        - unattached managed disks
+        - public IP addresses used by no IP configuration, NAT gateway or linked service
+        - network interfaces used by no VM, private endpoint, private link service or hosted workload
+        - premium disks held by deallocated VMs
+
+    Args:
+        resources (List[Dict]): Resource Graph / inventory rows with id, type, managedBy, sku and properties.
+        now (float, optional): Reference time for the grace period, defaults to the current time.
+
+    Returns:
+        Tuple[List[Dict], List[Dict]]: Recommendations that need no further analysis, and
+            ambiguous findings (recently created, or in a transitional state) for the agents.
+    """
+    if not resources:
+        return [], []
+    now = time.time() if now is None else now
+    columns = _columns(resources)
+    kind = columns["type"]
+
+    is_disk = kind == "microsoft.compute/disks"
+    is_ip = kind == "microsoft.network/publicipaddresses"
+    is_nic = kind == "microsoft.network/networkinterfaces"
+    is_vm = kind == "microsoft.compute/virtualmachines"
+
+    deallocated_vms = set(columns["id"][is_vm & (columns["power_state"] == _DEALLOCATED)])
+    held_by_deallocated = np.fromiter((owner in deallocated_vms for owner in columns["managed_by"]), dtype=bool, count=len(resources))
+    premium = np.fromiter((sku.startswith(("Premium", "UltraSSD")) for sku in columns["sku"]), dtype=bool, count=len(resources))
+    no_owner = columns["managed_by"] == ""
+
+    rules = {
+        "unattached_disk": is_disk & no_owner,
+        "unassociated_public_ip": is_ip & ~columns["ip_in_use"],
+        "orphan_nic": is_nic & ~columns["nic_in_use"],
+        "premium_disk_on_deallocated_vm": is_disk & premium & held_by_deallocated,
+    }
+
+    # Recently created resources may still be in the middle of a deployment, and disks
+    # without an owner that are not plainly "Unattached" (ActiveSAS, ActiveUpload, Reserved)
+    # are being used in ways the inventory cannot see
+    recent = (now - columns["created_at"]) < WASTE_GRACE_DAYS * 86400
+    transitional = is_disk & no_owner & (columns["disk_state"] != "Unattached")
+    ambiguous = recent | transitional
+
+    confirmed: List[Dict] = []
+    uncertain: List[Dict] = []
+    for rule, mask in rules.items():
+        for index in np.flatnonzero(mask):
+            finding = _recommendation(resources[index], rule)
+            if ambiguous[index]:
+                finding["reason"] = "recently created" if recent[index] else f"disk state {columns['disk_state'][index]}"
+                uncertain.append(finding)
+            else:
+                confirmed.append(finding)
+    return confirmed, uncertain
+
+
+_RULE_TEXT = {
+    "unattached_disk": (
+        "Managed disk is not attached to any VM.",
+        "Snapshot the disk if its data is still needed, then delete it.",
+    ),
+    "unassociated_public_ip": (
+        "Public IP address is not associated with any resource.",
+        "Delete the public IP address, or downgrade it to Basic/dynamic if it must be kept.",
+    ),
+    "orphan_nic": (
+        "Network interface is used by no VM, private endpoint, private link service or hosted workload.",
+        "Delete the network interface.",
+    ),
+    "premium_disk_on_deallocated_vm": (
+        "Premium disk is attached to a deallocated VM and is still billed at the premium rate.",
+        "Switch the disk to Standard HDD/SSD while the VM is deallocated, or delete the VM and its disks if unused.",
+    ),
+}
+
+
+def _recommendation(resource: Dict, rule: str) -> Dict:
+    finding, action = _RULE_TEXT[rule]
+    return {
+        "resourceId": resource["id"],
+        "resourceName": resource.get("name"),
+        "resourceType": resource.get("type"),
+        "resourceGroup": resource.get("resourceGroup"),
+        "location": resource.get("location"),
+        "sku": _get(resource, "sku", "name"),
+        "rule": rule,
+        "finding": finding,
+        "recommendation": action,
+    }
+
+
+def detect_waste(
+    subscriptions: List[str], cancelled: Optional[threading.Event] = None
+) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Refresh the inventory of `subscriptions` if needed and run the waste rules over it.
+    Setting `cancelled` stops the inventory refresh at its next Resource Graph page.
+    """
+    inventory_store.ensure_fresh(subscriptions, cancelled=cancelled)
+    resources: List[Dict] = []
+    for resource_type in WASTE_RESOURCE_TYPES:
+        resources.extend(inventory_store.query(subscriptions, resource_type=resource_type))
+    started = time.perf_counter()
+    confirmed, uncertain = evaluate_waste_rules(resources)
+    logger.info(
+        f"Waste rules over {len(resources)} resources: {len(confirmed)} recommendations, "
+        f"{len(uncertain)} ambiguous in {(time.perf_counter() - started) * 1000:.1f} ms"
+    )
+    return confirmed, uncertain
@@ -0,0 +1,106 @@
+import logging
+import os
+from types import TracebackType
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type
+
+from .tiered_cache import TieredCache
+
+logger = logging.getLogger(__name__)
+
+# Completions are reused for this long (seconds); prompts and tool schemas rarely change within a day
+COMPLETION_CACHE_TTL = float(os.getenv("OPTIMONKEY_COMPLETION_CACHE_TTL", str(24 * 3600)))
+# SQLite file for the on-disk tier; set to an empty string to keep the cache in memory only
+COMPLETION_CACHE_PATH = os.getenv("OPTIMONKEY_COMPLETION_CACHE_PATH", os.path.join("data", "completion_cache.sqlite"))
+
+# Request options that change how a call is made, not what the model answers
+_UNKEYED_PARAMS = {"max_retries", "timeout", "extra_headers", "user"}
+
+completion_cache = TieredCache(
+    "completions",
+    path=COMPLETION_CACHE_PATH,
+    ttl=COMPLETION_CACHE_TTL,
+    memory_max_entries=int(os.getenv("OPTIMONKEY_COMPLETION_CACHE_MEMORY_ENTRIES", "2048")),
+    disk_max_entries=int(os.getenv("OPTIMONKEY_COMPLETION_CACHE_DISK_ENTRIES", "50000")),
+    disk_max_bytes=int(os.getenv("OPTIMONKEY_COMPLETION_CACHE_DISK_MB", "512")) * 1024 * 1024,
+)
+
+
+def completion_key(
+    model: str,
+    messages: List[Dict[str, Any]],
+    tools: Optional[List[Dict[str, Any]]] = None,
+    response_model: Optional[type] = None,
+    **params: Any,
+) -> str:
+    """Cache key for a chat completion: model, messages, tools, response model and sampling parameters."""
+    keyed_params = {name: value for name, value in params.items() if name not in _UNKEYED_PARAMS}
+    schema = f"{response_model.__module__}.{response_model.__qualname__}" if response_model is not None else None
+    return TieredCache.make_key("chat", model, messages, tools, schema, keyed_params)
+
+
+def cached_completion(create: Callable[..., Any], **request: Any) -> Any:
+    """
+    Call `create(**request)` (an OpenAI or instructor `chat.completions.create`) through the completion cache.
+
+    Streaming requests are never cached. The cached object is returned as is, so callers
+    must treat it as read-only.
+    """
+    if request.get("stream"):
+        return create(**request)
+    key = completion_key(**request)
+    response = completion_cache.get(key)
+    if response is not None:
+        return response
+    response = create(**request)
+    completion_cache.set(key, response)
+    return response
+
+
+async def cached_acompletion(create: Callable[..., Awaitable[Any]], **request: Any) -> Any:
+    """Async variant of `cached_completion` for `AsyncAzureOpenAI` / async instructor clients."""
+    if request.get("stream"):
+        return await create(**request)
+    key = completion_key(**request)
+    response = completion_cache.get(key)
+    if response is not None:
+        return response
+    response = await create(**request)
+    completion_cache.set(key, response)
+    return response
+
+
+class AutoGenCompletionCache:
+    """
+    AutoGen `AbstractCache` backed by the shared completion cache.
+
+    Pass an instance as `cache=` to `initiate_chat`; AutoGen then looks up every agent's
+    completion here (its keys already cover model, messages, tools and parameters)
+    instead of in the per-seed disk cache selected by `cache_seed`.
+    """
+
+    def __init__(self, cache: TieredCache = completion_cache):
+        self._cache = cache
+
+    def get(self, key: str, default: Optional[Any] = None) -> Optional[Any]:
+        return self._cache.get(TieredCache.make_key("autogen", key), default)
+
+    def set(self, key: str, value: Any) -> None:
+        self._cache.set(TieredCache.make_key("autogen", key), value)
+
+    def close(self) -> None:
+        # The underlying cache is process-wide and stays open
+        pass
+
+    def __enter__(self) -> "AutoGenCompletionCache":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+autogen_completion_cache = AutoGenCompletionCache()
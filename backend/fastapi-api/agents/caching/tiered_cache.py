@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# The disk tier re-counts its rows (and evicts) after this many writes
+_DISK_EVICTION_CHECK_INTERVAL = 100
+
+
+class TieredCache:
+    """
+    Two-tier cache: an in-memory LRU in front of an optional SQLite file.
+
+    Entries expire after `ttl` seconds. Both tiers are capped by entry count, the disk tier
+    optionally by total value size too, and evict least recently used entries first. Values
+    are pickled on disk, so anything picklable can be stored. Safe to share across threads.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path: Optional[str] = None,
+        ttl: float = 3600,
+        memory_max_entries: int = 1024,
+        disk_max_entries: int = 100_000,
+        disk_max_bytes: Optional[int] = None,
+    ):
+        self.name = name
+        self.path = path or None
+        self.ttl = ttl
+        self.memory_max_entries = memory_max_entries
+        self.disk_max_entries = disk_max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._writes_since_check = 0
+        self._counters = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0,
+            "sets": 0, "evictions": 0, "expirations": 0,
+        }
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Stable hash of arbitrary JSON-serializable key parts."""
+        payload = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS cache_entries_accessed ON cache_entries (accessed_at)")
+            expired = connection.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),)).rowcount
+            self._counters["expirations"] += max(expired, 0)
+            self._connection = connection
+        return self._connection
+
+    def _remember(self, key: str, expires_at: float, value: Any):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_max_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+                self._counters["expirations"] += 1
+
+            connection = self._connect()
+            if connection is not None:
+                row = connection.execute(
+                    "SELECT value, expires_at FROM cache_entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if row[1] > now:
+                        connection.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key))
+                        value = pickle.loads(row[0])
+                        self._remember(key, row[1], value)
+                        self._counters["disk_hits"] += 1
+                        return value
+                    connection.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                    self._counters["expirations"] += 1
+
+            self._counters["misses"] += 1
+            return default
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self._counters["sets"] += 1
+            connection = self._connect()
+            if connection is None:
+                return
+            try:
+                blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                logger.warning(f"{self.name} cache: value for {key} is not picklable, kept in memory only: {e}")
+                return
+            connection.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, blob, expires_at, now),
+            )
+            self._writes_since_check += 1
+            if self._writes_since_check >= _DISK_EVICTION_CHECK_INTERVAL:
+                self._evict_disk(connection)
+
+    def _evict_disk(self, connection: sqlite3.Connection):
+        self._writes_since_check = 0
+        expired = connection.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),)).rowcount
+        self._counters["expirations"] += max(expired, 0)
+        (count,) = connection.execute("SELECT COUNT(*) FROM cache_entries").fetchone()
+        excess = count - self.disk_max_entries
+        if excess > 0:
+            connection.execute(
+                "DELETE FROM cache_entries WHERE key IN"
+                " (SELECT key FROM cache_entries ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+            self._counters["evictions"] += excess
+        if self.disk_max_bytes:
+            # Keep the most recently used entries whose values fit in the byte budget
+            evicted = connection.execute(
+                "DELETE FROM cache_entries WHERE key IN (SELECT key FROM ("
+                " SELECT key, SUM(LENGTH(value)) OVER (ORDER BY accessed_at DESC) AS kept_bytes FROM cache_entries"
+                ") WHERE kept_bytes > ?)",
+                (self.disk_max_bytes,),
+            ).rowcount
+            self._counters["evictions"] += max(evicted, 0)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._memory.pop(key, None)
+            connection = self._connect()
+            if connection is not None:
+                connection.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            connection = self._connect()
+            if connection is not None:
+                connection.execute("DELETE FROM cache_entries")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._counters["memory_hits"] + self._counters["disk_hits"]
+            lookups = hits + self._counters["misses"]
+            return {
+                **self._counters,
+                "memory_entries": len(self._memory),
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,214 @@
+import json
+import time
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypedDict
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt, the stdlib encoder is the fallback
+    orjson = None
+
+
+class MessageKind(str, Enum):
+    """The `type` of a message sent over the conversation WebSocket."""
+    TEXT = "text"
+    ERROR = "error"
+    CONFIDENCE_SCORE = "confidence_score"
+    FINAL_RECOMMENDATIONS = "final_recommendations"
+    CSV = "csv"
+    CANCELLED = "cancelled"
+    DONE = "done"
+
+
+class Envelope(TypedDict, total=False):
+    """A message as the frontend receives it; which fields are set depends on `type`."""
+    type: str
+    role: str
+    name: str
+    timestamp: str
+    content: Any
+    confidence_score: int
+    explanation: str
+    board_decision: str
+    recommendations: List[Dict]
+    offset: int
+    total: int
+    conversation_id: str
+    run_id: str
+    seq: int
+    status: str
+    rows: int
+    artifacts: List[Dict]
+    download_url: str
+
+
+class TimestampCache:
+    """
+    `datetime.now().strftime(fmt)`, formatted at most once per second.
+
+    Streams emit many messages within the same second; they all share one formatted string.
+    """
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        self._second = -1
+        self._value = ""
+
+    def __call__(self) -> str:
+        second = int(time.time())
+        if second != self._second:
+            # Assigned together so a reader never sees a new second with an old string
+            self._value, self._second = datetime.fromtimestamp(second).strftime(self.fmt), second
+        return self._value
+
+
+# Date and time for envelopes built by the WebSocket layer, time only for agent messages
+wall_timestamp = TimestampCache("%Y-%m-%d %H:%M:%S")
+clock_timestamp = TimestampCache("%H:%M:%S")
+
+
+def text_envelope(content: Any, name: str = "Agent", role: str = "agent", timestamp: Optional[str] = None) -> Envelope:
+    return {
+        "content": content,
+        "role": role,
+        "name": name,
+        "timestamp": timestamp or wall_timestamp(),
+        "type": MessageKind.TEXT.value,
+    }
+
+
+def error_envelope(content: str, name: str = "System") -> Envelope:
+    return {
+        "content": content,
+        "role": "system",
+        "name": name,
+        "timestamp": wall_timestamp(),
+        "type": MessageKind.ERROR.value,
+    }
+
+
+def cancelled_envelope() -> Envelope:
+    return {
+        "content": "Analysis cancelled.",
+        "role": "system",
+        "name": "System",
+        "timestamp": wall_timestamp(),
+        "type": MessageKind.CANCELLED.value,
+        "status": "cancelled",
+    }
+
+
+def done_envelope(status: str) -> Envelope:
+    """Last envelope of a run that was not cancelled; `status` is "completed" or "failed"."""
+    return {
+        "role": "system",
+        "name": "System",
+        "timestamp": wall_timestamp(),
+        "type": MessageKind.DONE.value,
+        "status": status,
+    }
+
+
+def _from_error(message: Dict) -> Envelope:
+    return error_envelope(message["error"], name="Error")
+
+
+def _from_confidence_score(message: Dict) -> Envelope:
+    return {
+        "confidence_score": message["confidence_score"],
+        "explanation": message.get("explanation", "No explanation provided"),
+        "board_decision": message.get("board_decision", "No decision provided"),
+        "role": "system",
+        "name": "FinOps Board",
+        "timestamp": wall_timestamp(),
+        "type": MessageKind.CONFIDENCE_SCORE.value,
+    }
+
+
+def _from_recommendations(message: Dict) -> Envelope:
+    return {
+        "recommendations": message["recommendations"],
+        "role": "agent",
+        "name": "Recommendations",
+        "timestamp": wall_timestamp(),
+        "type": MessageKind.FINAL_RECOMMENDATIONS.value,
+    }
+
+
+def _from_csv(message: Dict) -> Envelope:
+    return {
+        "content": message.get("csv", ""),
+        "role": "agent",
+        "name": "CSV Export",
+        "timestamp": wall_timestamp(),
+        "type": MessageKind.CSV.value,
+    }
+
+
+def _from_export(message: Dict) -> Envelope:
+    # Content and artifact links are filled in by the run once the export files are written
+    return {
+        "content": "",
+        "rows": message["export"],
+        "role": "agent",
+        "name": "CSV Export",
+        "timestamp": wall_timestamp(),
+        "type": MessageKind.CSV.value,
+    }
+
+
+def _from_text(message: Dict) -> Envelope:
+    return {
+        "content": message.get("content", ""),
+        "role": message.get("role", "agent"),
+        "name": message.get("name", "Agent"),
+        "timestamp": message.get("timestamp") or wall_timestamp(),
+        "type": message.get("type", MessageKind.TEXT.value),
+    }
+
+
+# The key that marks each kind of message yielded by the agent stream, in priority order;
+# anything else is an agent text message
+_DISPATCH: Tuple[Tuple[str, Callable[[Dict], Envelope]], ...] = (
+    ("error", _from_error),
+    ("confidence_score", _from_confidence_score),
+    ("recommendations", _from_recommendations),
+    ("csv", _from_csv),
+    ("export", _from_export),
+)
+
+
+def to_envelope(message: Dict) -> Envelope:
+    """Wrap a message yielded by `start_agent_conversation_stream` in the envelope the frontend expects."""
+    for key, build in _DISPATCH:
+        if key in message:
+            return build(message)
+    return _from_text(message)
+
+
+def _default(value: Any) -> Any:
+    # Pydantic models (guardrails output), enums and dates can appear inside message content
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def encode(envelope: Dict) -> str:
+        """Serialize an envelope to JSON text with orjson, or the stdlib encoder for what orjson rejects."""
+        try:
+            return orjson.dumps(envelope, default=_default, option=_ORJSON_OPTIONS).decode()
+        except TypeError:
+            # e.g. integers wider than 64 bits
+            return json.dumps(envelope, default=_default)
+else:
+    def encode(envelope: Dict) -> str:
+        """Serialize an envelope to JSON text."""
+        return json.dumps(envelope, default=_default)
@@ -1,9 +1,9 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional
-import instructor
-from openai import AzureOpenAI
 import os
 from dotenv import load_dotenv
+from ..caching.completion_cache import cached_acompletion
+from ..llm_clients import get_async_instructor_client
 
 # Load environment variables
 load_dotenv()
@@ -15,24 +15,19 @@ class AzureResourceUsage(BaseModel):
     usage_metrics: Optional[List[str]] = Field(default_factory=list)
     recommendations: Optional[List[str]] = Field(default_factory=list)
 
-# Function to initialize the instructor client
-# Initialize Instructor client with AzureOpenAI
+# Function to get the instructor client
+# Returns the process-wide async instructor client, so every caller shares one HTTP connection pool
 def get_instructor_client():
-    return instructor.from_openai(AzureOpenAI(
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        api_version="2024-02-15-preview",
-        azure_endpoint=os.getenv("AZURE_OPENAI_API_BASE")
-    ))
-
-client = get_instructor_client()
+    return get_async_instructor_client()
 
 
 # Function to extract Azure resource details
-def extract_azure_resource_details(client, user_message_content: str):
+async def extract_azure_resource_details(client, user_message_content: str):
     messages = [{"role": "user", "content": user_message_content}]
     
-    # Call instructor to process and extract structured data
-    user_message = client.chat.completions.create(
+    # Call instructor to process and extract structured data; repeated conversations are served from the cache
+    user_message = await cached_acompletion(
+        client.chat.completions.create,
         model="gpt-4o-mini",  # Ensure you are using the correct GPT model
         response_model=AzureResourceUsage,
         messages=messages
@@ -0,0 +1,93 @@
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Optional
+
+# openai, httpx and instructor are imported on first use to keep startup fast
+if TYPE_CHECKING:
+    import httpx
+    from openai import AsyncAzureOpenAI
+
+logger = logging.getLogger(__name__)
+
+# Connection limits of the HTTP pool shared by every async OpenAI client in the process
+LLM_MAX_CONNECTIONS = int(os.getenv("OPTIMONKEY_LLM_MAX_CONNECTIONS", "50"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPTIMONKEY_LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("OPTIMONKEY_LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_TIMEOUT = float(os.getenv("OPTIMONKEY_LLM_TIMEOUT", "120"))
+
+# Tool calling (used by instructor) needs 2024-02-15-preview or later
+DEFAULT_API_VERSION = "2024-02-15-preview"
+
+_lock = threading.RLock()
+_http_client: Optional["httpx.AsyncClient"] = None
+_openai_client: Optional["AsyncAzureOpenAI"] = None
+_instructor_client: Optional[Any] = None
+
+
+def get_http_client() -> "httpx.AsyncClient":
+    """The pooled keep-alive HTTP client shared by all LLM calls."""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            import httpx
+
+            _http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(LLM_TIMEOUT, connect=10.0),
+            )
+        return _http_client
+
+
+def get_async_openai_client() -> "AsyncAzureOpenAI":
+    """
+    The process-wide `AsyncAzureOpenAI` client.
+
+    Raises:
+        ValueError: If the API key or endpoint is not configured.
+    """
+    global _openai_client
+    with _lock:
+        if _openai_client is None:
+            api_key = os.getenv("AZURE_OPENAI_API_KEY") or os.getenv("AZURE_OPENAI_KEY")
+            azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT") or os.getenv("AZURE_OPENAI_API_BASE")
+            if not api_key:
+                raise ValueError("Missing required API key")
+            if not azure_endpoint:
+                raise ValueError("Missing required endpoint")
+            from openai import AsyncAzureOpenAI
+
+            _openai_client = AsyncAzureOpenAI(
+                api_key=api_key,
+                api_version=os.getenv("AZURE_OPENAI_API_VERSION", DEFAULT_API_VERSION),
+                azure_endpoint=azure_endpoint,
+                http_client=get_http_client(),
+            )
+            logger.info(f"Initialized shared AsyncAzureOpenAI client for {azure_endpoint}")
+        return _openai_client
+
+
+def get_async_instructor_client() -> Any:
+    """The shared async client wrapped by instructor for structured (response_model) completions."""
+    global _instructor_client
+    with _lock:
+        if _instructor_client is None:
+            import instructor
+
+            _instructor_client = instructor.from_openai(get_async_openai_client())
+        return _instructor_client
+
+
+async def close_llm_clients():
+    """Close the shared HTTP pool; the clients are rebuilt on next use."""
+    global _http_client, _openai_client, _instructor_client
+    with _lock:
+        http_client, _http_client = _http_client, None
+        _openai_client = None
+        _instructor_client = None
+    if http_client is not None:
+        await http_client.aclose()
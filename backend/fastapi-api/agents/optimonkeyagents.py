@@ -1,17 +1,21 @@
 from typing import Optional, List, Dict
 import logging
-import autogen
 from typing_extensions import Annotated
-from azure.identity import DefaultAzureCredential
-from azure.mgmt.resourcegraph import ResourceGraphClient
-from azure.mgmt.resourcegraph.models import QueryRequest
 from typing import List, Dict
-from datetime import datetime
-from autogen import register_function
+from functools import lru_cache
 import csv
 import os
-from azure.mgmt.monitor import MonitorManagementClient
 from dotenv import load_dotenv
+from .agent_team import AgentTeam, AgentTeamPool
+from .azure_tools.clients import get_client_registry
+from .azure_tools.inventory import inventory_store
+from .azure_tools.metrics import (
+    metrics_cache, metrics_cache_key, query_usage_metrics_batch, resolve_metric_defaults, stored_usage, summarize_metrics,
+)
+from .azure_tools.metrics_store import daily_window, metrics_store
+from .azure_tools.resource_graph import iter_resource_graph_query, parse_resource_id
+from .caching.completion_cache import autogen_completion_cache
+from .envelopes import clock_timestamp, text_envelope
 
 # Load environment variables from the .env file
 env_path = os.path.join(os.path.dirname(__file__), ".env")
@@ -26,14 +30,24 @@ load_dotenv(dotenv_path=env_path)
 #     print(f"Bing API Key Loaded Successfully: {bing_api_key}")
 
 # Define the configuration for the LLM model
-config_list = autogen.config_list_from_json("./agents/OAI_CONFIG_LIST.json")
-llm_config = {
-    "config_list": config_list, 
-    "cache_seed": 43,
-    "timeout": 180    
-}
-
-subscription_id = ("e9b4640d-1f1f-45fe-a543-c0ea45ac34c1")
+# AutoGen is imported when the first agent team is built, not when this module is imported
+@lru_cache(maxsize=None)
+def get_llm_config() -> Dict:
+    """The LLM configuration shared by the agents, read from OAI_CONFIG_LIST.json on first use."""
+    import autogen
+
+    config_list = autogen.config_list_from_json("./agents/OAI_CONFIG_LIST.json")
+    return {
+        "config_list": config_list,
+        "cache_seed": 43,
+        "timeout": 180
+    }
+
+# Rows of a Resource Graph query handed back to the agents; larger results are truncated
+KUSTO_TOOL_MAX_ROWS = int(os.getenv("OPTIMONKEY_KUSTO_TOOL_MAX_ROWS", "200"))
+
+# Subscription analyzed when a prompt names none
+subscription_id = os.getenv("AZURE_SUBSCRIPTION_ID") or "e9b4640d-1f1f-45fe-a543-c0ea45ac34c1"
 threshold = 3
 days = 30
 workspace_id = "fdd39622-ae5a-4eb8-987b-14ae8aad63dd"
@@ -59,131 +73,70 @@ resources = ["Microsoft.Compute/disks", "Microsoft.Compute/virtualMachines",
 # Make sure you assert these resources are not being used much or not at all based on usage over the last {days} days.
 # """
 
-# Initialize the Admin
-user_proxy = autogen.UserProxyAgent(
-    name="admin",
-    human_input_mode='NEVER',
-    system_message='Give the task and send instruction to the critic to evaluate and refine the code.',
-    code_execution_config=False,
-    # llm_config=llm_config
-)
-
-# Initialize the Planner assistant
-planner = autogen.AssistantAgent(
-    name="Planner",
-    system_message="""
-    Given a task, please determine what information is needed to complete the task, how to obtain that information, and what steps are required to complete the task.
-    Please note that the information will all be retrieved using Python and Azure SDKs.  
-    Given a task, generate recommendations and dynamically determine the resource type for each recommendation.
-    Use the context of the task (e.g., Virtual Machines, Storage Accounts, Disks) to classify the resource type
-    Please only suggest information that is relevant to the task and ensure that the information is accurate and up-to-date.
-    Make sure the information can be retrieved using the functions provided and Python code.
-    After each step is completed by others, check the progress and make sure the next step is executed correctly.
-    If a step fails, try to identify the issue and suggest a solution or a workaround.
-    """,
-    description=""" 
-    Given a task, please determine what information is needed to complete the task, how to obtain that information, 
-    and what steps are required to complete the task. After each step is completed by others, 
-    check the progress and make sure the next step is executed correctly.
-    """,
-    llm_config=llm_config
-    )
-
-
-# Initialize the Code_Guru assistant for coding tasks
-coder = autogen.AssistantAgent(
-    name="Code_Guru",
-    system_message="""You are a helpful AI Assistant. You are a highly experienced programmer specialized in Azure. 
-    Follow the approved plan and save the code to disk. Always use functions you have access to and start with run_kusto_query
-    When using code, you must indicate the script type in the code block. 
-    The user cannot provide any other feedback or perform any other action beyond executing the code you suggest. 
-    The user can't change your code. 
-    So do not suggest incomplete code which requires users to modify. 
-    Don't use a code block if it's not intended to be executed by the user. Do not ask others to copy and paste the result. Check the execution result returned by the executor.
-    If the result indicates there is an error, fix the error and output the code again. Suggest the 
-    full code instead of partial code or code changes. If the error can't be fixed or if the task is 
-    not solved even after the code is executed successfully, analyze the problem, revisit your 
-    assumption, collect additional info you need, and think of a different approach to try.
-    When you find an answer, verify the answer carefully. Include verifiable evidence in your response 
-    if possible.
-    Reply "TERMINATE" in the end when everything is done""", 
-    description="I'm a highly experienced programmer specialized in Python, bash. I am **ONLY** allowed to speak **immediately** after `Planner`.",
-    llm_config={
-        "cache_seed": 42,  # Seed for caching and reproducibility was 42
-        "config_list": config_list,  # List of OpenAI API configurations
-        "temperature": 0  # Temperature for sampling
-    },
-    human_input_mode="NEVER"
-)
-
-
-
-# Initialize the Critic assistant for code evaluation
-critic = autogen.AssistantAgent(
-    name="Critic",
-    system_message="""Critic. You are a helpful AI assistant. You are highly skilled in evaluating the quality of a given code by providing a score from 1 (bad) - 10 (good) while providing clear rationale. YOU MUST CONSIDER VISUALIZATION BEST PRACTICES for each evaluation. Specifically, you can carefully evaluate the code across the following dimensions:
-- bugs (bugs):  are there bugs, logic errors, syntax error or typos? Are there any reasons why the code may fail to compile? How should it be fixed? If ANY bug exists, the bug score MUST be less than 5.
-- Data transformation (transformation): Is the data transformed appropriately for the type? E.g., is the dataset appropriated filtered, aggregated, or grouped if needed? If a date field is used, is the date field first converted to a date object etc?
-- Goal compliance (compliance): how well the code meets the specified goals?
-- Visualization type (type): CONSIDERING BEST PRACTICES, is the type appropriate for the data and intent? Is there a type that would be more effective in conveying insights? If a different type is more appropriate, the score MUST BE LESS THAN 5.
-- Data encoding (encoding): Is the data encoded appropriately for the type?
-- Aesthetics (aesthetics): Are the aesthetics of the appropriate for the type and the data?
-YOU MUST PROVIDE A SCORE for each of the above dimensions.
-{bugs: 0, transformation: 0, compliance: 0, type: 0, encoding: 0, aesthetics: 0}
-Do not suggest code.
-Finally, based on the critique above, suggest a concrete list of actions that the coder should take to improve the code.
-Do not come up with a plan or suggest a code. You can only critique the code.
-Make sure the Coder uses the functions in the right order and the code is well structured and easy to understand.""",
-    llm_config=llm_config
-    )
-
-code_executor = autogen.UserProxyAgent(
-    name="Executor",
-    system_message="Execute the code provided by the coder and provide the results. You do not make plans. The planner will provide the plan. When all of this is completed, save the recommendations as a well formatted csv file.",
-    description="""Executor executes the code provided by the coder and provide the results. The executor does not make plans.
-    The planner will provide the plan. When all of this is completed, save the recommendations as a well formatted csv file.
-    """,
-    human_input_mode="NEVER",
-
-    code_execution_config={
-        # "last_n_messages": 5,
-        "work_dir": "coding",
-        # "use_docker": False
-        "use_docker": "python:3.10",
-    },
-    llm_config=llm_config,
-    is_termination_msg = lambda x: x.get("content", "").rstrip().endswith(
-    "TERMINATE") if x.get("content") else False,
-)
 
 
 # Define the Kusto Query Function
-def run_kusto_query(query: Annotated[str, "The KQL query"], subscriptions: Annotated[List[str], "List of subscription IDs"]) -> List[Dict]:
+def run_kusto_query(query: Annotated[str, "The KQL query"], subscriptions: Annotated[List[str], "List of subscription IDs"]) -> Dict:
     """
     Run a Kusto query using Azure Resource Graph to get resource details from specified subscriptions.
+    Pages are followed up to KUSTO_TOOL_MAX_ROWS rows; past that the result is truncated and
+    carries the total row count, so a large estate never floods the agent's context.
 
     Args:
         query (str): The KQL query to execute.
         subscriptions (List[str]): List of subscription IDs.
 
     Returns:
-        List[Dict]: Results from the query.
+        Dict: `rows` (at most KUSTO_TOOL_MAX_ROWS), `total_rows` and, when truncated, a `note`
+            on how to narrow the query.
     """
-    credential = DefaultAzureCredential()
-    resourcegraph_client = ResourceGraphClient(credential)
-    query_request = QueryRequest(query=query, subscriptions=subscriptions)
-    query_response = resourcegraph_client.resources(query_request)
-    return query_response.data
+    rows = list(iter_resource_graph_query(query, subscriptions, max_rows=KUSTO_TOOL_MAX_ROWS + 1))
+    if len(rows) <= KUSTO_TOOL_MAX_ROWS:
+        return {"rows": rows, "total_rows": len(rows), "truncated": False}
+    try:
+        total_rows = next(iter_resource_graph_query(f"{query} | count", subscriptions))["Count"]
+    except Exception as e:
+        logging.warning(f"Could not count the rows of a truncated Kusto query: {e}")
+        total_rows = None
+    return {
+        "rows": rows[:KUSTO_TOOL_MAX_ROWS],
+        "total_rows": total_rows,
+        "truncated": True,
+        "note": (
+            f"Only the first {KUSTO_TOOL_MAX_ROWS} rows are returned. Aggregate in KQL (summarize, count, top), "
+            "filter further, or use query_inventory / query_usage_metrics_batch for per-resource work."
+        ),
+    }
     # pass this as a parameter to the next function
 
-# Register Kusto Query Function with the system
-register_function(
-    run_kusto_query,
-    caller=coder,
-    executor=code_executor,
-    name="run_kusto_query",
-    description="This function generates the code to run a Kusto Query Language (KQL) query using Azure Resource Graph."
-)
+
+def query_inventory(
+    subscriptions: Annotated[List[str], "List of subscription IDs"],
+    resource_type: Annotated[Optional[str], "Resource type, e.g. 'Microsoft.Compute/disks'"] = None,
+    location: Annotated[Optional[str], "Region, e.g. 'westeurope'"] = None,
+    resource_group: Annotated[Optional[str], "Resource group name"] = None,
+    tags: Annotated[Optional[Dict[str, str]], "Tags the resources must carry; an empty value matches any value"] = None,
+    limit: Annotated[Optional[int], "Maximum number of resources"] = None,
+) -> List[Dict]:
+    """
+    List resources from the local inventory snapshot instead of querying Resource Graph.
+    The snapshot is refreshed incrementally (changed resources only) when it is older than a few minutes.
+
+    Args:
+        subscriptions (List[str]): List of subscription IDs.
+        resource_type (str, optional): Resource type filter.
+        location (str, optional): Region filter.
+        resource_group (str, optional): Resource group filter.
+        tags (Dict[str, str], optional): Required tags.
+        limit (int, optional): Maximum number of resources to return.
+
+    Returns:
+        List[Dict]: Resources with id, name, type, location, resourceGroup, subscriptionId, kind,
+            managedBy, sku, tags and properties.
+    """
+    inventory_store.ensure_fresh(subscriptions)
+    return inventory_store.query(subscriptions, resource_type, location, resource_group, tags, limit)
+
 
 # Define function to query usage metrics based on resource type
 def query_usage_metrics(
@@ -196,6 +149,8 @@ def query_usage_metrics(
 ) -> Dict[str, float]:
     """
     Query usage metrics for a given Azure resource, adjusting time grain based on the resource type.
+    Results are served from the metrics cache when the same query ran recently, and daily
+    windows only fetch the days that are not in the local metrics store yet.
 
     Args:
         resource_id (str): The Azure resource ID.
@@ -206,38 +161,41 @@ def query_usage_metrics(
         interval (str, optional): The granularity of the data (e.g., 'P1D' for daily or 'P1H' for hourly).
 
     Returns:
-        Dict[str, Any]: Total usage for each queried metric.
+        Dict[str, Any]: For each queried metric, its mean over all intervals plus `<metric>_max`,
+            `<metric>_p95`, `<metric>_p99`, `<metric>_idle_fraction` and `<metric>_trend`.
     """
 
-    # Normalize the resource_type to lowercase for case-insensitive comparison
-    resource_type_normalized = resource_type.lower()
-
-    # Define default metrics and namespaces based on the resource type
-    if resource_type_normalized == "microsoft.compute/virtualmachines":
-        metric_names = metric_names or ['Percentage CPU', 'Network In', 'Network Out', 'Disk Read Bytes', 'Disk Write Bytes']
-        interval = interval or 'P1D'  # Use daily intervals for VMs
-        metricnamespace = "microsoft.compute/virtualmachines"
-    elif resource_type_normalized == "microsoft.storage/storageaccounts":
-        metric_names = metric_names or ['UsedCapacity', 'Transactions', 'Ingress', 'Egress', 'Availability']
-        interval = 'PT1H'  # Use hourly intervals for storage accounts
-        metricnamespace = "microsoft.storage/storageaccounts"
-    elif resource_type_normalized == "microsoft.compute/disks":
-        metric_names = metric_names or ['Composite Disk Read Bytes/sec', 'Composite Disk Write Bytes/sec',
-                                        'Composite Disk Read Operations/sec', 'Composite Disk Write Operations/sec','DiskPaidBurstIOPS']
-        interval = interval or 'P1D'  # Use daily intervals for disks
-        metricnamespace = "microsoft.compute/disks"
-    elif resource_type_normalized == "microsoft.network/publicipaddresses":
-        metric_names = metric_names or ['Inbound Traffic', 'Outbound Traffic', 'Inbound Packets', 'Outbound Packets']
-        interval = interval or 'P1D'  # Use daily intervals for public IP addresses
-        metricnamespace = "microsoft.network/publicipaddresses"
-    else:
-        raise ValueError(f"Unsupported resource type: {resource_type}")
+    metric_names, interval, metricnamespace = resolve_metric_defaults(resource_type, metric_names, interval)
 
-    # Initialize the MonitorManagementClient
-    monitor_client = MonitorManagementClient(
-        credential=DefaultAzureCredential(),
-        subscription_id=subscription_id  # Replace with your actual subscription ID
-    )
+    cache_key = metrics_cache_key(resource_id, metric_names, aggregation, timespan, interval)
+    cached = metrics_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached)
+
+    # Reuse the shared MonitorManagementClient (cached token, pooled connections) of the resource's own subscription
+    parsed = parse_resource_id(resource_id)
+    monitor_client = get_client_registry().get_monitor_client(parsed["subscription_id"] if parsed else subscription_id)
+
+    resource_usage = {"resource_id": resource_id}
+
+    days = daily_window(timespan, interval)
+    if days is not None:
+        # Daily windows are kept in the local metrics store; only the days since the last scan are fetched
+        pending = metrics_store.pending_range(resource_id, metric_names, aggregation, days)
+        if pending is not None:
+            start, end = pending
+            metrics_data = monitor_client.metrics.list(
+                resource_uri=resource_id,
+                timespan=f"{start:%Y-%m-%dT%H:%M:%SZ}/{end:%Y-%m-%dT%H:%M:%SZ}",
+                interval=interval,
+                metricnames=','.join(metric_names),
+                aggregation=aggregation,
+                metricnamespace=metricnamespace
+            )
+            metrics_store.record(resource_id, metrics_data.value, metric_names, aggregation, end, start)
+        resource_usage.update(stored_usage(resource_id, metric_names, aggregation, days))
+        metrics_cache.set(cache_key, resource_usage)
+        return resource_usage
 
     # Use `resource_id` as the `resource_uri` in the metrics.list call
     metrics_data = monitor_client.metrics.list(
@@ -249,32 +207,12 @@ def query_usage_metrics(
         metricnamespace=metricnamespace  # Add the missing parameter
     )
 
-    resource_usage = {"resource_id": resource_id}
-
-    # Calculate average usage for each metric and append to resource usage
-    for metric in metrics_data.value:
-        metric_name = metric.name.value
-        average = sum(
-            [
-                data.average  # Use the average aggregation for percentage metrics like CPU
-                for timeseries in metric.timeseries
-                for data in timeseries.data
-                if data.average is not None
-            ]
-        ) / len(metric.timeseries) if metric.timeseries else 0
-
-        resource_usage[metric_name] = average
+    # Mean, peak, p95/p99, idle fraction and trend for each metric
+    resource_usage.update(summarize_metrics(metrics_data.value, aggregation))
+    metrics_cache.set(cache_key, resource_usage)
     return resource_usage
 
 
-# Register the query usage metrics function
-register_function(
-    query_usage_metrics,
-    caller=coder,
-    executor=code_executor,
-    name="query_usage_metrics",
-    description="This function allows the agent to Query Azure Monitor metrics for the specified resource and metrics."
-)
 
 # import requests
 
@@ -505,17 +443,22 @@ register_function(
 
 
 
-import csv
+import shutil
+import tempfile
 from typing import List, Dict
-from io import StringIO
+from .recommendation_writer import RecommendationWriter
 
-def save_results_to_csv(results: List[Dict], filename: str = "azure_recommendations.csv") -> str:
+def save_results_to_csv(results: List[Dict], filename: Optional[str] = None) -> str:
     """
     Saves recommendations to a CSV file.
 
+    The CSV of an analysis is stored with its run (see artifact_store), so nothing is
+    written to a shared file unless a filename is given. The rows go through the same
+    RecommendationWriter as the run exports, so both CSVs have the same columns and cells.
+
     Args:
         results (List[Dict]): List of recommendations (in dict format).
-        filename (str): Name of the output CSV file.
+        filename (str, optional): Name of an extra output CSV file.
 
     Returns:
         str: CSV content as a string.
@@ -523,19 +466,20 @@ def save_results_to_csv(results: List[Dict], filename: str = "azure_recommendati
     if not results or len(results) == 0:
         return "No recommendations to save."
 
-    # Dynamically determine the keys for the CSV headers
-    keys = results[0].keys()
-
-    output = StringIO()
-    writer = csv.DictWriter(output, fieldnames=keys)
-    writer.writeheader()
-    writer.writerows(results)
-
-    # Save to file as a backup
-    with open(filename, mode='w', newline='', encoding='utf-8') as file:
-        file.write(output.getvalue())
+    with tempfile.TemporaryDirectory(prefix="optimonkey-csv-") as directory:
+        writer = RecommendationWriter(directory, formats=("csv",))
+        try:
+            writer.append(results)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
 
-    return output.getvalue()
+        # Save to file as a backup
+        if filename:
+            shutil.copyfile(writer.path("csv"), filename)
+        with open(writer.path("csv"), encoding="utf-8", newline="") as handle:
+            return handle.read()
 
 
 # Define the function to save the results to a CSV file
@@ -576,60 +520,236 @@ def save_results_to_csv(results: List[Dict], filename: str = "azure_recommendati
 #         logging.error(f"Failed to save results to CSV: {e}")
 #         return f"Error saving results to CSV: {str(e)}"
 
-# Register the save to CSV function
-register_function(
-    save_results_to_csv,
-    caller=coder,
-    executor=code_executor,
-    name="save_results_to_csv",
-    description="A tool to save results to CSV."
-)
-# Define the Final_Recommender agent
-final_recommender = autogen.AssistantAgent(
-    name="Final_Recommender",
-    system_message="""You are a specialized agent for generating actionable final recommendations based on provided analysis.
-    Reply "FINAL_RECOMMENDATIONS_COMPLETE" once the task is done.""",
-    description="Generates final Azure cost optimization recommendations.",
-    llm_config=llm_config,
-    is_termination_msg=lambda x: x.get("content") == "FINAL_RECOMMENDATIONS_COMPLETE"
-)
+def build_agent_team(team_id: int = 0) -> AgentTeam:
+    """
+    Build the agents, group chats and managers for a single analysis session.
+
+    Args:
+        team_id (int): Identifier of the team inside the pool, used to isolate the executor work_dir.
 
+    Returns:
+        AgentTeam: A fresh team with all tools registered.
+    """
+    import autogen
+    from autogen import register_function
+
+    llm_config = get_llm_config()
+    config_list = llm_config["config_list"]
+
+    # Initialize the Admin
+    user_proxy = autogen.UserProxyAgent(
+        name="admin",
+        human_input_mode='NEVER',
+        system_message='Give the task and send instruction to the critic to evaluate and refine the code.',
+        code_execution_config=False,
+        # llm_config=llm_config
+    )
 
-# Initialize GroupChat with the agents
-groupchat = autogen.GroupChat(
-    agents=[planner, coder, critic, user_proxy, code_executor], 
-    messages=[],  
-    max_round=50,
-    speaker_selection_method="round_robin"
+    # Initialize the Planner assistant
+    planner = autogen.AssistantAgent(
+        name="Planner",
+        system_message="""
+        Given a task, please determine what information is needed to complete the task, how to obtain that information, and what steps are required to complete the task.
+        Please note that the information will all be retrieved using Python and Azure SDKs.  
+        Given a task, generate recommendations and dynamically determine the resource type for each recommendation.
+        Use the context of the task (e.g., Virtual Machines, Storage Accounts, Disks) to classify the resource type
+        Please only suggest information that is relevant to the task and ensure that the information is accurate and up-to-date.
+        Make sure the information can be retrieved using the functions provided and Python code.
+        After each step is completed by others, check the progress and make sure the next step is executed correctly.
+        If a step fails, try to identify the issue and suggest a solution or a workaround.
+        """,
+        description=""" 
+        Given a task, please determine what information is needed to complete the task, how to obtain that information, 
+        and what steps are required to complete the task. After each step is completed by others, 
+        check the progress and make sure the next step is executed correctly.
+        """,
+        llm_config=llm_config
+        )
+
+
+    # Initialize the Code_Guru assistant for coding tasks
+    coder = autogen.AssistantAgent(
+        name="Code_Guru",
+        system_message="""You are a helpful AI Assistant. You are a highly experienced programmer specialized in Azure. 
+        Follow the approved plan and save the code to disk. Always use functions you have access to and start with run_kusto_query
+        When using code, you must indicate the script type in the code block. 
+        The user cannot provide any other feedback or perform any other action beyond executing the code you suggest. 
+        The user can't change your code. 
+        So do not suggest incomplete code which requires users to modify. 
+        Don't use a code block if it's not intended to be executed by the user. Do not ask others to copy and paste the result. Check the execution result returned by the executor.
+        If the result indicates there is an error, fix the error and output the code again. Suggest the 
+        full code instead of partial code or code changes. If the error can't be fixed or if the task is 
+        not solved even after the code is executed successfully, analyze the problem, revisit your 
+        assumption, collect additional info you need, and think of a different approach to try.
+        When you find an answer, verify the answer carefully. Include verifiable evidence in your response 
+        if possible.
+        Reply "TERMINATE" in the end when everything is done""", 
+        description="I'm a highly experienced programmer specialized in Python, bash. I am **ONLY** allowed to speak **immediately** after `Planner`.",
+        llm_config={
+            "cache_seed": 42,  # Seed for caching and reproducibility was 42
+            "config_list": config_list,  # List of OpenAI API configurations
+            "temperature": 0  # Temperature for sampling
+        },
+        human_input_mode="NEVER"
+    )
+
+
+
+    # Initialize the Critic assistant for code evaluation
+    critic = autogen.AssistantAgent(
+        name="Critic",
+        system_message="""Critic. You are a helpful AI assistant. You are highly skilled in evaluating the quality of a given code by providing a score from 1 (bad) - 10 (good) while providing clear rationale. YOU MUST CONSIDER VISUALIZATION BEST PRACTICES for each evaluation. Specifically, you can carefully evaluate the code across the following dimensions:
+    - bugs (bugs):  are there bugs, logic errors, syntax error or typos? Are there any reasons why the code may fail to compile? How should it be fixed? If ANY bug exists, the bug score MUST be less than 5.
+    - Data transformation (transformation): Is the data transformed appropriately for the type? E.g., is the dataset appropriated filtered, aggregated, or grouped if needed? If a date field is used, is the date field first converted to a date object etc?
+    - Goal compliance (compliance): how well the code meets the specified goals?
+    - Visualization type (type): CONSIDERING BEST PRACTICES, is the type appropriate for the data and intent? Is there a type that would be more effective in conveying insights? If a different type is more appropriate, the score MUST BE LESS THAN 5.
+    - Data encoding (encoding): Is the data encoded appropriately for the type?
+    - Aesthetics (aesthetics): Are the aesthetics of the appropriate for the type and the data?
+    YOU MUST PROVIDE A SCORE for each of the above dimensions.
+    {bugs: 0, transformation: 0, compliance: 0, type: 0, encoding: 0, aesthetics: 0}
+    Do not suggest code.
+    Finally, based on the critique above, suggest a concrete list of actions that the coder should take to improve the code.
+    Do not come up with a plan or suggest a code. You can only critique the code.
+    Make sure the Coder uses the functions in the right order and the code is well structured and easy to understand.""",
+        llm_config=llm_config
+        )
+
+    code_executor = autogen.UserProxyAgent(
+        name="Executor",
+        system_message="Execute the code provided by the coder and provide the results. You do not make plans. The planner will provide the plan. When all of this is completed, save the recommendations as a well formatted csv file.",
+        description="""Executor executes the code provided by the coder and provide the results. The executor does not make plans.
+        The planner will provide the plan. When all of this is completed, save the recommendations as a well formatted csv file.
+        """,
+        human_input_mode="NEVER",
+
+        code_execution_config={
+            # "last_n_messages": 5,
+            "work_dir": os.path.join("coding", f"team-{team_id}"),
+            # "use_docker": False
+            "use_docker": "python:3.10",
+        },
+        llm_config=llm_config,
+        is_termination_msg = lambda x: x.get("content", "").rstrip().endswith(
+        "TERMINATE") if x.get("content") else False,
     )
-# Start the conversation among the agents
-manager = autogen.GroupChatManager(groupchat=groupchat, llm_config=llm_config)
-
-# Initialize GroupChat for the Final_Recommender agent
-final_groupchat = autogen.GroupChat(
-    agents=[final_recommender, user_proxy],
-    messages=[],
-    max_round=10,
-    speaker_selection_method="round_robin"
-)
 
+    # Register Kusto Query Function with the system
+    register_function(
+        run_kusto_query,
+        caller=coder,
+        executor=code_executor,
+        name="run_kusto_query",
+        description=f"This function generates the code to run a Kusto Query Language (KQL) query using Azure Resource Graph. Returns at most {KUSTO_TOOL_MAX_ROWS} rows plus the total row count; aggregate in KQL for larger results."
+    )
+
+    # Register the inventory lookup so resource discovery reads the local snapshot
+    register_function(
+        query_inventory,
+        caller=coder,
+        executor=code_executor,
+        name="query_inventory",
+        description="List resources (id, type, location, SKU, tags, properties) from the local inventory snapshot, filtered by type, region, resource group or tags. Prefer this over run_kusto_query for finding resources; use run_kusto_query only for questions the inventory cannot answer."
+    )
+
+    # Register the query usage metrics function
+    register_function(
+        query_usage_metrics,
+        caller=coder,
+        executor=code_executor,
+        name="query_usage_metrics",
+        description="This function allows the agent to Query Azure Monitor metrics for the specified resource and metrics."
+    )
+
+    # Register the batch metrics function so whole subscriptions take a handful of calls
+    register_function(
+        query_usage_metrics_batch,
+        caller=coder,
+        executor=code_executor,
+        name="query_usage_metrics_batch",
+        description="Query Azure Monitor metrics for many resources at once (any mix of types and subscriptions) and return one table with a row per resource. Prefer this over query_usage_metrics whenever more than one resource is analyzed. Each metric comes with _max, _p95, _p99, _idle_fraction and _trend columns; base rightsizing on p95 rather than the mean."
+    )
+
+    # Register the save to CSV function
+    register_function(
+        save_results_to_csv,
+        caller=coder,
+        executor=code_executor,
+        name="save_results_to_csv",
+        description="A tool to save results to CSV."
+    )
+    # Define the Final_Recommender agent
+    final_recommender = autogen.AssistantAgent(
+        name="Final_Recommender",
+        system_message="""You are a specialized agent for generating actionable final recommendations based on provided analysis.
+        Reply "FINAL_RECOMMENDATIONS_COMPLETE" once the task is done.""",
+        description="Generates final Azure cost optimization recommendations.",
+        llm_config=llm_config,
+        is_termination_msg=lambda x: x.get("content") == "FINAL_RECOMMENDATIONS_COMPLETE"
+    )
+
+
+    # Initialize GroupChat with the agents
+    groupchat = autogen.GroupChat(
+        agents=[planner, coder, critic, user_proxy, code_executor], 
+        messages=[],  
+        max_round=50,
+        speaker_selection_method="round_robin"
+        )
+    # Start the conversation among the agents
+    manager = autogen.GroupChatManager(groupchat=groupchat, llm_config=llm_config)
+
+    # Initialize GroupChat for the Final_Recommender agent
+    final_groupchat = autogen.GroupChat(
+        agents=[final_recommender, user_proxy],
+        messages=[],
+        max_round=10,
+        speaker_selection_method="round_robin"
+    )
+
+
+    # Manager for final recommendations phase
+    final_manager = autogen.GroupChatManager(groupchat=final_groupchat, llm_config=llm_config)
+
+    return AgentTeam(
+        user_proxy=user_proxy,
+        planner=planner,
+        coder=coder,
+        critic=critic,
+        code_executor=code_executor,
+        final_recommender=final_recommender,
+        groupchat=groupchat,
+        manager=manager,
+        final_groupchat=final_groupchat,
+        final_manager=final_manager,
+        team_id=team_id,
+    )
+
+
+# Pool of warmed agent teams shared by all WebSocket sessions in this process
+agent_team_pool = AgentTeamPool(build_agent_team)
 
-# Manager for final recommendations phase
-final_manager = autogen.GroupChatManager(groupchat=final_groupchat, llm_config=llm_config)
 import json
 import asyncio
 from typing import Optional, List, Dict
-from datetime import datetime
-from .prompt_validator.optimonkeyvalidator import start_prompt_validation, ConfidenceScore
+from .prompt_validator.optimonkeyvalidator import start_prompt_validation, ConfidenceScore, search_subscription_id
+from .azure_tools.prefetch import InventoryPrefetch, start_prefetch
+from .azure_tools.waste_rules import detect_waste
 from .instructor_guardrails.instructor_guardrails import get_instructor_client, extract_azure_resource_details
+from .sharding import resolve_subscriptions, shard_pool
 
-# Initialize instructor client once
-instructor_client = get_instructor_client()
-
-async def start_agent_conversation_stream(prompt: Optional[str] = None):
+async def start_agent_conversation_stream(
+    prompt: Optional[str] = None,
+    subscriptions: Optional[List[str]] = None,
+    management_group: Optional[str] = None,
+):
     """
     Main function that starts the agent conversation stream.
     It runs prompt validation and initiates a sequential group chat if validation passes.
+
+    An analysis of several explicitly given `subscriptions`, or of the subscriptions below
+    `management_group`, is sharded: each subscription runs in a worker process of the shard
+    pool and the recommendations are merged as the shards finish. GUIDs found in the prompt
+    only scope the in-process analysis; they may name workspaces or tenants as well.
     """
     global chat_status
     chat_status = "Chat ongoing"
@@ -642,8 +762,20 @@ async def start_agent_conversation_stream(prompt: Optional[str] = None):
         Your role is to analyze the Azure environment and find opportunities to save money based on activity and usage.
         """
 
+    explicit = list(subscriptions or [])
+    sharded = shard_pool.enabled and (bool(management_group) or len({s.lower() for s in explicit}) > 1)
+    subscriptions = explicit or search_subscription_id(prompt)
+
+    # Warm credentials and the inventory of the prompt's subscriptions while the board reviews it
+    prefetch = start_prefetch(subscriptions) if not sharded else None
+
     # Run prompt validation
-    validation_response = await start_prompt_validation(prompt)
+    try:
+        validation_response = await start_prompt_validation(prompt)
+    except BaseException:
+        if prefetch is not None:
+            prefetch.cancel()
+        raise
     confidence_score = validation_response.get("confidence_score")
     explanation = validation_response.get("explanation", "No explanation provided")
 
@@ -661,43 +793,111 @@ async def start_agent_conversation_stream(prompt: Optional[str] = None):
     # Check if the confidence score is acceptable
     if confidence_score_value < ConfidenceScore.MEDIUM.value:
         # If not acceptable, terminate further processing
+        if prefetch is not None:
+            prefetch.cancel()
         yield {
             "error": f"Prompt rejected. Confidence Score: {confidence_score_value}. {explanation}"
         }
         return  # Stop further processing
 
+    if sharded:
+        try:
+            subscriptions = await asyncio.to_thread(resolve_subscriptions, subscriptions, management_group)
+        except Exception as e:
+            yield {"error": f"Could not list the subscriptions of management group {management_group}: {e}"}
+            return
+        if not subscriptions:
+            yield {"error": f"No subscriptions found below management group {management_group}."}
+            return
+        if len(subscriptions) > 1:
+            async for message in shard_pool.analyze(prompt, subscriptions):
+                yield message
+            return
+
+    async for message in analyze_subscriptions(prompt, subscriptions, prefetch):
+        yield message
+
+async def analyze_subscriptions(prompt: str, subscriptions: List[str], prefetch: Optional[InventoryPrefetch] = None):
+    """
+    Analyze a validated prompt in this process: waste rules first, then the agent team.
+    Shard workers call this directly for their single subscription.
+    """
     try:
-        # Start sequential group chats
-        recommendations = []  # Collect all recommendations
-        async for message in start_sequential_group_chats(prompt):
-            if "recommendations" in message:
-                for rec in message["recommendations"]:
-                    rec["resourceType"] = rec.get("resourceType", "Unknown")  # Ensure resourceType exists
-                    if not isinstance(rec, dict):  # Validate recommendation structure
-                        logging.error(f"Malformed recommendation: {rec}")
-                        continue
-                recommendations.extend(message["recommendations"])
-                yield {"recommendations": recommendations, "type": "final_recommendations"}
-
-        # Save recommendations to CSV if generated
-        if recommendations:
-            csv_content = save_results_to_csv(recommendations)
-            yield {"message": "Recommendations saved to CSV.", "csv": csv_content}
+        # Start sequential group chats on a team owned by this session only
+        # Rows are streamed to the run's export as they are found; only their count is kept here
+        recommendation_count = 0
+
+        # Clear-cut waste is reported straight from the inventory, before any LLM turn
+        try:
+            if prefetch is not None:
+                waste, ambiguous = await prefetch.result()
+            else:
+                waste, ambiguous = await asyncio.to_thread(detect_waste, subscriptions or [subscription_id])
+        except asyncio.CancelledError:
+            # The analysis was cancelled; stop the prefetch thread at its next step as well
+            if prefetch is not None:
+                prefetch.cancel()
+            raise
+        except Exception as e:
+            logging.error(f"Waste rules failed, leaving all analysis to the agents: {e}")
+            waste, ambiguous = [], []
+        # Each recommendations message carries only the rows found since the previous one
+        if waste:
+            recommendation_count += len(waste)
+            yield {"recommendations": waste, "type": "final_recommendations"}
+        prompt = with_waste_findings(prompt, waste, ambiguous)
+
+        async with agent_team_pool.session() as team:
+            async for message in start_sequential_group_chats(prompt, team):
+                if "recommendations" in message:
+                    new_recommendations = []
+                    for rec in message["recommendations"]:
+                        if not isinstance(rec, dict):  # Validate recommendation structure
+                            logging.error(f"Malformed recommendation: {rec}")
+                            continue
+                        rec["resourceType"] = rec.get("resourceType", "Unknown")  # Ensure resourceType exists
+                        new_recommendations.append(rec)
+                    if new_recommendations:
+                        recommendation_count += len(new_recommendations)
+                        yield {"recommendations": new_recommendations, "type": "final_recommendations"}
+
+        # The run has been writing the recommendations to its export as they arrived; ask it to finish the files
+        if recommendation_count:
+            yield {"message": "Recommendations saved to CSV.", "export": recommendation_count}
         else:
             yield {"error": "No recommendations generated."}
 
     except Exception as e:
         # Handle any errors during the agent chat
-        await handle_stream_error(f"Error during agent conversation: {e}")
-async def start_sequential_group_chats(initial_prompt: Optional[str] = None):
+        async for message in handle_stream_error(f"Error during agent conversation: {e}"):
+            yield message
+def with_waste_findings(prompt: str, waste: List[Dict], ambiguous: List[Dict]) -> str:
+    """
+    Tell the agents which resources the waste rules already handled and which findings still need their judgement.
+    """
+    if not waste and not ambiguous:
+        return prompt
+    sections = [prompt]
+    if waste:
+        handled = "\n".join(f"- {rec['resourceId']} ({rec['rule']})" for rec in waste)
+        sections.append(
+            "These resources were already reported by deterministic checks; do not analyze them again:\n" + handled
+        )
+    if ambiguous:
+        pending = "\n".join(f"- {rec['resourceId']} ({rec['rule']}, {rec['reason']})" for rec in ambiguous)
+        sections.append("Verify whether these possible waste findings are real before recommending anything:\n" + pending)
+    return "\n\n".join(sections)
+
+async def start_sequential_group_chats(initial_prompt: Optional[str], team: AgentTeam):
     """
     Starts the first group chat (initial analysis) and then initiates the second group chat (final recommendations)
     after the first one completes, passing relevant context or messages.
+    Both chats run on the given team, which must not be shared with another session.
     """
     agent_messages = []  # This will store messages from the first chat
 
     # Step 1: Run the first group chat (main analysis)
-    async for message in initiate_agent_conversation(initial_prompt):
+    async for message in initiate_agent_conversation(initial_prompt, team):
         # Collect only valid messages
         if "content" in message and message["content"].strip():
             agent_messages.append(message["content"].strip())
@@ -718,7 +918,7 @@ async def start_sequential_group_chats(initial_prompt: Optional[str] = None):
         combined_messages = "\n".join(agent_messages)
         print(f"Combined messages for final recommendations: {combined_messages}")
         try:
-            async for final_message in initiate_final_recommendation(combined_messages):
+            async for final_message in initiate_final_recommendation(combined_messages, team):
                 print(f"Streaming final recommendation message: {final_message}")
                 yield final_message
         except Exception as e:
@@ -728,130 +928,128 @@ async def start_sequential_group_chats(initial_prompt: Optional[str] = None):
         print("No valid messages collected from the first group chat.")
         yield {"content": "No messages available for final recommendations.", "role": "system", "name": "Error"}
 
-async def initiate_agent_conversation(prompt):
+async def initiate_agent_conversation(prompt, team: AgentTeam):
     """
     Initiates the first group chat for agent analysis.
+    The chat runs in a worker thread and every agent turn is streamed as soon as it is sent.
     """
-    # Start a background task to initiate the chat
-    user_proxy.initiate_chat(
-        manager,
-        message=prompt,
-        max_turns=5,
-        max_round=50,
-        clear_history=True
-    )
+    manager = team.manager
+    max_timeout = 300  # 5 minutes max (300 seconds) without a new message
 
-    last_message_count = 0  # Start from the first message
-    timeout_counter = 0
-    max_timeout = 300  # 5 minutes max (300 seconds)
-    
     yield {
         "content": "Starting conversation with Azure optimization agents...",
         "name": "System",
         "role": "system",
-        "timestamp": datetime.now().strftime("%H:%M:%S"),
+        "timestamp": clock_timestamp(),
     }
-    
-    while True:
-        current_message_count = len(manager.groupchat.messages)
-        
-        if current_message_count > last_message_count:
-            timeout_counter = 0  # Reset timeout counter when we get new messages
-            
-            # Process new messages
-            for message in manager.groupchat.messages[last_message_count:current_message_count]:
-                content = message.get("content", "")
-                sender_name = message.get("name", "Agent")
-                role = "agent" if sender_name != "admin" else "user"
-                
-                # Skip empty messages
-                if not content or content.strip() == "":
-                    continue
-                
-                # Stream all messages to show the agent's thinking process
-                yield {
-                    "content": content,
-                    "name": sender_name,
-                    "role": role,
-                    "timestamp": datetime.now().strftime("%H:%M:%S"),
-                }
-                
-                # Also check if this is a recommendation in JSON format
-                if content.startswith("[") and content.endswith("]"):
-                    try:
-                        recommendations = json.loads(content)  # Parse JSON
-                        yield {
-                            "recommendations": recommendations,
-                            "timestamp": datetime.now().strftime("%H:%M:%S"),
-                        }
-                    except json.JSONDecodeError:
-                        logging.error("Invalid recommendation format")
-                
-                # Check for termination
-                if "TERMINATE" in content:
-                    print("Detected TERMINATE signal")
-                    # Add a final message to indicate completion
+
+    chat = team.run_chat(
+        lambda: team.user_proxy.initiate_chat(
+            manager,
+            message=prompt,
+            max_turns=5,
+            max_round=50,
+            clear_history=True,
+            cache=autogen_completion_cache,
+        ),
+        chat_manager=manager,
+        idle_timeout=max_timeout,
+    )
+
+    try:
+        async for message in chat:
+            content = message.get("content") or ""
+            sender_name = message.get("name", "Agent")
+            role = "agent" if sender_name != "admin" else "user"
+
+            # Skip empty messages
+            if content.strip() == "":
+                continue
+
+            # Stream all messages to show the agent's thinking process
+            yield {
+                "content": content,
+                "name": sender_name,
+                "role": role,
+                "timestamp": clock_timestamp(),
+            }
+
+            # Also check if this is a recommendation in JSON format
+            if content.startswith("[") and content.endswith("]"):
+                try:
+                    recommendations = json.loads(content)  # Parse JSON
                     yield {
-                        "content": "Analysis complete. Generating final recommendations...",
-                        "name": "System",
-                        "role": "system",
-                        "timestamp": datetime.now().strftime("%H:%M:%S"),
+                        "recommendations": recommendations,
+                        "timestamp": clock_timestamp(),
                     }
-                    return
-                    
-            last_message_count = current_message_count
-        else:
-            # Increment timeout counter if no new messages
-            timeout_counter += 1
-            
-            # Check if we've reached the timeout
-            if timeout_counter >= max_timeout * 2:  # 2 checks per second
-                logging.warning("Agent conversation timed out")
+                except json.JSONDecodeError:
+                    logging.error("Invalid recommendation format")
+
+            # Check for termination
+            if "TERMINATE" in content:
+                print("Detected TERMINATE signal")
+                # Add a final message to indicate completion
                 yield {
-                    "content": "The conversation timed out. Please try again with a more specific query.",
+                    "content": "Analysis complete. Generating final recommendations...",
                     "name": "System",
                     "role": "system",
-                    "timestamp": datetime.now().strftime("%H:%M:%S"),
+                    "timestamp": clock_timestamp(),
                 }
                 return
+    except asyncio.TimeoutError:
+        logging.warning("Agent conversation timed out")
+        yield {
+            "content": "The conversation timed out. Please try again with a more specific query.",
+            "name": "System",
+            "role": "system",
+            "timestamp": clock_timestamp(),
+        }
+    finally:
+        await chat.aclose()
 
-        await asyncio.sleep(0.5)  # Check for new messages every half second
-
-async def initiate_final_recommendation(agent_messages):
+async def initiate_final_recommendation(agent_messages, team: Optional[AgentTeam] = None):
     if not agent_messages:
         yield {"content": "No messages available for final recommendations.", "role": "system", "name": "Error"}
         return
 
-    print(f"Starting Final_Recommender with messages: {agent_messages}")
-    final_recommender.initiate_chat(
-        final_manager,
-        message=agent_messages,
-        max_turns=2,
-        max_round=10,
-        clear_history=True
-    )
-
-    last_message_count = 0
-    while True:
-        current_message_count = len(final_manager.groupchat.messages)
-
-        if current_message_count > last_message_count:
-            for message in final_manager.groupchat.messages[last_message_count:current_message_count]:
-                # Stream messages to client
-                yield {
-                    "content": message.get("content"),
-                    "role": message.get("role"),
-                    "name": message.get("name"),
-                }
+    # Callers outside a running analysis borrow a team just for this phase
+    if team is None:
+        async with agent_team_pool.session() as pooled_team:
+            async for message in initiate_final_recommendation(agent_messages, pooled_team):
+                yield message
+        return
 
-                # Stop streaming if the termination signal is detected
-                if message.get("content") == "FINAL_RECOMMENDATIONS_COMPLETE":
-                    print("Final recommendations complete.")
-                    return
+    final_manager = team.final_manager
 
-            last_message_count = current_message_count
+    print(f"Starting Final_Recommender with messages: {agent_messages}")
+    chat = team.run_chat(
+        lambda: team.final_recommender.initiate_chat(
+            final_manager,
+            message=agent_messages,
+            max_turns=2,
+            max_round=10,
+            clear_history=True,
+            cache=autogen_completion_cache,
+        ),
+        chat_manager=final_manager,
+        idle_timeout=300,
+    )
 
-        await asyncio.sleep(1)
+    try:
+        async for message in chat:
+            # Stream messages to client
+            yield {
+                "content": message.get("content"),
+                "role": message.get("role", "user"),
+                "name": message.get("name"),
+            }
+
+            # Stop streaming if the termination signal is detected
+            if message.get("content") == "FINAL_RECOMMENDATIONS_COMPLETE":
+                print("Final recommendations complete.")
+                return
+    finally:
+        await chat.aclose()
 
 async def stream_new_messages(last_message_count, current_message_count, chat_manager):
     """
@@ -859,33 +1057,14 @@ async def stream_new_messages(last_message_count, current_message_count, chat_ma
     """
     for message in chat_manager.groupchat.messages[last_message_count:current_message_count]:
         print(f"Streaming message: {message}")
-        msg_content = {
-            "content": message.get("content"),
-            "role": message.get("role"),
-            "name": message.get("name"),
-            "timestamp": datetime.now().strftime("%H:%M:%S"),
-        }
-        yield msg_content
+        yield text_envelope(message.get("content"), name=message.get("name"), role=message.get("role"), timestamp=clock_timestamp())
 
 async def handle_stream_error(error_message):
     """
     Handles errors during the stream by yielding an error message to the client.
     """
     print(f"Stream error encountered: {error_message}")
-    error_msg = {
-        "content": error_message,
-        "role": "system",
-        "name": "Error",
-        "timestamp": datetime.now().strftime("%H:%M:%S"),
-    }
-    async for msg in error_msg_generator(error_msg):
-        yield msg
-
-async def error_msg_generator(error_msg):
-    """
-    Generates an error message to be streamed to the client.
-    """
-    yield json.dumps(error_msg)
+    yield {"error": error_message}
 
 async def get_guardrails_recommendations(conversation_text: str):
     """
@@ -893,12 +1072,12 @@ async def get_guardrails_recommendations(conversation_text: str):
     """
     print("Calling instructor module with combined agent messages:", conversation_text)
     try:
-        guardrails_response = extract_azure_resource_details(instructor_client, conversation_text)
+        guardrails_response = await extract_azure_resource_details(get_instructor_client(), conversation_text)
         formatted_response = {
             "content": guardrails_response,
             "role": "system",
             "name": "Instructor_Guardrails",
-            "timestamp": datetime.now().strftime("%H:%M:%S"),
+            "timestamp": clock_timestamp(),
             "final_recommendations": True
         }
         return formatted_response
@@ -8,9 +8,10 @@ from pydantic import BaseModel, Field, validator
 import os
 import sys
 import dotenv
-import instructor
-from openai import AzureOpenAI
 from typing import List, Optional
+from ..caching.completion_cache import cached_acompletion
+from ..llm_clients import DEFAULT_API_VERSION, get_async_instructor_client, get_async_openai_client
+from ..caching.tiered_cache import TieredCache
 
 # Load environment variables
 dotenv.load_dotenv()
@@ -37,16 +38,13 @@ def check_environment_variables():
         logger.info(f"Azure OpenAI Endpoint: {azure_endpoint}")
     
     # Log API version
-    api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2023-05-15")
+    api_version = os.getenv("AZURE_OPENAI_API_VERSION", DEFAULT_API_VERSION)
     logger.info(f"Azure OpenAI API Version: {api_version}")
     
     # Log deployment name
     deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4")
     logger.info(f"Azure OpenAI Deployment Name: {deployment_name}")
 
-# Run environment check
-check_environment_variables()
-
 # Get environment variables with error handling
 def get_required_env(name: str) -> str:
     value = os.getenv(name)
@@ -55,45 +53,70 @@ def get_required_env(name: str) -> str:
         raise ValueError(f"Missing required environment variable: {name}")
     return value
 
-# Initialize the Azure client for use with instructor
-try:
-    # Initialize AzureOpenAI client
-    api_key = os.getenv("AZURE_OPENAI_API_KEY") or os.getenv("AZURE_OPENAI_KEY")
-    api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2023-05-15")
-    azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT") or os.getenv("AZURE_OPENAI_API_BASE")
-    deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4")
-    
-    if not api_key:
-        logger.error("Missing API key - ensure AZURE_OPENAI_API_KEY or AZURE_OPENAI_KEY is set")
-        raise ValueError("Missing required API key")
-    
-    if not azure_endpoint:
-        logger.error("Missing endpoint - ensure AZURE_OPENAI_ENDPOINT or AZURE_OPENAI_API_BASE is set")
-        raise ValueError("Missing required endpoint")
-    
-    logger.info(f"Initializing AzureOpenAI client with endpoint: {azure_endpoint}")
-    
-    # Initialize the AzureOpenAI client
-    azure_client = AzureOpenAI(
-        api_key=api_key,
-        api_version=api_version,
-        azure_endpoint=azure_endpoint
-    )
-    
-    # Then wrap it with instructor - use simple initialization
+# The environment is checked and the clients are built on first use, so importing the validator stays cheap
+_environment_checked = False
+
+
+def get_validator_clients():
+    """
+    The (raw, instructor) async clients used for validation.
+
+    Both come from the process-wide client in `llm_clients`, so they are built on the first
+    validation and rebuilt if the pool was closed.
+
+    Returns:
+        Tuple: The shared `AsyncAzureOpenAI` client and its instructor wrapper (the raw client if
+            instructor cannot wrap it), or `(None, None)` when no client can be built.
+    """
+    global _environment_checked
+    if not _environment_checked:
+        _environment_checked = True
+        check_environment_variables()
+    try:
+        # Shared AsyncAzureOpenAI client (one pooled HTTP stack for the validator and guardrails)
+        azure_client = get_async_openai_client()
+    except Exception as e:
+        logger.error(f"Failed to initialize AzureOpenAI client: {str(e)}")
+        logger.warning("Will use fallback validation without AI")
+        return None, None
     try:
-        client = instructor.from_openai(azure_client)
-        logger.info("AzureOpenAI client initialized successfully with instructor wrapper")
+        client = get_async_instructor_client()
     except Exception as e:
         logger.warning(f"Failed to initialize instructor wrapper: {e}")
+        logger.info("Using raw AsyncAzureOpenAI client without instructor wrapper")
         client = azure_client
-        logger.info("Using raw AzureOpenAI client without instructor wrapper")
-    
-except Exception as e:
-    logger.error(f"Failed to initialize AzureOpenAI client: {str(e)}")
-    azure_client = None
-    client = None
-    logger.warning("Will use fallback validation without AI")
+    return azure_client, client
+
+# Validation results are reused for identical (normalized) prompts for this long (seconds)
+VALIDATION_MEMO_TTL = float(os.getenv("OPTIMONKEY_VALIDATION_MEMO_TTL", "3600"))
+
+# In-memory only: a hit must cost well under a millisecond
+validation_memo = TieredCache(
+    "validation",
+    ttl=VALIDATION_MEMO_TTL,
+    memory_max_entries=int(os.getenv("OPTIMONKEY_VALIDATION_MEMO_ENTRIES", "1024")),
+)
+
+# Number of validations answered by each tier: memo, local scorer, LLM, or no-client fallback
+validation_tiers = {"memo": 0, "local": 0, "llm": 0, "fallback": 0}
+
+# Whole words that mark a prompt as a cost optimization request
+INTENT_KEYWORDS = frozenset({
+    "cost", "costs", "save", "saving", "savings", "spend", "spending", "budget", "optimize", "optimise",
+    "optimization", "optimisation", "idle", "unused", "underutilized", "underutilised", "under-utilized",
+    "rightsize", "rightsizing", "right-size", "right-sizing", "waste", "wasted", "orphan", "orphaned",
+    "unattached", "deallocated", "reserved", "reservation", "reservations", "usage", "utilization", "utilisation",
+})
+# Neutral words a locally accepted prompt may contain besides the intent keywords and subscription IDs
+SCOPE_WORDS = frozenset({
+    "a", "an", "the", "my", "our", "all", "any", "in", "on", "for", "of", "and", "to", "across", "me", "please",
+    "azure", "subscription", "subscriptions", "resource", "resources", "find", "show", "list", "identify",
+    "vm", "vms", "virtual", "machine", "machines", "disk", "disks", "public", "ip", "ips", "opportunities",
+})
+# Prompts shorter than this many words, without a subscription ID, cannot describe a task
+MIN_PROMPT_WORDS = 3
+# Longest prompt (in words, subscription IDs excluded) that can be accepted without the LLM reviewer
+LOCAL_ACCEPT_MAX_WORDS = 16
 
 # Enum for Confidence Levels
 class ConfidenceScore(Enum):
@@ -154,14 +177,62 @@ def search_subscription_id(prompt: str) -> List[str]:
     matches = re.findall(pattern, prompt)
     return matches
 
+_WHITESPACE = re.compile(r"\s+")
+
+# Normalize a prompt so that equivalent prompts share one validation result
+def normalize_prompt(prompt: str) -> str:
+    """Fold case and whitespace, and move the subscription IDs (sorted, deduplicated) to the end."""
+    folded = prompt.casefold()
+    subscription_ids = sorted(set(search_subscription_id(folded)))
+    for subscription in subscription_ids:
+        folded = folded.replace(subscription, " ")
+    text = _WHITESPACE.sub(" ", folded).strip()
+    return f"{text}|{','.join(subscription_ids)}"
+
+_WORD = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+# Score clear-cut prompts locally; returns None for prompts that need the LLM reviewer
+def score_prompt_locally(prompt: str) -> Optional["ReviewResponse"]:
+    """
+    Local fast path of the validator.
+
+    Only short prompts made entirely of subscription IDs, intent keywords and neutral scope
+    words (at least one of each of the first two) are accepted; empty or too short prompts
+    without a subscription ID are rejected. Everything else, in particular any prompt with
+    instructions beyond those words, is left to the LLM security reviewer.
+    """
+    folded = prompt.casefold()
+    subscription_ids = search_subscription_id(folded)
+    for subscription in subscription_ids:
+        folded = folded.replace(subscription, " ")
+    words = _WORD.findall(folded)
+
+    if not subscription_ids and len(words) < MIN_PROMPT_WORDS:
+        return ReviewResponse(confidence_score=ConfidenceScore.LOW, explanation="The prompt is empty or too short to describe a task.")
+    if (
+        subscription_ids
+        and len(words) <= LOCAL_ACCEPT_MAX_WORDS
+        # Anything but letters, digits, hyphens and sentence punctuation (quotes, code, URLs...) needs the reviewer
+        and not re.search(r"[^a-z0-9\s,.!?-]", folded)
+        and any(word in INTENT_KEYWORDS for word in words)
+        and all(word in INTENT_KEYWORDS or word in SCOPE_WORDS for word in words)
+    ):
+        return ReviewResponse(
+            confidence_score=ConfidenceScore.HIGH,
+            explanation=f"Cost optimization request for subscription(s) {', '.join(sorted(set(subscription_ids)))}.",
+        )
+    return None
+
 # Function to validate prompt with OpenAI and parse the response
-def validate_prompt_with_instructor(prompt: str, reviewer_name: str = "Reviewer") -> ReviewResponse:
+async def validate_prompt_with_instructor(prompt: str, reviewer_name: str = "Reviewer") -> ReviewResponse:
     try:
         logger.info(f"Task sent to {reviewer_name}: {prompt}")
         
         # Check if we have a client available
-        if not 'client' in globals() or client is None:
+        azure_client, client = get_validator_clients()
+        if client is None:
             logger.warning("No OpenAI client available. Using fallback validation.")
+            validation_tiers["fallback"] += 1
             # Fall back to basic validation based on subscription IDs
             found_subscription_ids = search_subscription_id(prompt)
             if found_subscription_ids:
@@ -177,13 +248,15 @@ def validate_prompt_with_instructor(prompt: str, reviewer_name: str = "Reviewer"
             )
         
         # Otherwise, proceed with normal AI-based validation
+        validation_tiers["llm"] += 1
         # Search for all subscription IDs in the prompt
         found_subscription_ids = search_subscription_id(prompt)
         
         # Try to get a structured response
         try:
-            # Attempt to use instructor with the ResponseModel
-            response = client.chat.completions.create(
+            # Attempt to use instructor with the ResponseModel (served from the completion cache on repeats)
+            response = await cached_acompletion(
+                client.chat.completions.create,
                 model="gpt-4o-mini",
                 response_model=ReviewResponse,
                 max_retries=3,
@@ -216,7 +289,8 @@ def validate_prompt_with_instructor(prompt: str, reviewer_name: str = "Reviewer"
             
             # Use raw completion API without instructor
             try:
-                raw_response = azure_client.chat.completions.create(
+                raw_response = await cached_acompletion(
+                    azure_client.chat.completions.create,
                     model="gpt-4o-mini",
                     messages=[
                         {"role": "system", "content": "You are an Azure cost optimization expert. Review the prompt and provide feedback."},
@@ -323,16 +397,23 @@ async def start_prompt_validation(prompt=None):
     """
     if prompt is None:
         prompt = "Please provide a valid subscription ID to estimate costs."
-    
+
+    # Repeat prompts (e.g. the prompt cards) are answered from the memo without an LLM call
+    memo_key = normalize_prompt(prompt)
+    memoized = validation_memo.get(memo_key)
+    if memoized is not None:
+        validation_tiers["memo"] += 1
+        return dict(memoized)
+
     try:
-        # Run validation with a single reviewer
-        try:
-            # Try async approach first
-            review_result = await asyncio.to_thread(validate_prompt_with_instructor, prompt, "Security Reviewer")
-        except Exception as async_error:
-            # Fall back to direct call if asyncio fails
-            logger.warning(f"Async execution failed: {async_error}. Trying synchronous call.")
-            review_result = validate_prompt_with_instructor(prompt, "Security Reviewer")
+        # Clear-cut prompts are scored locally; only the ambiguous ones reach the reviewer
+        review_result = score_prompt_locally(prompt)
+        scored_locally = review_result is not None
+        if scored_locally:
+            validation_tiers["local"] += 1
+        else:
+            # Run validation with a single reviewer on the shared async client (no worker thread)
+            review_result = await validate_prompt_with_instructor(prompt, "Security Reviewer")
         
         # Extract the confidence score value
         if isinstance(review_result.confidence_score, ConfidenceScore):
@@ -361,12 +442,16 @@ async def start_prompt_validation(prompt=None):
         print(result_message)
         
         # Return clean dictionary
-        return {
+        result = {
             "confidence_score": confidence_score_value,
             "explanation": review_result.explanation,
             "board_decision": decision_text,  # Use the more specific text
             "score_name": score_name
         }
+        # The reviewer also reports call failures as LOW, so only its passing results are memoized
+        if scored_locally or confidence_score_value >= ConfidenceScore.MEDIUM.value:
+            validation_memo.set(memo_key, result)
+        return dict(result)
     except Exception as e:
         # Handle any errors
         logger.error(f"Validation failed: {e}")
@@ -377,6 +462,11 @@ async def start_prompt_validation(prompt=None):
             "score_name": "LOW"
         }
 
+# Counters for the diagnostics endpoint
+def validation_stats() -> dict:
+    """Validations served per tier, plus the memo's hit/miss counters."""
+    return {"tiers": dict(validation_tiers), "memo": validation_memo.stats()}
+
 # Function to convert string values to proper enum integers - uses the validator logic
 def parse_confidence_score(value):
     """Parse confidence score values to the correct enum type using the validator logic."""
@@ -0,0 +1,147 @@
+import csv
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from .envelopes import encode
+
+logger = logging.getLogger(__name__)
+
+# Formats written for every export; Parquet needs the pyarrow package
+EXPORT_FORMATS = tuple(
+    fmt.strip() for fmt in os.getenv("OPTIMONKEY_EXPORT_FORMATS", "csv,jsonl,parquet").split(",") if fmt.strip()
+)
+# Rows per Arrow record batch when converting to Parquet
+PARQUET_BATCH_ROWS = 10_000
+
+
+def _cell(value: Any) -> str:
+    """CSV text of a value: nested structures as JSON, missing values empty."""
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+class RecommendationWriter:
+    """
+    Incremental export of recommendation rows to CSV, JSONL and Parquet.
+
+    `append` writes each row to `<name>.jsonl` as it arrives and records the union of all
+    keys (in order of first appearance) and the value types of each column; nothing but
+    that schema stays in memory. `close` streams the JSONL back to write the CSV with the
+    full header and the Parquet file in record batches, so rows with extra keys are never
+    a problem and memory stays flat however many rows are exported. `abort` drops an
+    export that will not be finished.
+    """
+
+    def __init__(self, directory: str, name: str = "recommendations", formats: Iterable[str] = EXPORT_FORMATS):
+        self.directory = directory
+        self.name = name
+        self.formats = tuple(formats)
+        self.columns: List[str] = []
+        self._column_types: Dict[str, Set[type]] = {}
+        self.rows = 0
+        self._jsonl = None
+
+    def path(self, fmt: str) -> str:
+        return os.path.join(self.directory, f"{self.name}.{fmt}")
+
+    def append(self, rows: Iterable[Dict[str, Any]]):
+        if self._jsonl is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._jsonl = open(self.path("jsonl"), "w", encoding="utf-8")
+        for row in rows:
+            if not isinstance(row, dict):
+                logger.error(f"Skipping malformed recommendation: {row!r}")
+                continue
+            for key, value in row.items():
+                types = self._column_types.get(key)
+                if types is None:
+                    types = self._column_types[key] = set()
+                    self.columns.append(key)
+                if value is not None:
+                    types.add(type(value))
+            self._jsonl.write(encode(row) + "\n")
+            self.rows += 1
+
+    def abort(self):
+        """Stop an unfinished export (cancelled or failed run): close the JSONL and remove the partial files."""
+        if self._jsonl is not None:
+            self._jsonl.close()
+        for fmt in {"jsonl", *self.formats}:
+            try:
+                os.remove(self.path(fmt))
+            except FileNotFoundError:
+                pass
+
+    def _read_rows(self) -> Iterator[Dict[str, Any]]:
+        with open(self.path("jsonl"), encoding="utf-8") as handle:
+            for line in handle:
+                yield json.loads(line)
+
+    def close(self) -> List[str]:
+        """Finish the export and return the formats written (JSONL is removed unless requested)."""
+        if self._jsonl is None:
+            return []
+        self._jsonl.close()
+        written = []
+        if "csv" in self.formats:
+            self._write_csv()
+            written.append("csv")
+        if "parquet" in self.formats and self._write_parquet():
+            written.append("parquet")
+        if "jsonl" in self.formats:
+            written.append("jsonl")
+        else:
+            os.remove(self.path("jsonl"))
+        return written
+
+    def _write_csv(self):
+        with open(self.path("csv"), "w", newline="", encoding="utf-8") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(self.columns)
+            for row in self._read_rows():
+                writer.writerow([_cell(row.get(column)) for column in self.columns])
+
+    def _arrow_type(self, column: str):
+        import pyarrow as pa
+
+        types = self._column_types[column]
+        if types == {bool}:
+            return pa.bool_()
+        if types == {int}:
+            return pa.int64()
+        if types and types <= {int, float}:
+            return pa.float64()
+        return pa.string()
+
+    def _write_parquet(self) -> bool:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            logger.warning("pyarrow is not installed, skipping the Parquet export")
+            return False
+        schema = pa.schema([(column, self._arrow_type(column)) for column in self.columns])
+        converters = {
+            column: (lambda value: value) if schema.field(column).type != pa.string()
+            else (lambda value: None if value is None else _cell(value))
+            for column in self.columns
+        }
+        with pq.ParquetWriter(self.path("parquet"), schema) as writer:
+            batch: Dict[str, List[Any]] = {column: [] for column in self.columns}
+            size = 0
+            for row in self._read_rows():
+                for column in self.columns:
+                    batch[column].append(converters[column](row.get(column)))
+                size += 1
+                if size == PARQUET_BATCH_ROWS:
+                    writer.write_batch(pa.record_batch([batch[column] for column in self.columns], schema=schema))
+                    batch = {column: [] for column in self.columns}
+                    size = 0
+            if size:
+                writer.write_batch(pa.record_batch([batch[column] for column in self.columns], schema=schema))
+        return True
@@ -0,0 +1,288 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.managers import SyncManager
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional
+
+from .azure_tools.resource_graph import iter_resource_graph_query
+from .envelopes import clock_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for analyses of several given subscriptions or a management group (0 = analyze them in one chat, in-process)
+SHARD_WORKERS = int(os.getenv("OPTIMONKEY_SHARD_WORKERS", "0"))
+# Seconds between a running shard's checks of its analysis' cancel event
+SHARD_CANCEL_POLL_SECONDS = float(os.getenv("OPTIMONKEY_SHARD_CANCEL_POLL_SECONDS", "0.5"))
+
+_SUBSCRIPTIONS_QUERY = (
+    "resourcecontainers | where type == 'microsoft.resources/subscriptions' | project id, subscriptionId, name"
+)
+
+# Fields that identify the resource and the action of a recommendation, in order of preference
+_RESOURCE_FIELDS = ("resourceId", "resource_id", "ResourceId", "id")
+_ACTION_FIELDS = ("rule", "recommendation", "Recommendation", "action", "Action")
+
+# Event loop of a shard worker process, kept for all its shards (see `_init_worker`)
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+shard_counters = {"analyses": 0, "shards": 0, "completed": 0, "failed": 0, "cancelled": 0, "duplicates": 0}
+
+
+def management_group_subscriptions(management_group: str) -> List[str]:
+    """IDs of the subscriptions below a management group (at any depth), read from Resource Graph."""
+    return [
+        row["subscriptionId"]
+        for row in iter_resource_graph_query(_SUBSCRIPTIONS_QUERY, [], management_groups=[management_group])
+    ]
+
+
+def resolve_subscriptions(subscriptions: Iterable[str], management_group: Optional[str] = None) -> List[str]:
+    """The subscriptions to analyze: the given ones plus those of the management group, deduplicated."""
+    resolved = list(subscriptions)
+    if management_group:
+        resolved.extend(management_group_subscriptions(management_group))
+    return sorted({subscription.lower() for subscription in resolved})
+
+
+def shard_prompt(prompt: str, subscription: str) -> str:
+    """Scope the user's prompt to one subscription; the others are analyzed by other shards."""
+    return (
+        f"{prompt}\n\nAnalyze only subscription {subscription}. "
+        "Other subscriptions are analyzed separately; do not query them."
+    )
+
+
+def recommendation_key(recommendation: Dict[str, Any]) -> str:
+    """Identity of a recommendation: its resource and action, or the whole row if it names no resource."""
+    resource = next((recommendation[field] for field in _RESOURCE_FIELDS if recommendation.get(field)), None)
+    if resource is None:
+        return json.dumps(recommendation, sort_keys=True, default=str)
+    action = next((recommendation[field] for field in _ACTION_FIELDS if recommendation.get(field)), "")
+    return f"{str(resource).lower()}|{str(action).strip().lower()}"
+
+
+class RecommendationMerger:
+    """
+    Union of the recommendations of all shards, keeping the first of each duplicate.
+
+    Only the identity keys are kept; the rows themselves are handed on as soon as they are
+    merged, so memory grows with the number of distinct keys rather than with the rows.
+    """
+
+    def __init__(self):
+        self._keys = set()
+        self.count = 0
+        self.duplicates = 0
+
+    def add(self, subscription: str, recommendations: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Merge the recommendations of one shard and return the ones not seen before."""
+        added = []
+        for recommendation in recommendations:
+            if not isinstance(recommendation, dict):
+                logger.error(f"Skipping malformed recommendation: {recommendation!r}")
+                continue
+            key = recommendation_key(recommendation)
+            if key in self._keys:
+                self.duplicates += 1
+                continue
+            self._keys.add(key)
+            recommendation.setdefault("subscriptionId", subscription)
+            added.append(recommendation)
+        self.count += len(added)
+        return added
+
+
+async def _analyze_shard(prompt: str, subscription: str) -> Dict[str, Any]:
+    # Imported here: only the worker processes run agent teams for shards
+    from .optimonkeyagents import analyze_subscriptions
+
+    # One subscription's rows travel back to the server in a single result, so they are collected here
+    recommendations: List[Dict] = []
+    errors: List[str] = []
+    async for message in analyze_subscriptions(shard_prompt(prompt, subscription), [subscription]):
+        if "recommendations" in message:
+            # The stream publishes each batch of new rows once
+            recommendations.extend(message["recommendations"])
+        elif "error" in message:
+            errors.append(message["error"])
+    return {"recommendations": recommendations, "errors": errors}
+
+
+async def _until_cancelled(analysis: Any, cancelled: Optional[Any]) -> Dict[str, Any]:
+    """
+    Await `analysis`, cancelling it once the server sets `cancelled` (a Manager event proxy).
+
+    Cancelling the task closes the shard's agent team session, which stops the chat at its
+    next agent turn, so an abandoned shard stops spending LLM tokens.
+    """
+    task = asyncio.ensure_future(analysis)
+    if cancelled is None:
+        return await task
+    while not task.done():
+        try:
+            stop = cancelled.is_set()
+        except (EOFError, OSError):
+            # The server's manager is gone, and with it whoever wanted the result
+            stop = True
+        if stop:
+            task.cancel()
+            break
+        await asyncio.wait({task}, timeout=SHARD_CANCEL_POLL_SECONDS)
+    try:
+        return await task
+    except asyncio.CancelledError:
+        return {"recommendations": [], "errors": [], "cancelled": True}
+
+
+def run_shard(prompt: str, subscription: str, cancelled: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Analyze one subscription in a shard worker process.
+
+    The process keeps its own Azure clients, caches and agent team between shards, so only
+    the first shard it runs pays for building them. Every shard runs on the worker's one
+    event loop: the pooled LLM HTTP client and the agent pool's semaphore are bound to the
+    loop they were first used on and would fail on a fresh one. The shard stops early when
+    the analysis' `cancelled` event is set.
+    """
+    started = time.monotonic()
+    loop = _worker_loop
+    if loop is None:
+        # Called outside the pool (e.g. directly in a script); give this process its loop now
+        _init_worker()
+        loop = _worker_loop
+    result = loop.run_until_complete(_until_cancelled(_analyze_shard(prompt, subscription), cancelled))
+    result["seconds"] = round(time.monotonic() - started, 1)
+    return result
+
+
+def _init_worker():
+    global _worker_loop
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    _worker_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_worker_loop)
+
+
+class ShardPool:
+    """
+    Process pool running one subscription per task.
+
+    Processes are spawned (not forked, the server has threads running) on first use and
+    reused for later analyses. Each has its own agent team pool, clients and event loop;
+    the SQLite stores (inventory, metrics, completion cache) are shared through WAL. A
+    manager process hands each analysis a cancel event its running shards poll.
+    """
+
+    def __init__(
+        self, workers: int = SHARD_WORKERS, target: Callable[[str, str, Any], Dict[str, Any]] = run_shard
+    ):
+        self.workers = workers
+        self.target = target
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager: Optional[SyncManager] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+            )
+            logger.info(f"Started shard pool with {self.workers} worker process(es)")
+        return self._executor
+
+    def _get_manager(self) -> SyncManager:
+        if self._manager is None:
+            self._manager = multiprocessing.get_context("spawn").Manager()
+        return self._manager
+
+    async def analyze(self, prompt: str, subscriptions: List[str]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Analyze each subscription in a worker process and stream the merged recommendations.
+
+        Yields a progress message and the merged, de-duplicated recommendations as each shard
+        finishes, and an export message at the end. Cancelling drops the shards that have not
+        started and sets the analysis' cancel event, which stops the running ones at their
+        next agent turn.
+        """
+        shard_counters["analyses"] += 1
+        shard_counters["shards"] += len(subscriptions)
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        cancelled = await asyncio.to_thread(self._get_manager().Event)
+        futures = {
+            loop.run_in_executor(executor, self.target, prompt, subscription, cancelled): subscription
+            for subscription in subscriptions
+        }
+        merger = RecommendationMerger()
+        started = time.monotonic()
+        pending = set(futures)
+        try:
+            yield {
+                "content": f"Analyzing {len(subscriptions)} subscriptions in parallel on {min(self.workers, len(subscriptions))} worker(s)...",
+                "name": "System",
+                "role": "system",
+                "timestamp": clock_timestamp(),
+            }
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    subscription = futures[future]
+                    finished = len(futures) - len(pending)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        shard_counters["failed"] += 1
+                        logger.error(f"Shard for subscription {subscription} failed: {e}")
+                        yield {"error": f"Analysis of subscription {subscription} failed: {e}"}
+                        continue
+                    shard_counters["completed"] += 1
+                    for error in result["errors"]:
+                        yield {"error": f"Subscription {subscription}: {error}"}
+                    added = merger.add(subscription, result["recommendations"])
+                    yield {
+                        "content": (
+                            f"Subscription {subscription} analyzed in {result['seconds']}s: {len(added)} new recommendation(s) "
+                            f"({finished}/{len(futures)} subscriptions done)"
+                        ),
+                        "name": "System",
+                        "role": "system",
+                        "timestamp": clock_timestamp(),
+                    }
+                    if added:
+                        yield {"recommendations": added, "type": "final_recommendations"}
+        finally:
+            if pending:
+                cancelled.set()
+            for future in pending:
+                future.cancel()
+            shard_counters["cancelled"] += len(pending)
+            shard_counters["duplicates"] += merger.duplicates
+
+        logger.info(
+            f"Sharded analysis of {len(subscriptions)} subscriptions took {time.monotonic() - started:.1f}s "
+            f"({merger.count} recommendations, {merger.duplicates} duplicates dropped)"
+        )
+        if merger.count:
+            yield {"message": "Recommendations saved to CSV.", "export": merger.count}
+        else:
+            yield {"error": "No recommendations generated."}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"workers": self.workers, "started": self._executor is not None, **shard_counters}
+
+
+shard_pool = ShardPool()
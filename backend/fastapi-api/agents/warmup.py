@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from .azure_tools.clients import get_client_registry
+from .llm_clients import get_async_instructor_client
+from .optimonkeyagents import agent_team_pool
+
+logger = logging.getLogger(__name__)
+
+# Build clients and agent teams in the background after startup ("0" leaves everything to first use)
+WARMUP_ENABLED = os.getenv("OPTIMONKEY_WARMUP", "1") == "1"
+# Number of agent teams to pre-build during warm-up
+WARMUP_TEAMS = int(os.getenv("OPTIMONKEY_WARMUP_TEAMS", "1"))
+
+# Seconds each warm-up step took, or the error that stopped it
+warmup_status: Dict[str, object] = {"state": "idle"}
+_warmup_task: Optional[asyncio.Task] = None
+
+
+def _warm_clients():
+    # Imports the Azure SDKs and builds the shared credential; token acquisition stays lazy
+    get_client_registry().get_credential()
+    get_async_instructor_client()
+
+
+async def _timed(step: str, coroutine):
+    started = time.perf_counter()
+    try:
+        await coroutine
+        warmup_status[step] = round(time.perf_counter() - started, 3)
+    except Exception as e:
+        warmup_status[step] = f"failed: {e}"
+        logger.warning(f"Warm-up step {step} failed: {e}")
+
+
+async def warm_up(teams: int = WARMUP_TEAMS):
+    """
+    Do the work deferred by lazy initialization before the first request needs it.
+
+    Imports AutoGen and the Azure/OpenAI SDKs, builds the shared clients and pre-builds
+    `teams` agent teams. Failures are logged and left to surface on first use.
+    """
+    warmup_status["state"] = "running"
+    await _timed("clients", asyncio.to_thread(_warm_clients))
+    if teams > 0:
+        await _timed("agent_teams", agent_team_pool.warm(teams))
+    warmup_status["state"] = "done"
+    logger.info(f"Warm-up finished: {warmup_status}")
+
+
+def start_warm_up() -> Optional[asyncio.Task]:
+    """Schedule `warm_up` on the running loop unless disabled by OPTIMONKEY_WARMUP=0."""
+    global _warmup_task
+    if not WARMUP_ENABLED:
+        warmup_status["state"] = "disabled"
+        return None
+    if _warmup_task is None:
+        _warmup_task = asyncio.create_task(warm_up())
+    return _warmup_task
+
+
+def warmup_stats() -> Dict[str, object]:
+    return dict(warmup_status)
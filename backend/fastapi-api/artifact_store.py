@@ -0,0 +1,172 @@
+import gzip
+import logging
+import os
+import re
+import shutil
+from typing import Dict, List, Optional, Tuple
+
+from agents.recommendation_writer import RecommendationWriter
+from run_log import RUN_LOG_DIR, run_directory
+
+try:
+    import zstandard
+except ImportError:  # zstd downloads are offered only when the optional zstandard package is installed
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Exports up to this size (bytes) are also sent inline in the run's csv envelope; larger ones are download-only
+EXPORT_INLINE_BYTES = int(os.getenv("OPTIMONKEY_EXPORT_INLINE_BYTES", str(256 * 1024)))
+# Compression level of the .gz copy written next to each artifact
+ARTIFACT_GZIP_LEVEL = int(os.getenv("OPTIMONKEY_ARTIFACT_GZIP_LEVEL", "6"))
+ARTIFACT_CHUNK_SIZE = 64 * 1024
+
+ARTIFACTS_DIR = "artifacts"
+_ARTIFACT_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,127}$")
+
+# Content-Encoding -> suffix of the precompressed copy, in order of preference
+ENCODINGS = {"zstd": ".zst", "gzip": ".gz"} if zstandard is not None else {"gzip": ".gz"}
+
+MEDIA_TYPES = {".csv": "text/csv", ".jsonl": "application/x-ndjson", ".json": "application/json", ".parquet": "application/vnd.apache.parquet"}
+
+
+def _compress(path: str):
+    """Write the precompressed copies of `path`, streaming it in chunks."""
+    with open(path, "rb") as source, gzip.open(path + ".gz.tmp", "wb", compresslevel=ARTIFACT_GZIP_LEVEL) as target:
+        shutil.copyfileobj(source, target, ARTIFACT_CHUNK_SIZE)
+    os.replace(path + ".gz.tmp", path + ".gz")
+    if zstandard is not None:
+        with open(path, "rb") as source, open(path + ".zst.tmp", "wb") as target:
+            zstandard.ZstdCompressor().copy_stream(source, target, read_size=ARTIFACT_CHUNK_SIZE)
+        os.replace(path + ".zst.tmp", path + ".zst")
+
+
+class ArtifactStore:
+    """
+    Files produced by a run, kept in `<run log dir>/<run_id>/artifacts/`.
+
+    Each artifact is written in place by its producer (see RunExport) and, once finalized,
+    gets precompressed copies (gzip, and zstd when available) so downloads can be streamed
+    straight from disk in the encoding the client accepts. Names are restricted to a safe
+    character set, so one run can never address another run's files.
+    """
+
+    def __init__(self, directory: str = RUN_LOG_DIR):
+        self.directory = directory
+
+    def path(self, run_id: str, name: str) -> Optional[str]:
+        """Path of an artifact, or None if the run id or name is not valid."""
+        run_dir = run_directory(run_id, self.directory)
+        if run_dir is None or not _ARTIFACT_NAME.match(name or "") or name.endswith((".gz", ".zst", ".tmp")):
+            return None
+        return os.path.join(run_dir, ARTIFACTS_DIR, name)
+
+    def artifacts_dir(self, run_id: str) -> Optional[str]:
+        run_dir = run_directory(run_id, self.directory)
+        return os.path.join(run_dir, ARTIFACTS_DIR) if run_dir is not None else None
+
+    def finalize(self, run_id: str, name: str, compress: bool = True) -> Dict:
+        """Compress an artifact written in place (e.g. by a streaming writer) and return its metadata."""
+        path = self.path(run_id, name)
+        if compress:
+            _compress(path)
+        return self.describe(run_id, name)
+
+    def describe(self, run_id: str, name: str) -> Dict:
+        path = self.path(run_id, name)
+        return {
+            "name": name,
+            "size": os.path.getsize(path),
+            "encodings": [encoding for encoding, suffix in ENCODINGS.items() if os.path.exists(path + suffix)],
+            "url": f"/runs/{run_id}/artifacts/{name}",
+        }
+
+    def list(self, run_id: str) -> Optional[List[Dict]]:
+        """Metadata of the artifacts of a run, or None if the run id is not valid."""
+        run_dir = run_directory(run_id, self.directory)
+        if run_dir is None:
+            return None
+        artifacts_dir = os.path.join(run_dir, ARTIFACTS_DIR)
+        if not os.path.isdir(artifacts_dir):
+            return []
+        return [
+            self.describe(run_id, name) for name in sorted(os.listdir(artifacts_dir))
+            if self.path(run_id, name) is not None
+        ]
+
+    def select(self, run_id: str, name: str, accept_encoding: str = "") -> Optional[Tuple[str, Optional[str]]]:
+        """
+        The file to serve for an artifact: the precompressed copy the client accepts, if any.
+
+        Returns:
+            Optional[Tuple[str, Optional[str]]]: (path, content encoding or None), or None if there is no such artifact.
+        """
+        path = self.path(run_id, name)
+        if path is None or not os.path.isfile(path):
+            return None
+        accepted = {
+            token.split(";")[0].strip().lower() for token in accept_encoding.split(",")
+            if not re.search(r";\s*q=0(\.0*)?\s*$", token)
+        }
+        for encoding, suffix in ENCODINGS.items():
+            if encoding in accepted and os.path.isfile(path + suffix):
+                return path + suffix, encoding
+        return path, None
+
+
+class RunExport:
+    """
+    The recommendations export of one run, written incrementally to its artifact directory.
+
+    `add` appends each batch of new rows the agent stream publishes; `finish` writes the
+    CSV, JSONL and Parquet artifacts (see RecommendationWriter) and returns their metadata.
+    A run that ends without finishing its export calls `abort`, so no partial artifacts stay.
+    """
+
+    def __init__(self, run_id: str, store: "ArtifactStore" = None):
+        self.run_id = run_id
+        self.store = store or artifact_store
+        self._writer = RecommendationWriter(self.store.artifacts_dir(run_id))
+        self.finished = False
+
+    @property
+    def rows(self) -> int:
+        return self._writer.rows
+
+    def add(self, recommendations: List[Dict]):
+        self._writer.append(recommendations)
+
+    def finish(self) -> List[Dict]:
+        formats = self._writer.close()
+        # Parquet is already compressed
+        artifacts = [
+            self.store.finalize(self.run_id, f"{self._writer.name}.{fmt}", compress=fmt != "parquet") for fmt in formats
+        ]
+        self.finished = True
+        return artifacts
+
+    def abort(self):
+        """Drop an export that was not finished, closing its files and removing what was written."""
+        if self.finished:
+            return
+        self._writer.abort()
+        for fmt in ("csv", "jsonl", "parquet"):
+            path = self.store.path(self.run_id, f"{self._writer.name}.{fmt}")
+            for suffix in list(ENCODINGS.values()) + [".gz.tmp", ".zst.tmp"]:
+                if path is not None and os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    def inline_csv(self) -> Optional[str]:
+        """The CSV text if it is small enough to send inline, else None."""
+        path = self.store.path(self.run_id, f"{self._writer.name}.csv")
+        if path is None or not os.path.isfile(path) or os.path.getsize(path) > EXPORT_INLINE_BYTES:
+            return None
+        with open(path, encoding="utf-8", newline="") as handle:
+            return handle.read()
+
+
+def media_type(name: str) -> str:
+    return MEDIA_TYPES.get(os.path.splitext(name)[1].lower(), "application/octet-stream")
+
+
+artifact_store = ArtifactStore()
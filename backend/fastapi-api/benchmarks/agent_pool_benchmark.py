@@ -0,0 +1,88 @@
+"""
+Throughput benchmark for the agent team pool.
+
+Runs a fixed number of simulated analyses through AgentTeamPool with increasing pool
+sizes. Each simulated analysis holds its team for a number of blocking "agent turns"
+(a sleep standing in for an LLM round trip), so the numbers show how many analyses a
+single process completes per second as N grows.
+
+Usage (from backend/fastapi-api):
+    python -m benchmarks.agent_pool_benchmark --analyses 32 --turns 5 --turn-latency 0.05
+"""
+import argparse
+import asyncio
+import time
+
+from agents.agent_team import AgentTeam, AgentTeamPool
+
+
+class _StubAgent:
+    def register_hook(self, hookable_method, hook):
+        pass
+
+    def reset(self):
+        pass
+
+
+class _StubGroupChat:
+    def __init__(self):
+        self.messages = []
+
+    def reset(self):
+        self.messages.clear()
+
+
+def build_stub_team(team_id: int) -> AgentTeam:
+    return AgentTeam(
+        user_proxy=_StubAgent(),
+        planner=_StubAgent(),
+        coder=_StubAgent(),
+        critic=_StubAgent(),
+        code_executor=_StubAgent(),
+        final_recommender=_StubAgent(),
+        groupchat=_StubGroupChat(),
+        manager=_StubAgent(),
+        final_groupchat=_StubGroupChat(),
+        final_manager=_StubAgent(),
+        team_id=team_id,
+    )
+
+
+async def run_analysis(pool: AgentTeamPool, analysis_id: int, turns: int, turn_latency: float):
+    async with pool.session() as team:
+        for turn in range(turns):
+            await asyncio.to_thread(time.sleep, turn_latency)
+            team.groupchat.messages.append({"name": f"agent-{turn}", "content": f"analysis {analysis_id}"})
+        # Transcripts must only ever contain this analysis' messages
+        assert all(m["content"] == f"analysis {analysis_id}" for m in team.groupchat.messages)
+
+
+async def measure(pool_size: int, analyses: int, turns: int, turn_latency: float) -> float:
+    pool = AgentTeamPool(build_stub_team, size=pool_size)
+    await pool.warm()
+    started = time.perf_counter()
+    await asyncio.gather(*(run_analysis(pool, i, turns, turn_latency) for i in range(analyses)))
+    elapsed = time.perf_counter() - started
+    stats = pool.stats()
+    assert stats["built"] <= pool_size and stats["in_use"] == 0
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--analyses", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--turn-latency", type=float, default=0.05)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    print(f"{'pool size':>9} | {'elapsed (s)':>11} | {'analyses/s':>10} | {'speedup':>7}")
+    baseline = None
+    for size in args.sizes:
+        elapsed = asyncio.run(measure(size, args.analyses, args.turns, args.turn_latency))
+        baseline = baseline or elapsed
+        print(f"{size:>9} | {elapsed:>11.3f} | {args.analyses / elapsed:>10.2f} | {baseline / elapsed:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Encoding benchmark for the conversation stream envelopes.
+
+Wraps a synthetic transcript (mostly agent text turns, plus a confidence score,
+recommendation batches and a CSV export) the way `process_conversation` used to (an
+if/elif chain, `datetime.now().strftime` per message and `json.dumps`) and with the
+envelope layer (dispatch table, cached timestamps, orjson), and reports envelopes per second.
+
+Usage (from backend/fastapi-api):
+    python -m benchmarks.envelope_benchmark --messages 20000 --content-chars 800 --repeat 5
+"""
+import argparse
+import datetime
+import json
+import time
+
+from agents import envelopes
+from agents.envelopes import encode, to_envelope
+
+
+def legacy_envelope(message):
+    now = lambda: datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if "error" in message:
+        return {"content": message["error"], "role": "system", "name": "Error", "timestamp": now(), "type": "error"}
+    elif "confidence_score" in message:
+        return {
+            "confidence_score": message["confidence_score"],
+            "explanation": message.get("explanation", "No explanation provided"),
+            "board_decision": message.get("board_decision", "No decision provided"),
+            "role": "system", "name": "FinOps Board", "timestamp": now(), "type": "confidence_score",
+        }
+    elif "recommendations" in message:
+        return {"recommendations": message["recommendations"], "role": "agent", "name": "Recommendations", "timestamp": now(), "type": "final_recommendations"}
+    elif "csv" in message:
+        return {"content": message.get("csv", ""), "role": "agent", "name": "CSV Export", "timestamp": now(), "type": "csv"}
+    return {
+        "content": message.get("content", ""),
+        "role": message.get("role", "agent"),
+        "name": message.get("name", "Agent"),
+        "timestamp": message.get("timestamp", now()),
+        "type": message.get("type", "text"),
+    }
+
+
+def build_transcript(count: int, content_chars: int):
+    recommendation = {
+        "resourceId": "/subscriptions/0000/resourceGroups/rg/providers/Microsoft.Compute/disks/disk-1",
+        "resourceName": "disk-1", "resourceType": "Microsoft.Compute/disks", "rule": "unattached_disk",
+        "recommendation": "Snapshot the disk if its data is still needed, then delete it.",
+    }
+    transcript = [{"confidence_score": 3, "explanation": "Subscription found", "board_decision": "✅ Approved"}]
+    agents = ["Planner", "Code_Guru", "Critic", "admin", "code_executor"]
+    for index in range(count):
+        if index % 500 == 499:
+            transcript.append({"recommendations": [recommendation] * 20, "type": "final_recommendations"})
+        else:
+            name = agents[index % len(agents)]
+            transcript.append({"content": ("x" * content_chars), "name": name, "role": "agent", "timestamp": "12:00:00"})
+    transcript.append({"message": "Recommendations saved to CSV.", "csv": "a,b\n" * 200})
+    return transcript
+
+
+def run(label: str, wrap, dumps, transcript, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for message in transcript:
+            dumps(wrap(message))
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<34}{len(transcript) / best:>14,.0f} envelopes/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000, help="Messages in the synthetic transcript")
+    parser.add_argument("--content-chars", type=int, default=800, help="Characters per agent message")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per variant (best is reported)")
+    args = parser.parse_args()
+
+    transcript = build_transcript(args.messages, args.content_chars)
+    run("legacy (if/elif, strftime, json)", legacy_envelope, json.dumps, transcript, args.repeat)
+    run("envelopes + stdlib json", to_envelope, lambda envelope: json.dumps(envelope, default=envelopes._default), transcript, args.repeat)
+    encoder = "orjson" if envelopes.orjson is not None else "stdlib json fallback"
+    run(f"envelopes + {encoder}", to_envelope, encode, transcript, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Startup benchmark for the backend.
+
+Imports `main` (the FastAPI app and everything it pulls in) in fresh interpreters and
+reports the median wall time, which is how long a new worker takes before it can accept
+requests. Add --modules to also time the heaviest dependencies on their own, e.g. to
+check that AutoGen or the Azure SDKs are no longer imported at startup.
+
+Usage (from backend/fastapi-api):
+    python -m benchmarks.import_time_benchmark --runs 5 --modules autogen azure.mgmt.monitor openai
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+_TIMER = (
+    "import sys, time; started = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - started); print(int('autogen' in sys.modules))"
+)
+
+
+def time_import(module: str) -> tuple:
+    """Import `module` in a fresh interpreter; return (seconds, whether AutoGen got imported)."""
+    env = dict(os.environ)
+    # The validator and agents only need these to be set; no request is made at import time
+    env.setdefault("AZURE_OPENAI_API_KEY", "benchmark")
+    env.setdefault("AZURE_OPENAI_API_BASE", "https://benchmark.openai.azure.com")
+    output = subprocess.run(
+        [sys.executable, "-c", _TIMER.format(module=module)],
+        capture_output=True, text=True, check=True, env=env,
+    ).stdout.split()
+    return float(output[-2]), output[-1] == "1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--modules", nargs="*", default=[], help="Extra modules to time on their own")
+    args = parser.parse_args()
+
+    print(f"{'module':<32}{'median (s)':>12}{'min (s)':>10}  autogen imported")
+    for module in ["main", *args.modules]:
+        results = [time_import(module) for _ in range(args.runs)]
+        times = [seconds for seconds, _ in results]
+        print(f"{module:<32}{statistics.median(times):>12.3f}{min(times):>10.3f}  {results[0][1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Lets the tests import the backend modules (main, agents, ...) the way the app does
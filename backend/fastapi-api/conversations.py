@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from agents.envelopes import error_envelope
+from run_log import Run, RunRegistry, run_registry
+from websocket_sender import WebSocketSender
+
+logger = logging.getLogger(__name__)
+
+# Analyses a single WebSocket connection may run at the same time
+WS_MAX_CONVERSATIONS = int(os.getenv("OPTIMONKEY_WS_MAX_CONVERSATIONS", "4"))
+
+# Totals over all connections, exposed in /diagnostics
+conversation_counters = {"started": 0, "completed": 0, "cancelled": 0, "detached_on_disconnect": 0, "resumed": 0, "rejected": 0}
+
+
+def parse_client_message(data: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Split an incoming WebSocket frame into (action, fields).
+
+    Frames are JSON objects:
+        - `{"message": ..., "conversation_id": ...}` starts an analysis; optional `subscriptions`
+          (list of IDs) or `management_group` scope it to several subscriptions, analyzed in parallel
+        - `{"type": "cancel", "conversation_id": ...}` stops one
+        - `{"type": "resume", "run_id": ..., "after": <last seq seen>, "conversation_id": ...}`
+          replays a run from the given offset and follows it if it is still running. Recommendation
+          envelopes carry only their batch of new rows (`offset`, `total`), so replaying from 0
+          rebuilds the full list
+
+    A frame that is not JSON is taken as the prompt itself, as older clients send it.
+    """
+    try:
+        parsed = json.loads(data)
+    except json.JSONDecodeError:
+        return "start", {"message": data}
+    if not isinstance(parsed, dict):
+        return "start", {"message": data}
+    if parsed.get("conversation_id") is not None:
+        parsed["conversation_id"] = str(parsed["conversation_id"])
+    action = parsed.get("type")
+    if action in ("cancel", "resume"):
+        return action, parsed
+    parsed.setdefault("message", data)
+    if isinstance(parsed.get("subscriptions"), str):
+        parsed["subscriptions"] = [parsed["subscriptions"]]
+    return "start", parsed
+
+
+class ConnectionConversations:
+    """
+    The analyses followed by one WebSocket connection.
+
+    Each analysis is a `Run` executing in its own task, so the receive loop keeps reading
+    while it runs: a connection can start several analyses, cancel any of them, or resume
+    a run it lost when the previous socket dropped. Cancelling unwinds
+    `start_agent_conversation_stream`: pending LLM and Azure awaits are cancelled, a running
+    prefetch is told to stop and the agent team is released, which stops its AutoGen chat at
+    the next agent message. On disconnect the runs are only detached; they are cancelled if
+    no client resumes them within the run log's grace period.
+    """
+
+    def __init__(
+        self,
+        sender: WebSocketSender,
+        run: Callable[[Run, str, Optional[List[str]], Optional[str]], Awaitable[None]],
+        max_conversations: int = WS_MAX_CONVERSATIONS,
+        registry: RunRegistry = run_registry,
+    ):
+        self.sender = sender
+        self._run = run
+        self.max_conversations = max_conversations
+        self.registry = registry
+        # Conversation id (as the client knows it) -> run followed on this connection
+        self._runs: Dict[str, Run] = {}
+
+    def handle(self, data: str):
+        action, fields = parse_client_message(data)
+        if action == "cancel":
+            self.cancel(fields.get("conversation_id") or fields.get("run_id"))
+        elif action == "resume":
+            self.resume(str(fields.get("run_id") or ""), int(fields.get("after") or 0), fields.get("conversation_id"))
+        else:
+            self.start(
+                fields["message"], fields.get("conversation_id"), fields.get("subscriptions"), fields.get("management_group")
+            )
+
+    def _can_follow(self, conversation_id: Optional[str]) -> bool:
+        if conversation_id is not None and conversation_id in self._runs:
+            self._refuse(conversation_id, f"Conversation {conversation_id} is already running")
+            return False
+        if len(self._runs) >= self.max_conversations:
+            self._refuse(conversation_id or "", f"Too many analyses on this connection (limit {self.max_conversations})")
+            return False
+        return True
+
+    def _follow(self, conversation_id: str, run: Run):
+        self._runs[conversation_id] = run
+        run.task.add_done_callback(lambda _: self._on_done(conversation_id, run))
+
+    def start(
+        self,
+        prompt: str,
+        conversation_id: Optional[str] = None,
+        subscriptions: Optional[List[str]] = None,
+        management_group: Optional[str] = None,
+    ) -> Optional[Run]:
+        """Start an analysis of `prompt` in the background; returns its run, or None if it was refused."""
+        if not self._can_follow(conversation_id):
+            return None
+        run = self.registry.start(lambda run: self._run(run, prompt, subscriptions, management_group))
+        conversation_id = conversation_id or run.run_id
+        run.attach(self.sender, conversation_id)
+        self._follow(conversation_id, run)
+        conversation_counters["started"] += 1
+        logger.info(f"Started run {run.run_id} as conversation {conversation_id} ({len(self._runs)} on this connection)")
+        return run
+
+    def resume(self, run_id: str, after: int, conversation_id: Optional[str] = None) -> Optional[Run]:
+        """Replay a run after sequence `after` and keep following it if it is still live."""
+        conversation_id = conversation_id or run_id
+        if not self._can_follow(conversation_id):
+            return None
+        try:
+            run = self.registry.resume(run_id, after, self.sender, conversation_id)
+        except KeyError:
+            self._refuse(conversation_id, f"Unknown run {run_id}")
+            return None
+        conversation_counters["resumed"] += 1
+        if run is not None:
+            self._follow(conversation_id, run)
+        return run
+
+    def _refuse(self, conversation_id: str, reason: str):
+        conversation_counters["rejected"] += 1
+        envelope = error_envelope(reason)
+        envelope["conversation_id"] = conversation_id
+        self.sender.send(envelope)
+
+    def _on_done(self, conversation_id: str, run: Run):
+        if self._runs.get(conversation_id) is run:
+            del self._runs[conversation_id]
+            conversation_counters["completed" if run.status != "cancelled" else "cancelled"] += 1
+
+    def cancel(self, conversation_id: Optional[str]) -> bool:
+        """Cancel one analysis (the only one running if no id is given); the run reports the cancellation."""
+        if conversation_id is None and len(self._runs) == 1:
+            conversation_id = next(iter(self._runs))
+        run = self._runs.get(conversation_id) if conversation_id is not None else None
+        if run is None:
+            self._refuse(conversation_id or "", f"No running conversation {conversation_id}")
+            return False
+        run.cancel()
+        logger.info(f"Cancelled run {run.run_id} at the client's request")
+        return True
+
+    def detach_all(self):
+        """Stop following every run (the client disconnected); they stay resumable for the grace period."""
+        runs = list(self._runs.values())
+        self._runs.clear()
+        for run in runs:
+            run.detach(self.sender)
+        conversation_counters["detached_on_disconnect"] += len(runs)
+        if runs:
+            logger.info(f"Detached {len(runs)} run(s) of a disconnected client")
+
+
+def conversation_stats() -> Dict[str, int]:
+    return dict(conversation_counters)
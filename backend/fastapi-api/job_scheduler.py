@@ -0,0 +1,305 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+import uuid
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from agents.agent_team import DEFAULT_POOL_SIZE
+from run_log import Run, RunRegistry, run_registry
+
+logger = logging.getLogger(__name__)
+
+# Analyses the scheduler runs at once; defaults to the agent pool size so workers never wait for a team
+JOB_WORKERS = int(os.getenv("OPTIMONKEY_JOB_WORKERS", str(DEFAULT_POOL_SIZE)))
+# Queued jobs accepted before submissions are refused
+JOB_QUEUE_SIZE = int(os.getenv("OPTIMONKEY_JOB_QUEUE_SIZE", "1000"))
+# Running jobs allowed per Azure subscription (or management group) and per tenant (0 = unlimited)
+JOB_MAX_PER_SUBSCRIPTION = int(os.getenv("OPTIMONKEY_JOB_MAX_PER_SUBSCRIPTION", "1"))
+JOB_MAX_PER_TENANT = int(os.getenv("OPTIMONKEY_JOB_MAX_PER_TENANT", "2"))
+# Finished jobs kept for the status and result endpoints
+JOB_HISTORY = int(os.getenv("OPTIMONKEY_JOB_HISTORY", "1000"))
+
+
+class QueueFull(Exception):
+    """Raised by `submit` when JOB_QUEUE_SIZE jobs are already waiting."""
+
+
+@dataclass(eq=False)
+class Job:
+    """One queued analysis; `run_id` links it to its run log once it starts."""
+    job_id: str
+    prompt: str
+    priority: int = 0
+    subscriptions: List[str] = field(default_factory=list)
+    tenant: Optional[str] = None
+    management_group: Optional[str] = None
+    status: str = "queued"
+    run_id: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    run: Optional[Run] = field(default=None, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "priority": self.priority,
+            "subscriptions": self.subscriptions,
+            "tenant": self.tenant,
+            "management_group": self.management_group,
+            "run_id": self.run_id,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def summarize_run(run: Run) -> Dict[str, Any]:
+    """Result of a finished run, read back from its log: all recommendations, the CSV export and any errors."""
+    result: Dict[str, Any] = {
+        "status": run.status, "run_id": run.run_id, "recommendations": [], "csv": None, "artifacts": [], "errors": []
+    }
+    for envelope in run.log.read():
+        kind = envelope.get("type")
+        if kind == "final_recommendations":
+            # Each envelope holds one batch of new rows
+            result["recommendations"].extend(envelope.get("recommendations", []))
+        elif kind == "csv":
+            result["csv"] = envelope.get("content")
+            result["artifacts"] = envelope.get("artifacts", [])
+        elif kind == "error":
+            result["errors"].append(envelope.get("content"))
+    return result
+
+
+class JobScheduler:
+    """
+    Priority queue of analyses drained by a bounded pool of worker tasks.
+
+    Higher `priority` runs first, ties in submission order. A job only starts while its
+    subscriptions, management group and tenant are under their concurrency caps (a
+    management group counts as one scope for the subscription cap); capped jobs stay queued
+    without holding back the jobs behind them. Workers sleep on a condition and are woken
+    by submissions and completions, so the queue drains as fast as the caps allow.
+    """
+
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        max_queued: int = JOB_QUEUE_SIZE,
+        max_per_subscription: int = JOB_MAX_PER_SUBSCRIPTION,
+        max_per_tenant: int = JOB_MAX_PER_TENANT,
+        registry: RunRegistry = run_registry,
+    ):
+        self.workers = max(workers, 1)
+        self.max_queued = max_queued
+        self.max_per_subscription = max_per_subscription
+        self.max_per_tenant = max_per_tenant
+        self.registry = registry
+        self._execute: Optional[Callable[[Run, str, List[str], Optional[str]], Awaitable[None]]] = None
+        self._heap: List = []
+        self._order = itertools.count()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._running_scopes: Counter = Counter()
+        self._running_tenants: Counter = Counter()
+        self._running = 0
+        self._queued = 0
+        self._started = 0
+        # Created here so jobs can be submitted before the workers start; they wait in the queue
+        self._condition = asyncio.Condition()
+        self._tasks: List[asyncio.Task] = []
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "refused": 0, "max_depth": 0}
+        self._wait_total = 0.0
+        self._run_total = 0.0
+
+    def start(self, execute: Callable[[Run, str, List[str], Optional[str]], Awaitable[None]]):
+        """
+        Start the workers; `execute(run, prompt, subscriptions, management_group)` performs one
+        analysis and publishes to the run.
+        """
+        if self._tasks:
+            return
+        self._execute = execute
+        self._tasks = [asyncio.create_task(self._worker(index)) for index in range(self.workers)]
+        logger.info(f"Job scheduler started with {self.workers} worker(s)")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    async def submit(
+        self,
+        prompt: str,
+        priority: int = 0,
+        subscriptions: Optional[List[str]] = None,
+        tenant: Optional[str] = None,
+        management_group: Optional[str] = None,
+    ) -> Job:
+        """
+        Queue an analysis.
+
+        Raises:
+            QueueFull: If the queue already holds JOB_QUEUE_SIZE jobs.
+        """
+        if self.queued >= self.max_queued:
+            self._counters["refused"] += 1
+            raise QueueFull(f"Job queue is full ({self.max_queued} jobs waiting)")
+        # Subscription and tenant ids are case-insensitive; normalized so differently cased ids share one cap
+        subscriptions = sorted({subscription.lower() for subscription in subscriptions or []})
+        tenant = tenant.lower() if tenant else None
+        job = Job(uuid.uuid4().hex, prompt, priority, subscriptions, tenant, management_group)
+        self._jobs[job.job_id] = job
+        heapq.heappush(self._heap, (-priority, next(self._order), job))
+        self._queued += 1
+        self._counters["submitted"] += 1
+        self._counters["max_depth"] = max(self._counters["max_depth"], self.queued)
+        async with self._condition:
+            self._condition.notify()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[Job]:
+        jobs = [job for job in reversed(self._jobs.values()) if status is None or job.status == status]
+        return jobs[:limit]
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job, or stop a running one; returns False if it already finished."""
+        job = self._jobs.get(job_id)
+        if job is None or job.status not in ("queued", "running"):
+            return False
+        if job.status == "running":
+            if job.run is not None:
+                job.run.cancel()
+            return True
+        # Queued jobs are skipped (and dropped) when they reach the top of the heap
+        job.status = "cancelled"
+        job.finished_at = time.time()
+        self._queued -= 1
+        self._counters["cancelled"] += 1
+        return True
+
+    @staticmethod
+    def _scopes(job: Job) -> List[str]:
+        """Keys the subscription cap applies to: the job's subscriptions and its management group."""
+        scopes = list(job.subscriptions)
+        if job.management_group:
+            scopes.append(f"managementGroup:{job.management_group.lower()}")
+        return scopes
+
+    def _allowed(self, job: Job) -> bool:
+        if self.max_per_subscription > 0 and any(
+            self._running_scopes[scope] >= self.max_per_subscription for scope in self._scopes(job)
+        ):
+            return False
+        if self.max_per_tenant > 0 and job.tenant is not None and self._running_tenants[job.tenant] >= self.max_per_tenant:
+            return False
+        return True
+
+    def _next_job(self) -> Optional[Job]:
+        """Pop the highest-priority job that is under its caps; capped jobs go back on the heap."""
+        skipped = []
+        job = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            candidate = entry[2]
+            if candidate.status != "queued":
+                continue
+            if self._allowed(candidate):
+                job = candidate
+                break
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        return job
+
+    async def _worker(self, index: int):
+        while True:
+            async with self._condition:
+                job = self._next_job()
+                while job is None:
+                    await self._condition.wait()
+                    job = self._next_job()
+                self._claim(job)
+            try:
+                await self._run(job)
+            finally:
+                self._release(job)
+                async with self._condition:
+                    # Finishing a job may lift a cap that held back queued jobs
+                    self._condition.notify_all()
+
+    def _claim(self, job: Job):
+        job.status = "running"
+        job.started_at = time.time()
+        self._wait_total += job.started_at - job.submitted_at
+        self._queued -= 1
+        self._started += 1
+        self._running += 1
+        self._running_scopes.update(self._scopes(job))
+        if job.tenant is not None:
+            self._running_tenants[job.tenant] += 1
+
+    def _release(self, job: Job):
+        self._running -= 1
+        for key, running in [(scope, self._running_scopes) for scope in self._scopes(job)] + (
+            [(job.tenant, self._running_tenants)] if job.tenant is not None else []
+        ):
+            running[key] -= 1
+            if running[key] <= 0:
+                del running[key]
+        self._trim_history()
+
+    async def _run(self, job: Job):
+        execute = self._execute
+        run = self.registry.start(
+            lambda run: execute(run, job.prompt, job.subscriptions, job.management_group), expires_unattended=False
+        )
+        job.run, job.run_id = run, run.run_id
+        try:
+            await asyncio.gather(run.task, return_exceptions=True)
+        finally:
+            job.finished_at = time.time()
+            self._run_total += job.finished_at - job.started_at
+            job.status = run.status if run.status != "running" else "failed"
+            job.result = summarize_run(run)
+            self._counters[{"completed": "completed", "cancelled": "cancelled"}.get(job.status, "failed")] += 1
+            logger.info(f"Job {job.job_id} {job.status} in {job.finished_at - job.started_at:.1f}s (run {run.run_id})")
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status not in ("queued", "running")]
+        for job_id in finished[:max(len(finished) - JOB_HISTORY, 0)]:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        queued = [entry[2] for entry in self._heap if entry[2].status == "queued"]
+        now = time.time()
+        finished = self._started - self._running
+        return {
+            "workers": self.workers,
+            "queued": len(queued),
+            "blocked_by_caps": sum(1 for job in queued if not self._allowed(job)),
+            "running": self._running,
+            "oldest_queued_seconds": round(now - min(job.submitted_at for job in queued), 1) if queued else 0.0,
+            "avg_wait_seconds": round(self._wait_total / self._started, 2) if self._started else 0.0,
+            "avg_run_seconds": round(self._run_total / finished, 2) if finished else 0.0,
+            "running_by_tenant": dict(self._running_tenants),
+            **self._counters,
+        }
+
+
+job_scheduler = JobScheduler()
@@ -1,11 +1,26 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from routers import agents
-from agents.optimonkeyagents import start_agent_conversation_stream
+from routers import agents, artifacts, jobs
+from agents.optimonkeyagents import start_agent_conversation_stream, agent_team_pool
+from agents.azure_tools.clients import get_client_registry
+from agents.azure_tools.inventory import inventory_store
+from agents.azure_tools.metrics import metrics_cache
+from agents.azure_tools.metrics_store import metrics_store
+from agents.azure_tools.prefetch import prefetch_stats
+from agents.caching.completion_cache import completion_cache
+from agents.llm_clients import close_llm_clients
+from agents.prompt_validator.optimonkeyvalidator import validation_stats
+from agents.sharding import shard_pool
+from agents.envelopes import MessageKind, error_envelope, text_envelope, to_envelope
+from agents.warmup import start_warm_up, warmup_stats
+from websocket_sender import WebSocketSender, sender_stats
+from conversations import ConnectionConversations, conversation_stats
+from run_log import Run, run_registry
+from job_scheduler import job_scheduler
+from artifact_store import RunExport
+from typing import List, Optional
 import asyncio
-import datetime
-import json
 import logging
 
 # Set up logging
@@ -22,6 +37,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup():
+    """Warm clients and agent teams in the background and start the job workers; the app accepts requests immediately."""
+    start_warm_up()
+    job_scheduler.start(process_conversation)
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop the job workers and shard processes and close the shared LLM connection pool."""
+    await job_scheduler.stop()
+    shard_pool.shutdown()
+    await close_llm_clients()
+
 class ConnectionManager:
     def __init__(self):
         self.active_connections: list[WebSocket] = []
@@ -44,9 +72,34 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+app.include_router(jobs.router)
+app.include_router(artifacts.router)
+
+@app.get("/diagnostics")
+async def diagnostics():
+    """Expose pool and reuse counters for the backend's shared resources."""
+    return JSONResponse({
+        "agent_pool": agent_team_pool.stats(),
+        "azure_clients": get_client_registry().stats(),
+        "metrics_cache": metrics_cache.stats(),
+        "metrics_store": metrics_store.stats(),
+        "inventory": inventory_store.stats(),
+        "prefetch": prefetch_stats(),
+        "completion_cache": completion_cache.stats(),
+        "validation": validation_stats(),
+        "warmup": warmup_stats(),
+        "websocket": sender_stats(),
+        "conversations": conversation_stats(),
+        "runs": run_registry.stats(),
+        "jobs": job_scheduler.stats(),
+        "sharding": shard_pool.stats(),
+    })
+
 @app.websocket("/ws/conversation")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
+    sender = WebSocketSender(websocket)
+    conversations = ConnectionConversations(sender, process_conversation)
     try:
         # Listen for messages from the client
         while True:
@@ -54,13 +107,8 @@ async def websocket_endpoint(websocket: WebSocket):
                 data = await websocket.receive_text()
                 logger.info(f"Received message from client: {data}")
 
-                # Trigger the agent conversation based on client input
-                conversation_task = asyncio.create_task(
-                    process_conversation(websocket, data)
-                )
-                
-                # Wait for the conversation to complete
-                await conversation_task
+                # Start (or cancel) an analysis in the background and keep listening
+                conversations.handle(data)
                 
             except WebSocketDisconnect:
                 logger.warning("Client disconnected during message processing")
@@ -68,14 +116,7 @@ async def websocket_endpoint(websocket: WebSocket):
             except Exception as e:
                 logger.error(f"Error processing message: {str(e)}")
                 try:
-                    error_message = {
-                        "content": f"Error processing request: {str(e)}",
-                        "role": "system",
-                        "name": "System",
-                        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "type": "error"
-                    }
-                    await websocket.send_text(json.dumps(error_message))
+                    sender.send(error_envelope(f"Error processing request: {str(e)}"))
                 except Exception as send_error:
                     logger.error(f"Failed to send error message: {str(send_error)}")
                     break  # Exit the loop if we can't even send error messages
@@ -85,100 +126,52 @@ async def websocket_endpoint(websocket: WebSocket):
     except Exception as e:
         logger.error(f"Unexpected error in WebSocket connection: {str(e)}")
     finally:
-        # Ensure connection is properly removed in all cases
+        # Ensure connection is properly removed in all cases; runs stay resumable for a grace period
+        conversations.detach_all()
+        await sender.close()
         manager.disconnect(websocket)
 
-async def process_conversation(websocket: WebSocket, data: str):
+async def process_conversation(
+    run: Run, message_content: str, subscriptions: Optional[List[str]] = None, management_group: Optional[str] = None
+):
+    export = None
     try:
-        # Parse the input data to extract the message
-        try:
-            parsed_data = json.loads(data)
-            message_content = parsed_data.get("message", data)
-        except json.JSONDecodeError:
-            message_content = data  # Use raw data if not JSON
-        
         logger.info(f"Processing message: {message_content}")
         message_count = 0
+        export = RunExport(run.run_id)
         
         # Process the stream of messages from the agents
-        async for message in start_agent_conversation_stream(message_content):
+        async for message in start_agent_conversation_stream(message_content, subscriptions, management_group):
             message_count += 1
             
-            # Handle different types of messages from agents
-            if "error" in message:
-                # Error messages
-                response_message = {
-                    "content": message["error"],
-                    "role": "system",
-                    "name": "Error",
-                    "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "type": "error"
-                }
-            elif "confidence_score" in message:
-                # Confidence score messages
-                response_message = {
-                    "confidence_score": message["confidence_score"],
-                    "explanation": message.get("explanation", "No explanation provided"),
-                    "board_decision": message.get("board_decision", "No decision provided"),
-                    "role": "system",
-                    "name": "FinOps Board",
-                    "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "type": "confidence_score"
-                }
-            elif "recommendations" in message:
-                # Recommendation messages
-                response_message = {
-                    "recommendations": message["recommendations"],
-                    "role": "agent",
-                    "name": "Recommendations",
-                    "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "type": "final_recommendations"
-                }
-            elif "csv" in message:
-                # CSV content
-                response_message = {
-                    "content": message.get("csv", ""),
-                    "role": "agent",
-                    "name": "CSV Export",
-                    "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "type": "csv"
-                }
-            else:
-                # Standard agent messages
-                response_message = {
-                    "content": message.get("content", ""),
-                    "role": message.get("role", "agent"),
-                    "name": message.get("name", "Agent"),
-                    "timestamp": message.get("timestamp", datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
-                    "type": message.get("type", "text")
-                }
+            # Wrap the message in the envelope for its kind (confidence score, recommendations, CSV, error or text)
+            response_message = to_envelope(message)
+            if response_message["type"] == MessageKind.FINAL_RECOMMENDATIONS.value:
+                # Envelopes carry only the new rows; offset/total let clients (and replays) append them in order
+                response_message["offset"] = export.rows
+                export.add(response_message["recommendations"])
+                response_message["total"] = export.rows
+            elif response_message["type"] == MessageKind.CSV.value and "rows" in response_message:
+                # Write the CSV/JSONL/Parquet artifacts; `content` is always CSV text, left empty when
+                # the export is too large to travel inline, and the full CSV is always downloadable
+                response_message["artifacts"] = await asyncio.to_thread(export.finish)
+                response_message["content"] = await asyncio.to_thread(export.inline_csv) or ""
+                response_message["download_url"] = f"/download-recommendations?run_id={run.run_id}"
             
-            # Send each message to the client as soon as it's available
-            await websocket.send_text(json.dumps(response_message))
-            # Small delay to prevent overwhelming the client
-            await asyncio.sleep(0.05)
+            # Log the message for resuming clients and queue it for every attached connection's writer
+            run.publish(response_message)
         
         # If no messages were sent, send a fallback message
         if message_count == 0:
-            no_response_message = {
-                "content": "I'm sorry, I don't have a response for that query.",
-                "role": "agent",
-                "name": "Agent",
-                "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "type": "text"
-            }
-            await websocket.send_text(json.dumps(no_response_message))
+            run.publish(text_envelope("I'm sorry, I don't have a response for that query."))
             
     except Exception as e:
         logger.error(f"Error in conversation stream: {str(e)}")
-        error_message = {
-            "content": f"Error during conversation: {str(e)}",
-            "role": "system",
-            "name": "System",
-            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "type": "error"
-        }
-        await websocket.send_text(json.dumps(error_message))
+        run.publish(error_envelope(f"Error during conversation: {str(e)}"))
+    finally:
+        # A cancelled or failed run never reaches its csv envelope; close and drop the partial export
+        if export is not None:
+            export.abort()
 
 if __name__ == "__main__":
     import uvicorn
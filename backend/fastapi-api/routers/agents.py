@@ -1,9 +1,8 @@
 import json
 import queue
-import os
 import asyncio
 from datetime import datetime
-from fastapi import APIRouter, Response, WebSocket, WebSocketDisconnect, BackgroundTasks, Request
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Request
 from fastapi.responses import JSONResponse
 from agents.optimonkeyagents import start_agent_conversation_stream, initiate_final_recommendation
 
@@ -160,31 +159,9 @@ async def websocket_endpoint(websocket: WebSocket):
 
 # Other endpoint definitions remain unchanged
 
-async def run_chat():
-    # Define the logic for the run_chat function here
-    pass
+# /start-agents queues a job on the scheduler, see routers/jobs.py
 
-@router.post("/start-agents")
-async def start_agents(background_tasks: BackgroundTasks):
-    global chat_status
-    try:
-        chat_status = 'ended' if chat_status == 'error' else chat_status
-        if chat_status != "chat_ongoing":
-            background_tasks.add_task(run_chat)
-            chat_status = "chat_ongoing"
-        return JSONResponse({"status": chat_status})
-    except Exception as e:
-        chat_status = "error"
-        return JSONResponse({"status": "error", "error": str(e)})
-
-@router.get("/download-recommendations")
-async def download_recommendations():
-    csv_file_path = "azure_analysis_results.csv"
-    if os.path.exists(csv_file_path):
-        print(f"Downloading CSV file: {csv_file_path}")  # Log file download
-        return Response(open(csv_file_path, "rb").read(), media_type="text/csv")
-    print("CSV file not found.")  # Log missing file
-    return {"error": "CSV file not found"}
+# /download-recommendations streams a run's CSV from its artifact store, see routers/artifacts.py
 
 @router.post("/api/send_message")
 async def send_message(request: Request):
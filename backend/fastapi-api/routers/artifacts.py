@@ -0,0 +1,93 @@
+# routers/artifacts.py
+import os
+import re
+from typing import AsyncIterator, Optional, Tuple
+
+import anyio
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+from artifact_store import ARTIFACT_CHUNK_SIZE, artifact_store, media_type
+
+router = APIRouter()
+
+# Name under which each run's recommendations export is stored
+RECOMMENDATIONS_CSV = "recommendations.csv"
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _etag(path: str, encoding: Optional[str]) -> str:
+    stat = os.stat(path)
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}{"-" + encoding if encoding else ""}"'
+
+
+def _byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) of a single `bytes=` range; None for multi-range or malformed headers (full response)."""
+    match = _RANGE.match(header.strip())
+    if match is None or not (match.group(1) or match.group(2)):
+        return None
+    if match.group(1):
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    else:
+        start, end = max(size - int(match.group(2)), 0), size - 1
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+async def _read(path: str, start: int, length: int) -> AsyncIterator[bytes]:
+    async with await anyio.open_file(path, "rb") as handle:
+        await handle.seek(start)
+        while length > 0:
+            chunk = await handle.read(min(ARTIFACT_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def artifact_response(request: Request, run_id: str, name: str) -> Response:
+    """Stream an artifact from disk, precompressed when the client accepts it, with ETag and single-range support."""
+    selected = artifact_store.select(run_id, name, request.headers.get("accept-encoding", ""))
+    if selected is None:
+        raise HTTPException(status_code=404, detail=f"No artifact {name} for run {run_id}")
+    path, encoding = selected
+    size = os.path.getsize(path)
+    etag = _etag(path, encoding)
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    start, end, status = 0, size - 1, 200
+    range_header = request.headers.get("range")
+    if range_header and request.headers.get("if-range", etag) == etag and size > 0:
+        byte_range = _byte_range(range_header, size)
+        if byte_range is not None:
+            (start, end), status = byte_range, 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1 if size else 0)
+    headers["Content-Disposition"] = f'attachment; filename="{name}"'
+    return StreamingResponse(_read(path, start, end - start + 1), status_code=status, media_type=media_type(name), headers=headers)
+
+
+@router.get("/runs/{run_id}/artifacts")
+async def list_artifacts(run_id: str):
+    artifacts = artifact_store.list(run_id)
+    if artifacts is None:
+        raise HTTPException(status_code=404, detail=f"Unknown run {run_id}")
+    return {"run_id": run_id, "artifacts": artifacts}
+
+
+@router.get("/runs/{run_id}/artifacts/{name}")
+async def download_artifact(request: Request, run_id: str, name: str):
+    return artifact_response(request, run_id, name)
+
+
+@router.get("/download-recommendations")
+async def download_recommendations(request: Request, run_id: str):
+    """The recommendations CSV of one run (the run_id is in every envelope the run sent)."""
+    return artifact_response(request, run_id, RECOMMENDATIONS_CSV)
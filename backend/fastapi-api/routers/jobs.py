@@ -0,0 +1,68 @@
+# routers/jobs.py
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from agents.prompt_validator.optimonkeyvalidator import search_subscription_id
+from job_scheduler import QueueFull, job_scheduler
+
+router = APIRouter()
+
+
+class JobRequest(BaseModel):
+    prompt: Optional[str] = None
+    # Same field name as the WebSocket frames
+    message: Optional[str] = None
+    priority: int = 0
+    # Defaults to the subscription IDs found in the prompt
+    subscriptions: Optional[List[str]] = None
+    tenant: Optional[str] = None
+    # Analyze every subscription below this management group, sharded across worker processes
+    management_group: Optional[str] = None
+
+
+@router.post("/start-agents", status_code=202)
+async def start_agents(request: JobRequest):
+    """Queue an analysis; poll /jobs/{job_id}, or follow its run over the WebSocket with a resume frame."""
+    prompt = request.prompt or request.message
+    if not prompt:
+        raise HTTPException(status_code=422, detail="A prompt (or message) is required")
+    subscriptions = request.subscriptions if request.subscriptions is not None else search_subscription_id(prompt)
+    try:
+        job = await job_scheduler.submit(
+            prompt, request.priority, subscriptions, request.tenant, request.management_group
+        )
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {**job.to_dict(), "queue_depth": job_scheduler.queued}
+
+
+@router.get("/jobs")
+async def list_jobs(status: Optional[str] = None, limit: int = 100):
+    return {"jobs": [job.to_dict() for job in job_scheduler.list(status, limit)], "stats": job_scheduler.stats()}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.to_dict()
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = job_scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    if job.result is None:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job.status}")
+    return {**job.to_dict(), **job.result}
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    if not job_scheduler.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is unknown or already finished")
+    return job_scheduler.get(job_id).to_dict()
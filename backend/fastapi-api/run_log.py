@@ -0,0 +1,247 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from fastapi import WebSocketDisconnect
+
+from agents.envelopes import Envelope, cancelled_envelope, done_envelope, encode
+from websocket_sender import WebSocketSender
+
+logger = logging.getLogger(__name__)
+
+# One directory per run holding its append-only envelope log (and, later, its artifacts)
+RUN_LOG_DIR = os.getenv("OPTIMONKEY_RUN_LOG_DIR", os.path.join("data", "runs"))
+# Runs older than this (hours) are deleted from disk
+RUN_LOG_RETENTION_HOURS = float(os.getenv("OPTIMONKEY_RUN_LOG_RETENTION_HOURS", "24"))
+# Seconds a run keeps going with no client attached, waiting for one to resume it, before it is cancelled
+RUN_RESUME_GRACE = float(os.getenv("OPTIMONKEY_RUN_RESUME_GRACE", "120"))
+
+RUN_EVENTS_FILE = "events.jsonl"
+_RUN_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# Totals since startup, exposed in /diagnostics
+run_counters = {"started": 0, "resumed": 0, "replayed_envelopes": 0, "expired": 0, "pruned": 0}
+
+
+def run_directory(run_id: str, directory: str = RUN_LOG_DIR) -> Optional[str]:
+    """Directory of `run_id`, or None if the id is not a well-formed run id."""
+    if not _RUN_ID.match(run_id or ""):
+        return None
+    return os.path.join(directory, run_id)
+
+
+class RunLog:
+    """
+    Append-only log of the envelopes one run sent, with sequence numbers starting at 1.
+
+    Envelopes are kept in memory while the run is live and written to `events.jsonl`
+    (line N holds sequence N), so finished runs can still be replayed after a restart.
+    """
+
+    def __init__(self, run_id: str, directory: str = RUN_LOG_DIR):
+        self.run_id = run_id
+        self.path = os.path.join(directory, run_id, RUN_EVENTS_FILE)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._envelopes: List[Envelope] = []
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    @property
+    def last_seq(self) -> int:
+        return len(self._envelopes)
+
+    def append(self, envelope: Envelope) -> int:
+        """Stamp the envelope with the run id and its sequence number, and persist it."""
+        seq = len(self._envelopes) + 1
+        envelope["run_id"] = self.run_id
+        envelope["seq"] = seq
+        self._envelopes.append(envelope)
+        if not self._file.closed:
+            self._file.write(encode(envelope) + "\n")
+            self._file.flush()
+        return seq
+
+    def read(self, after: int = 0) -> List[Envelope]:
+        """Envelopes with a sequence number greater than `after`."""
+        return self._envelopes[max(after, 0):]
+
+    def close(self):
+        self._file.close()
+
+    @staticmethod
+    def read_file(run_id: str, after: int = 0, directory: str = RUN_LOG_DIR) -> Optional[List[Envelope]]:
+        """Envelopes of a run that is no longer in memory, or None if there is no log for it."""
+        run_dir = run_directory(run_id, directory)
+        if run_dir is None or not os.path.exists(os.path.join(run_dir, RUN_EVENTS_FILE)):
+            return None
+        envelopes = []
+        with open(os.path.join(run_dir, RUN_EVENTS_FILE), encoding="utf-8") as handle:
+            for seq, line in enumerate(handle, start=1):
+                if seq <= after or not line.strip():
+                    continue
+                if not line.endswith("\n"):
+                    # Torn write of the process that was stopped mid-append; the envelope was never complete
+                    logger.warning(f"Ignoring the incomplete last envelope (seq {seq}) of run {run_id}")
+                    break
+                envelopes.append(json.loads(line))
+        return envelopes
+
+
+class Run:
+    """
+    One analysis, decoupled from the connection that started it.
+
+    Every envelope goes through `publish`, which appends it to the run log and forwards it
+    to the attached senders. When the last client detaches, the run keeps going for
+    RUN_RESUME_GRACE seconds so a reconnecting client can pick it up; after that it is cancelled.
+    """
+
+    def __init__(self, run_id: str, directory: str = RUN_LOG_DIR, expires_unattended: bool = True):
+        self.run_id = run_id
+        self.log = RunLog(run_id, directory)
+        # Interactive runs stop when nobody follows them; scheduled jobs run to completion regardless
+        self.expires_unattended = expires_unattended
+        self.status = "running"
+        self.started_at = time.time()
+        self.task: Optional[asyncio.Task] = None
+        # Attached senders and the conversation id each client knows this run by
+        self._subscribers: Dict[WebSocketSender, str] = {}
+        self._expiry: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def running(self) -> bool:
+        return self.status == "running"
+
+    def publish(self, envelope: Envelope) -> int:
+        seq = self.log.append(envelope)
+        for sender, conversation_id in list(self._subscribers.items()):
+            try:
+                sender.send({**envelope, "conversation_id": conversation_id})
+            except WebSocketDisconnect:
+                self.detach(sender)
+        return seq
+
+    def attach(self, sender: WebSocketSender, conversation_id: str, after: int = 0) -> int:
+        """Replay the envelopes after `after` to `sender` and, if the run is still live, keep forwarding new ones."""
+        replay = self.log.read(after)
+        for envelope in replay:
+            sender.send({**envelope, "conversation_id": conversation_id})
+        if self.running:
+            self._subscribers[sender] = conversation_id
+            if self._expiry is not None:
+                self._expiry.cancel()
+                self._expiry = None
+        return len(replay)
+
+    def detach(self, sender: WebSocketSender):
+        """Stop forwarding to `sender`; an unattended run is cancelled after the resume grace period."""
+        self._subscribers.pop(sender, None)
+        if not self._subscribers and self.running and self.expires_unattended and self._expiry is None:
+            self._expiry = asyncio.get_running_loop().call_later(RUN_RESUME_GRACE, self._expire)
+
+    def _expire(self):
+        self._expiry = None
+        if not self._subscribers and self.running:
+            run_counters["expired"] += 1
+            logger.info(f"Cancelling run {self.run_id}: no client resumed it within {RUN_RESUME_GRACE:.0f}s")
+            self.cancel()
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    def finish(self, status: str):
+        self.status = status
+        self.publish(cancelled_envelope() if status == "cancelled" else done_envelope(status))
+        self._subscribers.clear()
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
+        self.log.close()
+
+
+class RunRegistry:
+    """Live runs of this process by id; finished runs are replayed from their log files."""
+
+    def __init__(self, directory: str = RUN_LOG_DIR):
+        self.directory = directory
+        self._runs: Dict[str, Run] = {}
+        self._last_prune = 0.0
+
+    def start(self, execute: Callable[[Run], Awaitable[None]], expires_unattended: bool = True) -> Run:
+        """Create a run and execute `execute(run)` in its own task."""
+        self._prune()
+        run = Run(uuid.uuid4().hex, self.directory, expires_unattended)
+        self._runs[run.run_id] = run
+        run.task = asyncio.create_task(self._execute(run, execute))
+        run_counters["started"] += 1
+        return run
+
+    async def _execute(self, run: Run, execute: Callable[[Run], Awaitable[None]]):
+        status = "failed"
+        try:
+            await execute(run)
+            status = "completed"
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        finally:
+            run.finish(status)
+            # Late resumes are served from the log file once the grace period is over
+            asyncio.get_running_loop().call_later(RUN_RESUME_GRACE, self._runs.pop, run.run_id, None)
+
+    def get(self, run_id: str) -> Optional[Run]:
+        return self._runs.get(run_id)
+
+    def resume(self, run_id: str, after: int, sender: WebSocketSender, conversation_id: str) -> Optional[Run]:
+        """
+        Send the envelopes of `run_id` after sequence `after` to `sender`, then attach it if the run is live.
+
+        Returns:
+            Optional[Run]: The live run, or None if the run has finished (the replay is then complete).
+
+        Raises:
+            KeyError: If there is no such run.
+        """
+        run = self._runs.get(run_id)
+        if run is not None:
+            replayed = run.attach(sender, conversation_id, after)
+        else:
+            envelopes = RunLog.read_file(run_id, after, self.directory)
+            if envelopes is None:
+                raise KeyError(run_id)
+            for envelope in envelopes:
+                sender.send({**envelope, "conversation_id": conversation_id})
+            replayed = len(envelopes)
+        run_counters["resumed"] += 1
+        run_counters["replayed_envelopes"] += replayed
+        logger.info(f"Resumed run {run_id} after seq {after}: replayed {replayed} envelope(s)")
+        return run if run is not None and run.running else None
+
+    def _prune(self):
+        """Delete run directories older than the retention period (checked at most once an hour)."""
+        now = time.time()
+        if now - self._last_prune < 3600 or not os.path.isdir(self.directory):
+            return
+        self._last_prune = now
+        cutoff = now - RUN_LOG_RETENTION_HOURS * 3600
+        for run_id in os.listdir(self.directory):
+            path = os.path.join(self.directory, run_id)
+            if run_id in self._runs or not os.path.isdir(path):
+                continue
+            events = os.path.join(path, RUN_EVENTS_FILE)
+            if os.path.getmtime(events if os.path.exists(events) else path) >= cutoff:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            run_counters["pruned"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"live": sum(1 for run in self._runs.values() if run.running), "in_memory": len(self._runs), **run_counters}
+
+
+run_registry = RunRegistry()
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from pydantic import BaseModel
+
+from agents.caching import completion_cache as cache_module
+from agents.caching.completion_cache import AutoGenCompletionCache, cached_acompletion, cached_completion, completion_key
+from agents.caching.tiered_cache import TieredCache
+
+MESSAGES = [{"role": "system", "content": "You are a reviewer."}, {"role": "user", "content": "Find idle VMs"}]
+
+
+class Review(BaseModel):
+    score: int
+
+
+class OtherReview(BaseModel):
+    score: int
+
+
+class FakeCreate:
+    """`chat.completions.create` stand-in that counts calls and returns a new response each time."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, **request):
+        self.calls += 1
+        return {"id": self.calls, "model": request["model"]}
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = TieredCache("test-completions")
+    monkeypatch.setattr(cache_module, "completion_cache", cache)
+    return cache
+
+
+def test_identical_requests_share_a_key_regardless_of_transport_options():
+    assert completion_key("gpt-4o", MESSAGES, temperature=0) == completion_key(
+        "gpt-4o", MESSAGES, temperature=0, max_retries=3, timeout=30, user="someone"
+    )
+
+
+@pytest.mark.parametrize("change", [
+    {"model": "gpt-4o-mini"},
+    {"messages": MESSAGES[:1] + [{"role": "user", "content": "Find idle disks"}]},
+    {"messages": [{"role": "user", "content": "You are a reviewer."}, MESSAGES[1]]},
+    {"tools": [{"type": "function", "function": {"name": "lookup"}}]},
+    {"response_model": Review},
+    {"temperature": 0.7},
+    {"max_tokens": 100},
+])
+def test_any_change_to_what_the_model_answers_changes_the_key(change):
+    base = {"model": "gpt-4o", "messages": MESSAGES, "temperature": 0}
+    assert completion_key(**base) != completion_key(**{**base, **change})
+
+
+def test_response_models_with_the_same_fields_do_not_collide():
+    assert completion_key("gpt-4o", MESSAGES, response_model=Review) != completion_key(
+        "gpt-4o", MESSAGES, response_model=OtherReview
+    )
+
+
+def test_repeated_requests_are_served_from_the_cache(cache):
+    create = FakeCreate()
+    first = cached_completion(create, model="gpt-4o", messages=MESSAGES, timeout=10)
+    second = cached_completion(create, model="gpt-4o", messages=MESSAGES, timeout=60)
+    other = cached_completion(create, model="gpt-4o", messages=MESSAGES[:1])
+    assert first is second
+    assert other["id"] == 2
+    assert create.calls == 2
+    assert cache.stats()["memory_hits"] == 1
+
+
+def test_streaming_requests_bypass_the_cache(cache):
+    create = FakeCreate()
+    for _ in range(2):
+        cached_completion(create, model="gpt-4o", messages=MESSAGES, stream=True)
+    assert create.calls == 2
+    assert cache.stats()["sets"] == 0
+
+
+def test_async_requests_share_entries_with_sync_ones(cache):
+    create = FakeCreate()
+
+    async def acreate(**request):
+        return create(**request)
+
+    cached = cached_completion(create, model="gpt-4o", messages=MESSAGES)
+    assert asyncio.run(cached_acompletion(acreate, model="gpt-4o", messages=MESSAGES)) is cached
+    assert create.calls == 1
+
+
+def test_autogen_keys_are_namespaced(cache):
+    autogen = AutoGenCompletionCache(cache)
+    autogen.set("key", "autogen answer")
+    assert autogen.get("key") == "autogen answer"
+    assert cache.get("key") is None
+    assert AutoGenCompletionCache(cache).get("missing", "default") == "default"
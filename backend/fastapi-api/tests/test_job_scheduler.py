@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from job_scheduler import JobScheduler, QueueFull
+from run_log import RunRegistry
+
+
+class Recorder:
+    """`execute` callback that records start order and holds each job until it is released."""
+
+    def __init__(self):
+        self.started = []
+        self.running = set()
+        self.max_running = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self, run, prompt, subscriptions, management_group):
+        self.started.append(prompt)
+        self.running.add(prompt)
+        self.max_running = max(self.max_running, len(self.running))
+        try:
+            await self.release.wait()
+        finally:
+            self.running.discard(prompt)
+
+
+async def _settle():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def _scheduler(tmp_path, **options):
+    return JobScheduler(registry=RunRegistry(str(tmp_path)), **options)
+
+
+def test_higher_priority_runs_first_then_submission_order(tmp_path):
+    async def scenario():
+        scheduler = _scheduler(tmp_path, workers=1, max_per_subscription=0, max_per_tenant=0)
+        recorder = Recorder()
+        recorder.release.set()
+        for prompt, priority in [("low", 0), ("high", 5), ("low-2", 0), ("mid", 1)]:
+            await scheduler.submit(prompt, priority)
+        scheduler.start(recorder)
+        while scheduler.stats()["completed"] < 4:
+            await asyncio.sleep(0.01)
+        await scheduler.stop()
+        return recorder.started
+
+    assert asyncio.run(scenario()) == ["high", "mid", "low", "low-2"]
+
+
+def test_subscription_cap_ignores_letter_case(tmp_path):
+    async def scenario():
+        scheduler = _scheduler(tmp_path, workers=4, max_per_subscription=1, max_per_tenant=0)
+        recorder = Recorder()
+        scheduler.start(recorder)
+        first = await scheduler.submit("first", subscriptions=["ABC-1"])
+        second = await scheduler.submit("second", subscriptions=["abc-1"])
+        other = await scheduler.submit("other", subscriptions=["def-2"])
+        await _settle()
+        blocked = (first.status, second.status, other.status, scheduler.stats()["blocked_by_caps"])
+        recorder.release.set()
+        while scheduler.stats()["completed"] < 3:
+            await asyncio.sleep(0.01)
+        await scheduler.stop()
+        return blocked, second.subscriptions
+
+    blocked, subscriptions = asyncio.run(scenario())
+    assert blocked == ("running", "queued", "running", 1)
+    assert subscriptions == ["abc-1"]
+
+
+def test_tenant_and_management_group_caps(tmp_path):
+    async def scenario():
+        scheduler = _scheduler(tmp_path, workers=4, max_per_subscription=1, max_per_tenant=2)
+        recorder = Recorder()
+        scheduler.start(recorder)
+        tenant_jobs = [await scheduler.submit(f"tenant-{index}", tenant="T1") for index in range(3)]
+        group_jobs = [await scheduler.submit(f"group-{index}", management_group=name) for index, name in enumerate(["MG", "mg"])]
+        await _settle()
+        statuses = [job.status for job in tenant_jobs + group_jobs]
+        recorder.release.set()
+        await scheduler.stop()
+        return statuses
+
+    assert asyncio.run(scenario()) == ["running", "running", "queued", "running", "queued"]
+
+
+def test_full_queue_refuses_submissions(tmp_path):
+    async def scenario():
+        scheduler = _scheduler(tmp_path, workers=1, max_queued=2)
+        await scheduler.submit("one")
+        await scheduler.submit("two")
+        with pytest.raises(QueueFull):
+            await scheduler.submit("three")
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["queued"] == 2
+    assert stats["refused"] == 1
+
+
+def test_cancel_queued_and_running_jobs(tmp_path):
+    async def scenario():
+        scheduler = _scheduler(tmp_path, workers=1, max_per_subscription=0, max_per_tenant=0)
+        recorder = Recorder()
+        scheduler.start(recorder)
+        running = await scheduler.submit("running")
+        queued = await scheduler.submit("queued")
+        await _settle()
+        assert running.status == "running"
+        assert scheduler.cancel(queued.job_id)
+        assert scheduler.cancel(running.job_id)
+        while running.status == "running":
+            await asyncio.sleep(0.01)
+        await _settle()
+        result = (running.status, queued.status, recorder.started, scheduler.cancel(running.job_id), scheduler.queued)
+        await scheduler.stop()
+        return result
+
+    assert asyncio.run(scenario()) == ("cancelled", "cancelled", ["running"], False, 0)
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from agents.azure_tools.metric_stats import STAT_SUFFIXES, metric_values, series_stats, summarize_series
+
+START = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+def _point(hour, value, stamp_attribute="time_stamp", attribute="average"):
+    stamp = START + timedelta(hours=hour) if hour is not None else None
+    return SimpleNamespace(**{stamp_attribute: stamp, attribute: value})
+
+
+def _metric(*timeseries):
+    return SimpleNamespace(timeseries=[SimpleNamespace(data=list(points)) for points in timeseries])
+
+
+def _stats(rows, thresholds=None):
+    matrix = np.array(rows, dtype=float)
+    if thresholds is None:
+        thresholds = np.full(len(rows), np.nan)
+    return series_stats(matrix, np.asarray(thresholds, dtype=float))
+
+
+def test_single_timeseries_keeps_missing_points_as_nan():
+    values = metric_values(_metric([_point(0, 1.0), _point(1, None), _point(2, 3.0)]))
+    np.testing.assert_array_equal(values, [1.0, np.nan, 3.0])
+
+
+def test_split_timeseries_are_aligned_on_timestamps():
+    # The second series starts an hour late and has no value at hour 3
+    metric = _metric(
+        [_point(0, 2.0), _point(1, 4.0), _point(2, 6.0), _point(3, 8.0)],
+        [_point(1, 10.0, "timestamp"), _point(2, 2.0, "timestamp"), _point(3, None, "timestamp")],
+    )
+    np.testing.assert_array_equal(metric_values(metric), [2.0, 7.0, 4.0, 8.0])
+
+
+def test_split_timeseries_without_timestamps_are_aligned_by_position():
+    metric = _metric([_point(None, 1.0), _point(None, 3.0)], [_point(None, 5.0)])
+    np.testing.assert_array_equal(metric_values(metric), [3.0, 3.0])
+
+
+def test_other_aggregations_and_empty_metrics():
+    metric = _metric([_point(0, 7.0, attribute="maximum")], [_point(0, 9.0, attribute="maximum")])
+    np.testing.assert_array_equal(metric_values(metric, "Maximum"), [8.0])
+    assert metric_values(_metric()).size == 0
+    assert np.isnan(metric_values(_metric([_point(0, None)], [_point(0, None)]))).all()
+
+
+@pytest.mark.parametrize("q, name", [(95, "p95"), (99, "p99")])
+def test_percentiles_match_numpy_with_nan_rows_dropped(q, name):
+    generator = np.random.default_rng(7)
+    matrix = generator.uniform(0, 100, size=(6, 50))
+    matrix[generator.uniform(size=matrix.shape) < 0.3] = np.nan
+    matrix[2, 7:] = np.nan  # a short series padded with NaN
+    matrix[4, :] = np.nan   # a series without any data
+    stats = _stats(matrix)
+    for row, values in enumerate(matrix):
+        data = values[~np.isnan(values)]
+        expected = np.percentile(data, q) if data.size else 0.0
+        assert stats[name][row] == pytest.approx(expected)
+
+
+def test_mean_max_and_trend_ignore_missing_intervals():
+    stats = _stats([[1.0, np.nan, 3.0, 4.0], [5.0, 5.0, 5.0, 5.0], [np.nan, 2.0, np.nan, np.nan]])
+    np.testing.assert_allclose(stats["mean"], [8.0 / 3.0, 5.0, 2.0])
+    np.testing.assert_allclose(stats["max"], [4.0, 5.0, 2.0])
+    # Least-squares slope of (0, 1), (2, 3), (3, 4) is exactly 1; flat and single-point rows have none
+    np.testing.assert_allclose(stats["trend"], [1.0, 0.0, 0.0], atol=1e-12)
+
+
+def test_idle_fraction_uses_absolute_or_relative_thresholds():
+    stats = _stats([[1.0, 10.0, 2.0, np.nan], [1.0, 100.0, 4.0, 6.0]], thresholds=[5.0, np.nan])
+    # 2 of 3 intervals at or below 5; relative threshold is 5% of the 100 peak
+    np.testing.assert_allclose(stats["idle_fraction"], [2.0 / 3.0, 2.0 / 4.0])
+
+
+def test_rows_without_data_and_empty_matrices_are_zero():
+    stats = _stats([[np.nan, np.nan], [np.nan, np.nan]])
+    assert all((column == 0).all() for column in stats.values())
+    empty = series_stats(np.empty((3, 0)), np.full(3, np.nan))
+    assert set(empty) == {"mean", *STAT_SUFFIXES}
+    assert all(column.tolist() == [0.0, 0.0, 0.0] for column in empty.values())
+
+
+def test_summarize_series_builds_columns_per_resource():
+    columns = summarize_series({
+        ("vm-1", "Percentage CPU"): [1.0, 2.0, 3.0],
+        ("vm-1", "Network In Total"): np.array([10.0, 20.0]),
+        ("vm-2", "Percentage CPU"): [],
+    })
+    assert set(columns) == {"vm-1", "vm-2"}
+    assert set(columns["vm-1"]) == {
+        name for metric in ("Percentage CPU", "Network In Total")
+        for name in (metric, *(f"{metric}_{suffix}" for suffix in STAT_SUFFIXES))
+    }
+    assert columns["vm-1"]["Percentage CPU"] == 2.0
+    assert columns["vm-1"]["Percentage CPU_idle_fraction"] == 1.0
+    assert columns["vm-1"]["Network In Total_max"] == 20.0
+    assert columns["vm-1"]["Network In Total_trend"] == 10.0
+    assert all(value == 0.0 for value in columns["vm-2"].values())
@@ -0,0 +1,150 @@
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from agents.azure_tools import metrics_store as store_module
+from agents.azure_tools.metrics_store import MetricsStore, daily_window
+
+RESOURCE = "/subscriptions/s/resourceGroups/rg/providers/Microsoft.Compute/virtualMachines/VM1"
+TODAY = date(2026, 3, 31)
+
+
+def _midnight(day):
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def _metric(name, days_values, attribute="average"):
+    """Monitor metric object with a single timeseries of one point per day."""
+    points = [SimpleNamespace(time_stamp=_midnight(day), **{attribute: value}) for day, value in days_values]
+    return SimpleNamespace(name=SimpleNamespace(value=name), timeseries=[SimpleNamespace(data=points)])
+
+
+@pytest.fixture
+def today(monkeypatch):
+    current = {"day": TODAY}
+    monkeypatch.setattr(store_module, "_today", lambda: current["day"])
+    return current
+
+
+@pytest.fixture
+def store(tmp_path, today):
+    return MetricsStore(path=str(tmp_path / "metrics.sqlite"))
+
+
+def _fetch(store, names, days):
+    """Fetch the pending range the way the metric tools do, with one point per day for every name."""
+    pending = store.pending_range(RESOURCE, names, "Average", days)
+    if pending is None:
+        return None
+    start, end = pending
+    span = [start.date() + timedelta(days=offset) for offset in range((end - start).days)]
+    store.record(RESOURCE, [_metric(name, [(day, 1.0) for day in span]) for name in names], names, "Average", end, start)
+    return start.date(), end.date()
+
+
+def test_empty_store_fetches_the_full_window(store):
+    assert store.pending_range(RESOURCE, ["CPU"], "Average", 7) == (_midnight(TODAY - timedelta(days=7)), _midnight(TODAY))
+
+
+def test_up_to_date_window_is_not_fetched_again(store):
+    _fetch(store, ["CPU"], 7)
+    assert store.pending_range(RESOURCE, ["CPU"], "Average", 7) is None
+    assert store.pending_range(RESOURCE, ["CPU"], "Average", 3) is None
+    assert store.daily_series(RESOURCE, ["CPU"], "Average", 7) == {"CPU": [1.0] * 7}
+
+
+def test_only_the_days_since_the_last_scan_are_fetched(store, today):
+    _fetch(store, ["CPU"], 7)
+    today["day"] = TODAY + timedelta(days=2)
+    assert _fetch(store, ["CPU"], 7) == (TODAY, TODAY + timedelta(days=2))
+    assert store.stats()["tail_fetches"] == 1
+    # The tail extends the stored range, so the next longer-but-covered window is still local
+    assert store.pending_range(RESOURCE, ["CPU"], "Average", 9) is None
+
+
+def test_metrics_missing_from_the_log_refetch_the_window(store):
+    _fetch(store, ["CPU"], 7)
+    assert store.pending_range(RESOURCE, ["CPU", "Network In"], "Average", 7) == (
+        _midnight(TODAY - timedelta(days=7)),
+        _midnight(TODAY),
+    )
+
+
+def test_window_longer_than_what_was_fetched_is_fetched_in_full(store):
+    _fetch(store, ["CPU"], 7)
+    assert store.pending_range(RESOURCE, ["CPU"], "Average", 30) == (_midnight(TODAY - timedelta(days=30)), _midnight(TODAY))
+    _fetch(store, ["CPU"], 30)
+    assert store.pending_range(RESOURCE, ["CPU"], "Average", 30) is None
+    assert len(store.daily_series(RESOURCE, ["CPU"], "Average", 30)["CPU"]) == 30
+
+
+def test_gap_between_fetches_restarts_the_range(store, today):
+    _fetch(store, ["CPU"], 7)
+    today["day"] = TODAY + timedelta(days=10)
+    # Only the last 3 days are asked for: the 7 days in between were never fetched
+    _fetch(store, ["CPU"], 3)
+    assert store.pending_range(RESOURCE, ["CPU"], "Average", 3) is None
+    assert store.pending_range(RESOURCE, ["CPU"], "Average", 5) == (
+        _midnight(TODAY + timedelta(days=5)),
+        _midnight(TODAY + timedelta(days=10)),
+    )
+
+
+def test_days_without_data_are_still_marked_fetched(store):
+    start, end = store.pending_range(RESOURCE, ["CPU", "Disk"], "Average", 7)
+    # Monitor returned points for CPU on two days only, and nothing at all for Disk
+    store.record(RESOURCE, [_metric("CPU", [(TODAY - timedelta(days=2), 4.0), (TODAY - timedelta(days=1), 6.0)])],
+                 ["CPU", "Disk"], "Average", end, start)
+    assert store.pending_range(RESOURCE, ["CPU", "Disk"], "Average", 7) is None
+    assert store.daily_series(RESOURCE, ["CPU", "Disk"], "Average", 7) == {"CPU": [4.0, 6.0], "Disk": []}
+
+
+def test_partial_today_and_separate_timeseries(store):
+    start, end = store.pending_range(RESOURCE, ["CPU"], "Average", 2)
+    yesterday = TODAY - timedelta(days=1)
+    metric = SimpleNamespace(
+        name="CPU",
+        timeseries=[
+            SimpleNamespace(data=[SimpleNamespace(timestamp=_midnight(yesterday), average=2.0)]),
+            SimpleNamespace(data=[
+                SimpleNamespace(timestamp=_midnight(yesterday), average=4.0),
+                SimpleNamespace(timestamp=_midnight(TODAY), average=100.0),
+                SimpleNamespace(timestamp=None, average=100.0),
+            ]),
+        ],
+    )
+    store.record(RESOURCE, [metric], ["CPU"], "Average", end, start)
+    assert store.daily_series(RESOURCE, ["CPU"], "Average", 2) == {"CPU": [3.0]}
+
+
+def test_metric_names_and_resource_ids_ignore_case(store):
+    _fetch(store, ["Percentage CPU"], 7)
+    assert store.pending_range(RESOURCE.lower(), ["percentage cpu"], "average", 7) is None
+    assert store.daily_series(RESOURCE.upper(), ["PERCENTAGE CPU"], "Average", 7) == {"PERCENTAGE CPU": [1.0] * 7}
+
+
+def test_window_older_than_the_retention_is_always_fetched(tmp_path, today):
+    store = MetricsStore(path=str(tmp_path / "metrics.sqlite"), retention_days=10)
+    _fetch(store, ["CPU"], 30)
+    assert store.pending_range(RESOURCE, ["CPU"], "Average", 30) is not None
+    assert store.pending_range(RESOURCE, ["CPU"], "Average", 10) is None
+
+
+def test_logs_without_a_start_day_are_fetched_in_full_once(store):
+    _fetch(store, ["CPU"], 7)
+    store._connect().execute("UPDATE fetch_log SET fetched_from = NULL")
+    assert store.pending_range(RESOURCE, ["CPU"], "Average", 7) is not None
+    _fetch(store, ["CPU"], 7)
+    assert store.pending_range(RESOURCE, ["CPU"], "Average", 7) is None
+
+
+@pytest.mark.parametrize("timespan, interval, expected", [
+    ("P30D", "P1D", 30),
+    ("p7d", "p1d", 7),
+    ("P30D", "PT1H", None),
+    ("PT24H", "P1D", None),
+    ("", "P1D", None),
+])
+def test_daily_window(timespan, interval, expected):
+    assert daily_window(timespan, interval) == expected
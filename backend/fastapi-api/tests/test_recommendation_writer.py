@@ -0,0 +1,52 @@
+import csv
+import json
+
+from agents.recommendation_writer import RecommendationWriter
+from artifact_store import ArtifactStore, RunExport
+
+RUN_ID = "0123456789abcdef0123456789abcdef"
+
+
+def test_csv_header_is_the_union_of_all_keys(tmp_path):
+    writer = RecommendationWriter(str(tmp_path), formats=("csv", "jsonl"))
+    writer.append([{"id": 1, "action": "delete"}])
+    writer.append([{"id": 2, "tags": {"env": "dev"}}, "not a row"])
+    assert writer.close() == ["csv", "jsonl"]
+
+    with open(writer.path("csv"), newline="", encoding="utf-8") as handle:
+        rows = list(csv.reader(handle))
+    assert rows == [["id", "action", "tags"], ["1", "delete", ""], ["2", "", json.dumps({"env": "dev"})]]
+    assert writer.rows == 2
+
+
+def test_jsonl_is_removed_unless_requested(tmp_path):
+    writer = RecommendationWriter(str(tmp_path), formats=("csv",))
+    writer.append([{"id": 1}])
+    writer.close()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["recommendations.csv"]
+
+
+def test_abort_closes_and_removes_the_partial_export(tmp_path):
+    writer = RecommendationWriter(str(tmp_path), formats=("csv", "jsonl"))
+    writer.append([{"id": 1}])
+    writer.abort()
+    assert writer._jsonl.closed
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_run_export_abort_drops_unfinished_artifacts(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    export = RunExport(RUN_ID, store)
+    export.add([{"id": 1}, {"id": 2}])
+    export.abort()
+    assert store.list(RUN_ID) == []
+
+
+def test_run_export_abort_keeps_finished_artifacts(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    export = RunExport(RUN_ID, store)
+    export.add([{"id": 1}])
+    artifacts = export.finish()
+    export.abort()
+    assert [artifact["name"] for artifact in store.list(RUN_ID)] == [artifact["name"] for artifact in artifacts]
+    assert export.inline_csv() == "id\r\n1\r\n"
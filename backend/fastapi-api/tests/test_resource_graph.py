@@ -0,0 +1,59 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from agents.azure_tools.resource_graph import QueryCancelled, iter_resource_graph_query, kql_string
+
+
+class FakeResourceGraphClient:
+    """Serves `total` numbered rows in pages of the requested `$top`, recording each request."""
+
+    def __init__(self, total):
+        self.total = total
+        self.requests = []
+
+    def resources(self, request):
+        top = request.options.top
+        start = int(request.options.skip_token or 0)
+        self.requests.append((start, top))
+        end = min(start + top, self.total)
+        return SimpleNamespace(
+            data=[{"id": str(index)} for index in range(start, end)],
+            skip_token=str(end) if end < self.total else None,
+            result_truncated="false",
+        )
+
+
+def test_pages_through_every_row():
+    client = FakeResourceGraphClient(2500)
+    rows = list(iter_resource_graph_query("Resources", ["sub"], client=client))
+    assert [row["id"] for row in rows] == [str(index) for index in range(2500)]
+    assert client.requests == [(0, 1000), (1000, 1000), (2000, 1000)]
+
+
+def test_max_rows_caps_the_page_size_and_skips_the_prefetch():
+    client = FakeResourceGraphClient(5000)
+    rows = list(iter_resource_graph_query("Resources", ["sub"], max_rows=201, client=client))
+    assert len(rows) == 201
+    assert client.requests == [(0, 201)]
+
+
+def test_max_rows_spanning_pages_fetches_only_what_it_needs():
+    client = FakeResourceGraphClient(5000)
+    rows = list(iter_resource_graph_query("Resources", ["sub"], page_size=100, max_rows=250, client=client))
+    assert len(rows) == 250
+    assert client.requests == [(0, 100), (100, 100), (200, 100)]
+
+
+def test_cancelled_query_raises_before_the_first_page():
+    client = FakeResourceGraphClient(10)
+    cancelled = threading.Event()
+    cancelled.set()
+    with pytest.raises(QueryCancelled):
+        list(iter_resource_graph_query("Resources", ["sub"], client=client, cancelled=cancelled))
+    assert client.requests == []
+
+
+def test_kql_string_escapes_quotes_and_backslashes():
+    assert kql_string("/subscriptions/x/rg/o'brien\\vm") == "'/subscriptions/x/rg/o\\'brien\\\\vm'"
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from agents.envelopes import text_envelope
+from run_log import RUN_EVENTS_FILE, Run, RunLog, RunRegistry
+
+
+class FakeSender:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, envelope):
+        self.sent.append(envelope)
+
+
+def _batch(offset, rows):
+    return {"type": "final_recommendations", "recommendations": rows, "offset": offset, "total": offset + len(rows)}
+
+
+def _publish(run, count):
+    for index in range(count):
+        run.publish(text_envelope(f"message {index}"))
+
+
+def test_attach_replays_from_the_middle_then_forwards_without_gaps(tmp_path):
+    run = Run("a" * 32, str(tmp_path))
+    _publish(run, 5)
+    sender = FakeSender()
+    assert run.attach(sender, "conversation", after=2) == 3
+    _publish(run, 2)
+    assert [envelope["seq"] for envelope in sender.sent] == [3, 4, 5, 6, 7]
+    assert {envelope["conversation_id"] for envelope in sender.sent} == {"conversation"}
+    run.log.close()
+
+
+def test_replay_beyond_the_last_seq_sends_nothing(tmp_path):
+    run = Run("b" * 32, str(tmp_path))
+    _publish(run, 3)
+    assert run.log.read(after=3) == []
+    assert run.log.read(after=10) == []
+    assert [envelope["seq"] for envelope in run.log.read(after=-1)] == [1, 2, 3]
+    run.log.close()
+
+
+def test_finished_run_resumes_from_its_log_file(tmp_path):
+    run = Run("c" * 32, str(tmp_path))
+    _publish(run, 2)
+    run.publish(_batch(0, [{"id": 1}, {"id": 2}]))
+    run.publish(_batch(2, [{"id": 3}]))
+    run.finish("completed")
+
+    registry = RunRegistry(str(tmp_path))
+    sender = FakeSender()
+    assert registry.resume(run.run_id, 2, sender, "conversation") is None
+    assert [envelope["seq"] for envelope in sender.sent] == [3, 4, 5]
+    assert sender.sent[-1]["type"] == "done"
+
+    # A client that already had the first batch rebuilds the full list from the rest by offset
+    rows = [{"id": 1}, {"id": 2}]
+    for envelope in sender.sent:
+        if envelope["type"] == "final_recommendations" and envelope["offset"] >= len(rows):
+            assert envelope["offset"] == len(rows)
+            rows.extend(envelope["recommendations"])
+    assert rows == [{"id": 1}, {"id": 2}, {"id": 3}]
+
+
+def test_log_file_lines_match_sequence_numbers(tmp_path):
+    run = Run("d" * 32, str(tmp_path))
+    _publish(run, 4)
+    run.log.close()
+    envelopes = RunLog.read_file(run.run_id, after=1, directory=str(tmp_path))
+    assert [envelope["seq"] for envelope in envelopes] == [2, 3, 4]
+
+
+def test_incomplete_last_line_is_ignored(tmp_path):
+    run = Run("e" * 32, str(tmp_path))
+    _publish(run, 3)
+    run.log.close()
+    with open(tmp_path / run.run_id / RUN_EVENTS_FILE, "a", encoding="utf-8") as handle:
+        handle.write('{"type": "text", "seq": 4, "content": "cut sh')
+    envelopes = RunLog.read_file(run.run_id, directory=str(tmp_path))
+    assert [envelope["seq"] for envelope in envelopes] == [1, 2, 3]
+
+
+def test_unknown_run_cannot_be_resumed(tmp_path):
+    registry = RunRegistry(str(tmp_path))
+    with pytest.raises(KeyError):
+        registry.resume("f" * 32, 0, FakeSender(), "conversation")
+    with pytest.raises(KeyError):
+        registry.resume("../not-a-run", 0, FakeSender(), "conversation")
+
+
+def test_live_run_resumes_and_keeps_streaming(tmp_path):
+    async def scenario():
+        registry = RunRegistry(str(tmp_path))
+        release = asyncio.Event()
+
+        async def execute(run):
+            _publish(run, 3)
+            await release.wait()
+            _publish(run, 1)
+
+        run = registry.start(execute)
+        await asyncio.sleep(0)
+        sender = FakeSender()
+        assert registry.resume(run.run_id, 1, sender, "conversation") is run
+        release.set()
+        await run.task
+        return sender.sent
+
+    sent = asyncio.run(scenario())
+    assert [envelope["seq"] for envelope in sent] == [2, 3, 4, 5]
+    assert sent[-1]["type"] == "done"
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import threading
+import time
+
+from agents.sharding import RecommendationMerger, ShardPool, _until_cancelled
+
+
+def blocking_shard(prompt, subscription, cancelled):
+    """Shard target that runs until its analysis is cancelled, leaving marker files behind."""
+    directory = prompt
+    open(os.path.join(directory, f"{subscription}.started"), "w").close()
+    deadline = time.monotonic() + 30
+    while not cancelled.is_set() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if cancelled.is_set():
+        open(os.path.join(directory, f"{subscription}.stopped"), "w").close()
+    return {"recommendations": [], "errors": [], "seconds": 0.0}
+
+
+def _wait_for(paths, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(os.path.exists(path) for path in paths):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_cancelling_a_sharded_analysis_stops_running_shards(tmp_path):
+    pool = ShardPool(workers=2, target=blocking_shard)
+    subscriptions = ["sub-a", "sub-b"]
+
+    async def analyze_then_cancel():
+        stream = pool.analyze(str(tmp_path), subscriptions)
+        await stream.__anext__()  # progress message: both shards are submitted
+        started = [tmp_path / f"{subscription}.started" for subscription in subscriptions]
+        assert await asyncio.to_thread(_wait_for, started)
+        await stream.aclose()
+
+    try:
+        asyncio.run(analyze_then_cancel())
+        assert _wait_for([tmp_path / f"{subscription}.stopped" for subscription in subscriptions], timeout=5)
+    finally:
+        pool.shutdown()
+
+
+def test_until_cancelled_cancels_the_analysis():
+    cancelled = threading.Event()
+    reached_end = []
+
+    async def analysis():
+        await asyncio.sleep(30)
+        reached_end.append(True)
+        return {"recommendations": [{"id": "x"}], "errors": []}
+
+    async def run():
+        threading.Timer(0.1, cancelled.set).start()
+        return await _until_cancelled(analysis(), cancelled)
+
+    started = time.monotonic()
+    result = asyncio.run(run())
+    assert result == {"recommendations": [], "errors": [], "cancelled": True}
+    assert not reached_end
+    assert time.monotonic() - started < 5
+
+
+def test_until_cancelled_returns_the_result_without_an_event():
+    async def analysis():
+        return {"recommendations": [], "errors": ["boom"]}
+
+    assert asyncio.run(_until_cancelled(analysis(), None)) == {"recommendations": [], "errors": ["boom"]}
+
+
+def test_merger_keeps_the_first_of_each_duplicate():
+    merger = RecommendationMerger()
+    first = merger.add("sub-a", [{"resourceId": "/R/1", "recommendation": "Delete"}, "not a row"])
+    second = merger.add("sub-b", [{"resourceId": "/r/1", "recommendation": "delete "}, {"resourceId": "/r/2"}])
+    assert [row["subscriptionId"] for row in first] == ["sub-a"]
+    assert second == [{"resourceId": "/r/2", "subscriptionId": "sub-b"}]
+    assert merger.count == 2
+    assert merger.duplicates == 1
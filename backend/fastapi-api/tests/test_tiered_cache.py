@@ -0,0 +1,108 @@
+import pickle
+from types import SimpleNamespace
+
+import pytest
+
+from agents.caching import tiered_cache
+from agents.caching.tiered_cache import TieredCache
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds=1.0):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(tiered_cache, "time", SimpleNamespace(time=clock.time))
+    # Check the disk caps on every write instead of every hundredth
+    monkeypatch.setattr(tiered_cache, "_DISK_EVICTION_CHECK_INTERVAL", 1)
+    return clock
+
+
+def _disk_cache(tmp_path, **options):
+    return TieredCache("test", path=str(tmp_path / "cache.sqlite"), **options)
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = TieredCache("test", ttl=10)
+    cache.set("default", 1)
+    cache.set("short", 2, ttl=1)
+    clock.advance(5)
+    assert cache.get("short") is None
+    assert cache.get("default") == 1
+    clock.advance(6)
+    assert cache.get("default", "gone") == "gone"
+    assert cache.stats()["expirations"] == 2
+
+
+def test_memory_tier_evicts_the_least_recently_used(clock):
+    cache = TieredCache("test", memory_max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_tier_serves_what_memory_evicted_and_survives_restarts(clock, tmp_path):
+    cache = _disk_cache(tmp_path, memory_max_entries=1)
+    cache.set("a", {"rows": [1, 2]})
+    cache.set("b", "second")
+    assert cache.get("a") == {"rows": [1, 2]}
+    assert cache.stats()["disk_hits"] == 1
+
+    restarted = _disk_cache(tmp_path)
+    assert restarted.get("b") == "second"
+    clock.advance(restarted.ttl + 1)
+    assert _disk_cache(tmp_path).get("b") is None
+
+
+def test_disk_tier_evicts_the_least_recently_used_beyond_max_entries(clock, tmp_path):
+    cache = _disk_cache(tmp_path, memory_max_entries=1, disk_max_entries=2)
+    cache.set("a", 1)
+    clock.advance()
+    cache.set("b", 2)
+    clock.advance()
+    assert cache.get("a") == 1  # read from disk: "a" is now more recently used than "b"
+    clock.advance()
+    cache.set("c", 3)
+
+    restarted = _disk_cache(tmp_path)
+    assert [restarted.get(key) for key in ("a", "b", "c")] == [1, None, 3]
+
+
+def test_disk_byte_budget_keeps_the_most_recently_used_values(clock, tmp_path):
+    value_size = len(pickle.dumps("x" * 1000, protocol=pickle.HIGHEST_PROTOCOL))
+    cache = _disk_cache(tmp_path, memory_max_entries=1, disk_max_bytes=value_size * 2 + 10)
+    for key in ("a", "b", "c"):
+        cache.set(key, "x" * 1000)
+        clock.advance()
+
+    restarted = _disk_cache(tmp_path)
+    assert [restarted.get(key) is not None for key in ("a", "b", "c")] == [False, True, True]
+    assert cache.stats()["evictions"] >= 1
+
+
+def test_unpicklable_values_stay_in_memory_only(clock, tmp_path):
+    cache = _disk_cache(tmp_path)
+    value = lambda: None  # noqa: E731 - lambdas cannot be pickled
+    cache.set("callable", value)
+    assert cache.get("callable") is value
+    assert _disk_cache(tmp_path).get("callable") is None
+
+
+def test_make_key_is_stable_and_distinguishes_parts():
+    assert TieredCache.make_key("metrics", ["a", "b"], {"x": 1, "y": 2}) == TieredCache.make_key(
+        "metrics", ["a", "b"], {"y": 2, "x": 1}
+    )
+    assert TieredCache.make_key("ab", "c") != TieredCache.make_key("a", "bc")
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from agents.azure_tools.waste_rules import evaluate_waste_rules
+
+NOW = time.time()
+OLD = "2020-01-01T00:00:00Z"
+SUBSCRIPTION = "/subscriptions/00000000-0000-0000-0000-000000000000/resourceGroups/rg/providers"
+
+
+def _resource(kind, name, properties=None, **fields):
+    return {
+        "id": f"{SUBSCRIPTION}/{kind}/{name}",
+        "name": name,
+        "type": kind,
+        "properties": {"timeCreated": OLD, **(properties or {})},
+        **fields,
+    }
+
+
+def _public_ip(name, **properties):
+    return _resource("Microsoft.Network/publicIPAddresses", name, properties)
+
+
+def _nic(name, **properties):
+    return _resource("Microsoft.Network/networkInterfaces", name, properties)
+
+
+def _rules(findings):
+    return {(finding["resourceName"], finding["rule"]) for finding in findings}
+
+
+def test_unassociated_public_ip_is_confirmed_waste():
+    confirmed, uncertain = evaluate_waste_rules([_public_ip("idle")], now=NOW)
+    assert _rules(confirmed) == {("idle", "unassociated_public_ip")}
+    assert uncertain == []
+
+
+@pytest.mark.parametrize("user", ["ipConfiguration", "natGateway", "servicePublicIPAddress", "linkedPublicIPAddress"])
+def test_public_ip_in_use_is_not_waste(user):
+    confirmed, uncertain = evaluate_waste_rules([_public_ip("used", **{user: {"id": "/x"}})], now=NOW)
+    assert confirmed == [] and uncertain == []
+
+
+def test_orphan_nic_is_confirmed_waste():
+    confirmed, _ = evaluate_waste_rules([_nic("orphan", hostedWorkloads=[])], now=NOW)
+    assert _rules(confirmed) == {("orphan", "orphan_nic")}
+
+
+@pytest.mark.parametrize(
+    "properties",
+    [
+        {"virtualMachine": {"id": "/vm"}},
+        {"privateEndpoint": {"id": "/pe"}},
+        {"privateLinkService": {"id": "/pls"}},
+        {"hostedWorkloads": ["/workload"]},
+    ],
+)
+def test_nic_in_use_is_not_waste(properties):
+    confirmed, uncertain = evaluate_waste_rules([_nic("used", **properties)], now=NOW)
+    assert confirmed == [] and uncertain == []
+
+
+def test_unattached_disk_and_premium_disk_on_deallocated_vm():
+    vm = _resource(
+        "Microsoft.Compute/virtualMachines", "vm",
+        {"extended": {"instanceView": {"powerState": {"code": "PowerState/deallocated"}}}},
+    )
+    attached = _resource(
+        "Microsoft.Compute/disks", "premium", {"diskState": "Reserved"}, sku={"name": "Premium_LRS"}, managedBy=vm["id"]
+    )
+    loose = _resource("Microsoft.Compute/disks", "loose", {"diskState": "Unattached"}, sku={"name": "Standard_LRS"})
+    confirmed, _ = evaluate_waste_rules([vm, attached, loose], now=NOW)
+    assert _rules(confirmed) == {("premium", "premium_disk_on_deallocated_vm"), ("loose", "unattached_disk")}
+
+
+def test_recent_and_transitional_findings_are_ambiguous():
+    recent = _public_ip("new")
+    recent["properties"]["timeCreated"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(NOW - 3600))
+    uploading = _resource("Microsoft.Compute/disks", "uploading", {"diskState": "ActiveUpload"})
+    confirmed, uncertain = evaluate_waste_rules([recent, uploading], now=NOW)
+    assert confirmed == []
+    assert {(finding["resourceName"], finding["reason"]) for finding in uncertain} == {
+        ("new", "recently created"),
+        ("uploading", "disk state ActiveUpload"),
+    }
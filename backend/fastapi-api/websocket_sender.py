@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from agents.envelopes import encode
+
+logger = logging.getLogger(__name__)
+
+# Messages buffered per connection before the slow-client policy applies
+WS_QUEUE_SIZE = int(os.getenv("OPTIMONKEY_WS_QUEUE_SIZE", "256"))
+# What to do when a client falls behind: "coalesce", "drop" or "disconnect"
+WS_SLOW_CLIENT_POLICY = os.getenv("OPTIMONKEY_WS_SLOW_CLIENT_POLICY", "coalesce")
+
+SLOW_CLIENT_POLICIES = ("coalesce", "drop", "disconnect")
+
+# Agent chatter; validation results, recommendations, CSV exports and errors are never dropped or merged
+PROGRESS_TYPES = {"text"}
+
+# Close code sent to clients disconnected by the "disconnect" policy ("try again later")
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+# Totals over all connections, exposed in /diagnostics
+sender_counters = {"connections": 0, "sent": 0, "coalesced": 0, "dropped": 0, "slow_disconnects": 0, "max_depth": 0}
+
+
+def _is_progress(message: Dict) -> bool:
+    return message.get("type", "text") in PROGRESS_TYPES
+
+
+def _coalesce(messages: List[Dict]) -> Dict:
+    """Merge several progress messages into one text message that keeps every sender and content."""
+    if len(messages) == 1:
+        return messages[0]
+    content = "\n\n".join(f"**{message.get('name', 'Agent')}**: {message.get('content', '')}" for message in messages)
+    merged = {
+        "content": content,
+        "role": messages[-1].get("role", "agent"),
+        "name": "Agents",
+        "timestamp": messages[-1].get("timestamp"),
+        "type": "text",
+        "coalesced": len(messages),
+    }
+    # The merged message stands in for the last one, so resuming after its seq skips none of them
+    for key in ("conversation_id", "run_id", "seq"):
+        if key in messages[-1]:
+            merged[key] = messages[-1][key]
+    return merged
+
+
+class WebSocketSender:
+    """
+    Outbound message queue of one WebSocket connection, drained by a dedicated writer task.
+
+    `send` never waits for the client: messages go to a bounded buffer and the writer
+    delivers them as fast as the client reads. Once the buffer is full the slow-client
+    policy applies to queued progress messages:
+
+    - coalesce: merge the queued progress messages of each conversation into a single message
+    - drop: discard the oldest queued progress message
+    - disconnect: close the connection
+
+    Non-progress messages always get through, so the buffer may exceed its size only by those.
+    """
+
+    def __init__(self, websocket: WebSocket, max_size: int = WS_QUEUE_SIZE, policy: str = WS_SLOW_CLIENT_POLICY):
+        if policy not in SLOW_CLIENT_POLICIES:
+            raise ValueError(f"Unknown slow client policy {policy!r}, expected one of {SLOW_CLIENT_POLICIES}")
+        self.websocket = websocket
+        self.max_size = max(max_size, 1)
+        self.policy = policy
+        self._buffer: Deque[Dict] = deque()
+        self._ready = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._error: Optional[BaseException] = None
+        self._closing: Optional[asyncio.Task] = None
+        self._writer = asyncio.create_task(self._write())
+        sender_counters["connections"] += 1
+
+    def send(self, message: Dict):
+        """
+        Queue a message for the client without waiting for it to be delivered.
+
+        Raises:
+            WebSocketDisconnect: If the client is gone or was disconnected for falling behind.
+        """
+        if self._error is not None:
+            raise WebSocketDisconnect(code=getattr(self._error, "code", 1006))
+        if len(self._buffer) >= self.max_size:
+            self._make_room()
+            if self._error is not None:
+                raise WebSocketDisconnect(code=SLOW_CLIENT_CLOSE_CODE)
+        self._buffer.append(message)
+        self._drained.clear()
+        sender_counters["max_depth"] = max(sender_counters["max_depth"], len(self._buffer))
+        self._ready.set()
+
+    def _make_room(self):
+        progress = [index for index, message in enumerate(self._buffer) if _is_progress(message)]
+        if self.policy == "disconnect" or not progress:
+            if self.policy == "disconnect":
+                sender_counters["slow_disconnects"] += 1
+                logger.warning(f"Disconnecting client that fell {len(self._buffer)} messages behind")
+                self._error = WebSocketDisconnect(code=SLOW_CLIENT_CLOSE_CODE)
+                self._closing = asyncio.create_task(self._disconnect())
+            return
+        conversations = {self._buffer[index].get("conversation_id") for index in progress}
+        if self.policy == "drop" or len(conversations) == len(progress):
+            # Nothing to merge (one progress message per conversation) also falls back to dropping
+            del self._buffer[progress[0]]
+            sender_counters["dropped"] += 1
+            return
+        # Merge the queued progress messages of each conversation into one, kept at the position of its first
+        groups: Dict[Optional[str], List[Dict]] = {}
+        for index in progress:
+            groups.setdefault(self._buffer[index].get("conversation_id"), []).append(self._buffer[index])
+        sender_counters["coalesced"] += len(progress) - len(groups)
+        merged = []
+        for message in self._buffer:
+            if not _is_progress(message):
+                merged.append(message)
+                continue
+            group = groups.pop(message.get("conversation_id"), None)
+            if group is not None:
+                merged.append(_coalesce(group))
+        self._buffer = deque(merged)
+
+    async def _disconnect(self):
+        self._writer.cancel()
+        self._buffer.clear()
+        try:
+            await self.websocket.close(code=SLOW_CLIENT_CLOSE_CODE)
+        except Exception as e:
+            logger.info(f"Closing slow WebSocket client failed: {e}")
+
+    async def _write(self):
+        try:
+            while True:
+                while not self._buffer:
+                    self._drained.set()
+                    self._ready.clear()
+                    await self._ready.wait()
+                message = self._buffer.popleft()
+                await self.websocket.send_text(encode(message))
+                sender_counters["sent"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The client went away; the next send() reports it to the producer
+            logger.info(f"WebSocket writer stopped: {e}")
+            self._error = e
+
+    async def flush(self):
+        """Wait until every queued message has been written (or the writer stopped)."""
+        if self._writer.done():
+            return
+        drained = asyncio.create_task(self._drained.wait())
+        await asyncio.wait([drained, self._writer], return_when=asyncio.FIRST_COMPLETED)
+        drained.cancel()
+
+    async def close(self):
+        """Stop the writer; undelivered messages are discarded."""
+        self._writer.cancel()
+        try:
+            await self._writer
+        except asyncio.CancelledError:
+            pass
+        self._buffer.clear()
+
+
+def sender_stats() -> Dict[str, int]:
+    return dict(sender_counters)
@@ -25,6 +25,9 @@ import { MoonIcon, SunIcon, DeleteIcon, CheckIcon, WarningIcon, InfoIcon, Chevro
 import ReactMarkdown from 'react-markdown';
 import PromptTemplate from '../components/PromptTemplate';
 
+// Backend serving the conversation WebSocket and the export downloads
+const API_BASE_URL = 'http://127.0.0.1:8081';
+
 interface Message {
   user: string;
   name: string;
@@ -38,6 +41,8 @@ interface Message {
   timestamp: string;
   role: string;
   type?: string; // "csv", "text", "final_recommendations", or "confidence_score"
+  downloadUrl?: string; // Full export of a "csv" message, which may be too large to send inline
+  runId?: string; // Run that sent the message; recommendation batches of one run merge into one message
 }
 
 interface WebSocketMessageData {
@@ -52,6 +57,11 @@ interface WebSocketMessageData {
   name?: string;
   timestamp?: string;
   type?: string; // Added for heartbeat type
+  download_url?: string; // csv messages: link to the full export; content is empty when it is too large to inline
+  rows?: number; // csv messages: number of exported recommendations
+  run_id?: string;
+  offset?: number; // final_recommendations: position of this batch's first row in the run's recommendations
+  total?: number; // final_recommendations: rows sent by the run so far, this batch included
 }
 
 const Dashboard: React.FC = () => {
@@ -96,7 +106,7 @@ const Dashboard: React.FC = () => {
     
     setSocketStatus('connecting');
     
-    const websocket = new WebSocket('ws://127.0.0.1:8081/ws/conversation');
+    const websocket = new WebSocket(`${API_BASE_URL.replace(/^http/, 'ws')}/ws/conversation`);
     
     websocket.onopen = () => {
       debugLogger('WebSocket connection established successfully');
@@ -116,6 +126,23 @@ const Dashboard: React.FC = () => {
         debugLogger('Message received:', messageData);
         setLoading(false);
 
+        // Export messages: content is the CSV (empty when too large to inline), download_url the full file
+        if (messageData.type === 'csv') {
+          setMessages((prev) => [
+            ...prev,
+            {
+              user: messageData.name || 'CSV Export',
+              name: messageData.name || 'CSV Export',
+              message: messageData.content || '',
+              timestamp: messageData.timestamp || new Date().toLocaleTimeString(),
+              role: messageData.role || 'agent',
+              type: 'csv',
+              downloadUrl: messageData.download_url ? `${API_BASE_URL}${messageData.download_url}` : undefined,
+            },
+          ]);
+          return;
+        }
+
         // Check if content is CSV-like data
         if (messageData.content && typeof messageData.content === 'string') {
           const content = messageData.content;
@@ -279,21 +306,40 @@ const Dashboard: React.FC = () => {
           return;
         }
 
-        // Handle recommendations
+        // Handle recommendations: each envelope carries only the new rows, placed at `offset`
+        // in the run's list, so all batches of a run merge into one growing table
         if (messageData.recommendations) {
-          console.log('Recommendations received:', messageData.recommendations);
-          const recommendations = messageData.message || {}; // Ensure non-null
-          setMessages((prev) => [
-            ...prev,
-            {
-              user: messageData.name || 'Agent',
-              name: messageData.name || 'Agent',
-              message: recommendations,
+          debugLogger('Recommendations received:', messageData.recommendations.length);
+          const batch = messageData.recommendations;
+          const offset = messageData.offset ?? 0;
+          setMessages((prev) => {
+            const index = prev.findIndex(
+              (msg) => msg.type === 'final_recommendations' && msg.runId !== undefined && msg.runId === messageData.run_id
+            );
+            const existing = index === -1
+              ? []
+              : ((prev[index].message as { recommendations?: Array<Record<string, unknown>> }).recommendations || []);
+            // Writing by position makes a replayed batch (after a resume) overwrite itself instead of duplicating rows
+            const merged = [...existing];
+            batch.forEach((row, i) => {
+              merged[offset + i] = row;
+            });
+            const updated: Message = {
+              user: messageData.name || 'Recommendations',
+              name: messageData.name || 'Recommendations',
+              message: { recommendations: merged },
               timestamp: messageData.timestamp || new Date().toLocaleTimeString(),
               role: 'agent',
-              type: 'text',
-            },
-          ]);
+              type: 'final_recommendations',
+              runId: messageData.run_id,
+            };
+            if (index === -1) {
+              return [...prev, updated];
+            }
+            const next = [...prev];
+            next[index] = updated;
+            return next;
+          });
           return;
         }
 
@@ -475,7 +521,35 @@ const Dashboard: React.FC = () => {
   }, []);
 
   // Define renderCSVContent first (no dependencies on renderMessageContent)
-  const renderCSVContent = useCallback((csvContent: string) => {
+  const renderCSVContent = useCallback((csvContent: string, downloadUrl?: string) => {
+    const downloadCSV = () => {
+      const a = document.createElement('a');
+      if (downloadUrl) {
+        a.href = downloadUrl;
+      } else {
+        const url = URL.createObjectURL(new Blob([csvContent], { type: 'text/csv' }));
+        a.href = url;
+        setTimeout(() => URL.revokeObjectURL(url), 0);
+      }
+      a.download = 'azure_recommendations.csv';
+      a.click();
+    };
+
+    if (!csvContent.trim()) {
+      // The export was too large to send inline; only the download is offered
+      return (
+        <Box py={2}>
+          <Text fontWeight="bold" fontSize="md" mb={2}>Azure Resource Recommendations</Text>
+          <Text fontSize="sm">The export is too large to preview here.</Text>
+          {downloadUrl && (
+            <Button size="xs" leftIcon={<CheckIcon />} colorScheme="blue" mt={2} onClick={downloadCSV}>
+              Download CSV
+            </Button>
+          )}
+        </Box>
+      );
+    }
+
     try {
       // Split the CSV into rows
       const rows = csvContent.trim().split('\n');
@@ -576,15 +650,7 @@ const Dashboard: React.FC = () => {
             leftIcon={<CheckIcon />} 
             colorScheme="blue" 
             mt={2}
-            onClick={() => {
-              const blob = new Blob([csvContent], { type: 'text/csv' });
-              const url = URL.createObjectURL(blob);
-              const a = document.createElement('a');
-              a.href = url;
-              a.download = 'azure_recommendations.csv';
-              a.click();
-              URL.revokeObjectURL(url);
-            }}
+            onClick={downloadCSV}
           >
             Download CSV
           </Button>
@@ -749,14 +815,22 @@ const Dashboard: React.FC = () => {
     
     if (type === 'final_recommendations' && typeof content === 'object' && content !== null) {
       try {
-        const recommendations = content as { recommendations?: string[] };
+        // Rows not received yet (a gap before a later batch) are holes in the array
+        const rows = ((content as { recommendations?: Array<Record<string, unknown> | string> }).recommendations || [])
+          .filter((row) => row !== undefined && row !== null);
         return (
           <Box p={3} borderRadius="md" bg="blue.50" borderLeft="4px solid" borderColor="blue.500" width="100%">
-            <Heading size="sm" mb={3} color="blue.700">Recommendations</Heading>
-            {recommendations.recommendations && recommendations.recommendations.length > 0 ? (
+            <Heading size="sm" mb={3} color="blue.700">Recommendations ({rows.length})</Heading>
+            {rows.length > 0 ? (
               <UnorderedList spacing={2}>
-                {recommendations.recommendations.map((rec: string, idx: number) => (
-                  <ListItem key={idx}>{rec}</ListItem>
+                {rows.map((rec, idx) => (
+                  <ListItem key={idx}>
+                    {typeof rec === 'string'
+                      ? rec
+                      : Object.entries(rec)
+                          .map(([key, value]) => `${key}: ${typeof value === 'object' ? JSON.stringify(value) : String(value)}`)
+                          .join(' | ')}
+                  </ListItem>
                 ))}
               </UnorderedList>
             ) : (
@@ -772,7 +846,7 @@ const Dashboard: React.FC = () => {
 
     // Check if the content appears to be CSV data
     if (type === 'csv' && typeof content === 'string') {
-      return renderCSVContent(content);
+      return renderCSVContent(content, message.downloadUrl);
     } else if (typeof content === 'string' && 
         content.includes(',') && 
         content.includes('\n') && 